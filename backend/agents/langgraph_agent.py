@@ -6,6 +6,7 @@ from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from typing_extensions import TypedDict
 import os
 import json
+import time
 import asyncio
 from enum import Enum
 from uuid import UUID
@@ -22,8 +23,12 @@ from typing import Optional, Dict
 from fastapi import WebSocket
 import psycopg2
 
-from backend.agents.openai_chat_completion import deephermes_free
-from backend.vector_search import PineconeSearch
+from backend.agents.openai_chat_completion import deephermes_chat, deephermes_free
+from backend.agents.prompt_templates import get_prompt_template
+from backend.agents.qa_fast_path import get_fast_path
+from backend.vector_search import get_site_vector_store
+from backend.vector_search.vector_store import intent_filter
+from backend.vector_search.micro_batcher import SearchMicroBatcher
 from backend.models import User, Meeting, PresentationURL, Session, Summary
 from backend.database.base import get_db
 
@@ -83,9 +88,67 @@ class GraphState(TypedDict):
     ui_mode: UIMode  # Track the current UI mode
     ppt_url: Optional[str]  # URL for the presentation
     pricing_page_url: Optional[str]  # URL for the pricing page
+    intent: Optional[str]  # Retrieval intent hint from the client, see INTENT_CATEGORIES
 
 
-pinecone_search = PineconeSearch(api_key=PINE_API_KEY, index_name=PINE_INDEX_NAME)
+# Words suggesting the visitor asks about uploaded documents rather than common questions
+DOCUMENT_INTENT_KEYWORDS = {
+    "document",
+    "documents",
+    "pdf",
+    "brochure",
+    "leaflet",
+    "handout",
+    "guide",
+    "file",
+    "page",
+}
+
+# Instructions of the chatbot node for websites without a prompt_template; identical
+# on every turn so providers can cache them
+FERTILA_SYSTEM_PROMPT = """You are Fertila, a warm, empathetic, and knowledgeable pregnancy-care chatbot whose mission is to engage expectant parents, understand their unique needs, and guide them through every stage of pregnancy with kindness, expertise, and personalized support.
+
+You speak in a gentle, reassuring, and friendly manner, use clear simple language, remember past conversations and personal details to create meaningful small talk, and acknowledge feelings and emotions.
+
+Your responsibilities include answering common questions about nutrition, exercise, prenatal vitamins, symptom management, labor preparation, and postpartum care; providing personalized guidance based on trimester, medical history, and preferences; offering emotional support, coping strategies for stress or discomfort, and gentle encouragement; guiding users through difficult situations with clear compassionate advice and recommending professional help when needed; sending proactive reminders and check-ins like appointment reminders, hydration breaks, relaxation techniques, and milestone celebrations; and sharing resources such as charts, quick checklists, curated articles, videos, and local support groups.
+
+You have access to specialized tools—show_slide, schedule_appointment, med_tracker, faq_search, and resource_list—which you invoke naturally by name to enrich the conversation without explaining the mechanics.
+
+You maintain privacy and confidentiality, encourage consulting healthcare providers when appropriate, stay evidence-based and up-to-date, track conversation context to personalize follow-ups, foster empowerment by presenting options and explaining pros and cons, and balance informative guidance with empathy and timing to avoid overwhelming the user.
+
+The tools available this turn, the ones already used and the one to use next are listed after these instructions. Go to tools only when relevant, and lead the conversation naturally towards all of them.
+
+Use the Context and the conversation history to answer.
+
+Additonal_Instructions
+When interacting with users:
+1. Maintain a natural and fluid conversation, responding appropriately to their queries and interests.
+"""
+
+# Per website: merges the retrieval queries of its concurrent conversations into
+# batched calls on the website's own vector store partition
+search_batchers: Dict[Optional[int], SearchMicroBatcher] = {}
+
+
+def get_search_batcher(site_id: Optional[int]) -> SearchMicroBatcher:
+    """Return the search batcher of a website, creating it on first use."""
+    if site_id not in search_batchers:
+        search_batchers[site_id] = SearchMicroBatcher(get_site_vector_store(site_id))
+    return search_batchers[site_id]
+
+
+def infer_intent(prompt: str) -> Optional[str]:
+    """
+    Cheap intent hint for retrieval: "documents" or None for no preference.
+
+    Only an explicit mention of documents restricts the search. A question mark
+    says nothing about where the answer is, and restricting questions to "faq"
+    would hide document answers on every site with enough Q&A records.
+    """
+    words = {word.strip("?!.,:;\"'()").lower() for word in prompt.split()}
+    if words & DOCUMENT_INTENT_KEYWORDS:
+        return "documents"
+    return None
 
 
 class LangGraphClass:
@@ -95,6 +158,7 @@ class LangGraphClass:
         user_id: str,
         session_id: str,
         websocket_object: WebSocket,
+        site_id: Optional[int] = None,
     ):
         self.state = GraphState(
             messages=[],
@@ -108,8 +172,10 @@ class LangGraphClass:
             pricing_page_url=None,
             went_to_pricing=False,
             ui_mode=UIMode.NORMAL_MODE,
+            intent=None,
         )
         self.memory = memory
+        self.site_id = site_id
         self.user_id = user_id if user_id else None
         self.session_id = session_id if session_id else None
         self.can_trigger_tool_counter = 0
@@ -163,12 +229,20 @@ class LangGraphClass:
         # else:
 
         #     print("No context found, searching for context", user_prompt)
-        context = pinecone_search.search(
-            query=user_prompt.content, requires_embedding=True, top_k=5
-        )
+        intent = state.get("intent") or infer_intent(user_prompt.content)
+        context = await self.retrieve(user_prompt.content, top_k=5, intent=intent)
         state["context"] = context
         # print("Context retrieved", context)
 
+        # A near-exact match of a distilled question is answered without the LLM
+        fast_path = get_fast_path(self.site_id)
+        stored_answer = fast_path.answer(context)
+        if stored_answer is not None:
+            self.can_trigger_tool_counter += 1
+            print(f"Answered from the Q&A fast path: {fast_path.stats()}")
+            state["messages"].append(AIMessage(role="assistant", content=stored_answer))
+            return state
+
         use_tool = False
 
         if self.can_trigger_tool_counter > 3:
@@ -179,14 +253,8 @@ class LangGraphClass:
         next_tool_to_use = [tool for tool in [] if tool not in self.tools_used]
         next_tool_to_use = next_tool_to_use[0] if next_tool_to_use else None
 
-        system_prompt = f"""
-You are Fertila, a warm, empathetic, and knowledgeable pregnancy-care chatbot whose mission is to engage expectant parents, understand their unique needs, and guide them through every stage of pregnancy with kindness, expertise, and personalized support.\n\n
-You speak in a gentle, reassuring, and friendly manner, use clear simple language, remember past conversations and personal details to create meaningful small talk, and acknowledge feelings and emotions.\n\n
-Your responsibilities include answering common questions about nutrition, exercise, prenatal vitamins, symptom management, labor preparation, and postpartum care; providing personalized guidance based on trimester, medical history, and preferences; offering emotional support, coping strategies for stress or discomfort, and gentle encouragement; guiding users through difficult situations with clear compassionate advice and recommending professional help when needed; sending proactive reminders and check-ins like appointment reminders, hydration breaks, relaxation techniques, and milestone celebrations; and sharing resources such as charts, quick checklists, curated articles, videos, and local support groups.\n\n
-You have access to specialized tools—show_slide, schedule_appointment, med_tracker, faq_search, and resource_list—which you invoke naturally by name to enrich the conversation without explaining the mechanics.\n\n
-You maintain privacy and confidentiality, encourage consulting healthcare providers when appropriate, stay evidence-based and up-to-date, track conversation context to personalize follow-ups, foster empowerment by presenting options and explaining pros and cons, and balance informative guidance with empathy and timing to avoid overwhelming the user.
-
-List of tools | trigger
+        # Tool state changes every turn, so it follows the cacheable system prompt
+        instructions = f"""List of tools | trigger
 _______________________
 {tools}
 
@@ -196,25 +264,32 @@ Already used tools:
 Tool to use:
 {next_tool_to_use}
 
-For these , go to tools, but only when relevant, lead the conversation naturally towards all of the above tools. If not asked directly for any tool, try to ask and use the {next_tool_to_use} if {use_tool} is true.
-
-Additonal_Instructions
-When interacting with users:
-1. Maintain a natural and fluid conversation, responding appropriately to their queries and interests.
-"""
+If not asked directly for any tool, try to ask and use the {next_tool_to_use} if {use_tool} is true."""
 
         self.can_trigger_tool_counter += 1
 
-        # Combine the system prompt and user prompt into a single string
-        History = " ".join([msg.content for msg in state["messages"][-50:-1]])
-        context_text = " ".join(text["metadata"]["chunk_text"] for text in context)
-        combined_prompt = (
-            f"Context:{context_text}\n\n{system_prompt}\n\nHistory:{History}"
+        # Compiled once per website and cached, see get_prompt_template
+        prompt_builder = get_prompt_template(self.site_id, FERTILA_SYSTEM_PROMPT).builder
+        prompt = prompt_builder.build(
+            user_prompt.content,
+            instructions=instructions,
+            context=[text["metadata"]["chunk_text"] for text in context],
+            history=state["messages"][-50:-1],
         )
 
-        # Pass only the combined prompt as a string to the agent
-        chat_response = deephermes_free(
-            role="assistant", content=combined_prompt + user_prompt.content
+        generation_start = time.perf_counter()
+        completion = deephermes_chat(prompt["messages"])
+        fast_path.record_generation(time.perf_counter() - generation_start)
+        chat_response = completion["content"]
+
+        usage = prompt_builder.record_usage(
+            completion["prompt_tokens"] or prompt["prompt_tokens"],
+            completion["cached_tokens"],
+        )
+        print(
+            f"Prompt of {prompt['prompt_tokens']} tokens "
+            f"({prompt['context_chunks']} context chunks, "
+            f"{prompt['history_messages']} history messages): {usage}"
         )
 
         state["messages"].append(AIMessage(role="assistant", content=chat_response))
@@ -223,10 +298,42 @@ When interacting with users:
     async def update_retrieved_context(self, state: GraphState) -> GraphState:
         """Updates the context with the retrieved data, if the new user inputs are not related to the stored context."""
 
-        state["context"] = pinecone_search.hybrid_search(state["messages"], top_k=1)
+        user_prompt = next(
+            (
+                msg
+                for msg in reversed(state["messages"])
+                if isinstance(msg, HumanMessage)
+            ),
+            None,
+        )
+        if user_prompt:
+            state["context"] = await self.retrieve(user_prompt.content, top_k=1)
 
         return state
 
+    async def retrieve(
+        self, query: str, top_k: int = 5, intent: Optional[str] = None
+    ) -> list:
+        """
+        Search the website's own records, restricted to the categories of the intent.
+
+        Falls back to all categories when the restricted search finds fewer than
+        top_k records. Results without text are left out.
+        """
+        search_batcher = get_search_batcher(self.site_id)
+        metadata_filter = intent_filter(intent)
+        results = await search_batcher.search(
+            query, top_k=top_k, metadata_filter=metadata_filter
+        )
+        if metadata_filter is not None and len(results) < top_k:
+            results = await search_batcher.search(query, top_k=top_k)
+        # A record whose text could not be read is of no use as context
+        return [
+            result
+            for result in results
+            if (result.get("metadata") or {}).get("chunk_text")
+        ]
+
     def get_presentation_url(self, type_url: str = "pricing") -> str:
         """
         Returns the URL of the presentation based on the type.
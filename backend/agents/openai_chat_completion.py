@@ -1,3 +1,5 @@
+from typing import List, Dict
+
 from openai import OpenAI
 
 import os
@@ -7,7 +9,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+DEEPHERMES_MODEL = "nousresearch/deephermes-3-mistral-24b-preview:free"
+
+
 def deephermes_free(role: str, content: str) -> str:
+    return deephermes_chat([{"role": role, "content": content}])["content"]
+
+
+def deephermes_chat(messages: List[Dict[str, str]]) -> Dict[str, any]:
+    """
+    Send a chat in OpenAI message format to DeepHermes through OpenRouter.
+
+    Args:
+        messages (List[Dict[str, str]]): Messages with "role" and "content".
+
+    Returns:
+        Dict[str, any]: The reply "content", and "prompt_tokens" and "cached_tokens"
+        as reported by the provider (0 when it does not report them).
+    """
     openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
     site_url = os.getenv("SITE_URL")
     site_name = os.getenv("SITE_NAME")
@@ -23,15 +42,16 @@ def deephermes_free(role: str, content: str) -> str:
         #     "X-Title": site_name,  # Optional. Site title for rankings on openrouter.ai.
         # },
         extra_body={},
-        model="nousresearch/deephermes-3-mistral-24b-preview:free",
-        messages=[
-            {
-                "role": role,
-                "content": content,
-            }
-        ],
+        model=DEEPHERMES_MODEL,
+        messages=messages,
     )
-    return completion.choices[0].message.content
+    usage = completion.usage
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "content": completion.choices[0].message.content,
+        "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+    }
 
 
 def main():
@@ -0,0 +1,215 @@
+import os
+import threading
+from typing import List, Dict, Optional
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from backend.vector_search.chunking import TokenCounter, get_token_counter
+
+load_dotenv()
+# Tokenizer of the chat model, for budgeting prompts (see chunking.TokenCounter)
+PROMPT_TOKENIZER = os.getenv(
+    "PROMPT_TOKENIZER", "NousResearch/DeepHermes-3-Mistral-24B-Preview"
+)
+# Most tokens sent per turn, leaving the rest of the context window for the reply
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "6000"))
+# Share of the tokens left after the instructions and question that context may use;
+# history gets the rest, and context takes back what history leaves unused
+PROMPT_CONTEXT_SHARE = float(os.getenv("PROMPT_CONTEXT_SHARE", "0.6"))
+
+_ROLES = {HumanMessage: "user", AIMessage: "assistant", SystemMessage: "system"}
+
+
+class PromptCacheStats:
+    """
+    Prompt tokens sent and the share the provider served from its prompt cache.
+    """
+
+    def __init__(self):
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.prefix_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, prompt_tokens: int, cached_tokens: int, prefix_tokens: int) -> None:
+        """
+        Record the usage of one turn.
+
+        Args:
+            prompt_tokens (int): Prompt tokens the provider billed.
+            cached_tokens (int): Of which served from its cache.
+            prefix_tokens (int): Tokens of the static prefix, the cacheable part.
+        """
+        with self._lock:
+            self.turns += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            self.prefix_tokens += prefix_tokens
+
+    def stats(self) -> Dict[str, float]:
+        """Turns, mean prompt tokens per turn, and cache hit and cacheable ratios."""
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "mean_prompt_tokens": (
+                    self.prompt_tokens / self.turns if self.turns else 0.0
+                ),
+                "cache_hit_ratio": (
+                    self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+                ),
+                "cacheable_ratio": (
+                    self.prefix_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+                ),
+            }
+
+
+class PromptBuilder:
+    """
+    Assembles chat messages with the invariant system prompt first, so providers can
+    cache it as a prefix, followed by the per-turn instructions, the retrieved
+    context, the history and the visitor's message in their own roles.
+
+    The prompt is kept within `max_tokens`: context chunks are dropped from the
+    lowest ranked and history from the oldest message until it fits.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        max_tokens: int = PROMPT_MAX_TOKENS,
+        context_share: float = PROMPT_CONTEXT_SHARE,
+        counter: Optional[TokenCounter] = None,
+        system_prompt_tokens: Optional[int] = None,
+    ):
+        """
+        Initialize the builder.
+
+        Args:
+            system_prompt (str): Static instructions, identical on every turn.
+            max_tokens (int): Most prompt tokens per turn.
+            context_share (float): Share of the remaining budget reserved for context.
+            counter (TokenCounter, optional): Defaults to the PROMPT_TOKENIZER counter.
+            system_prompt_tokens (int, optional): Token count of the system prompt, if
+                already known; counted once on first use otherwise.
+        """
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.context_share = context_share
+        self.counter = counter or get_token_counter(PROMPT_TOKENIZER)
+        self._system_prompt_tokens = system_prompt_tokens
+        self.cache_stats = PromptCacheStats()
+
+    @property
+    def system_prompt_tokens(self) -> int:
+        """Token count of the system prompt, the cacheable prefix."""
+        if self._system_prompt_tokens is None:
+            self._system_prompt_tokens = self.counter.count(self.system_prompt)
+        return self._system_prompt_tokens
+
+    def build(
+        self,
+        user_prompt: str,
+        instructions: str = "",
+        context: Optional[List[str]] = None,
+        history: Optional[List[BaseMessage]] = None,
+    ) -> Dict[str, any]:
+        """
+        Assemble the messages of a turn within the token budget.
+
+        Args:
+            user_prompt (str): The visitor's message.
+            instructions (str): Per-turn instructions, e.g. tool state.
+            context (List[str], optional): Retrieved texts, best first.
+            history (List[BaseMessage], optional): Earlier messages, oldest first.
+
+        Returns:
+            Dict[str, any]: "messages" in OpenAI format, "prompt_tokens" (estimated
+            with the tokenizer), "prefix_tokens", and the "context_chunks" and
+            "history_messages" kept.
+        """
+        context = [text for text in context or [] if text and text.strip()]
+        history = [
+            message
+            for message in history or []
+            if type(message) in _ROLES and message.content
+        ]
+        counts = self.counter.count_many(
+            [user_prompt, instructions]
+            + context
+            + [message.content for message in history]
+        )
+        user_tokens, instruction_tokens = counts[0], counts[1]
+        context_counts = counts[2 : 2 + len(context)]
+        history_counts = counts[2 + len(context) :]
+
+        remaining = max(
+            self.max_tokens
+            - self.system_prompt_tokens
+            - instruction_tokens
+            - user_tokens,
+            0,
+        )
+        context_budget = int(remaining * self.context_share)
+        kept_context = self._take(context_counts, context_budget)
+        context_tokens = sum(context_counts[:kept_context])
+
+        # Newest messages first; what history leaves unused goes back to context
+        kept_history = self._take(history_counts[::-1], remaining - context_tokens)
+        history_tokens = sum(history_counts[len(history) - kept_history :])
+        kept_context = self._take(context_counts, remaining - history_tokens)
+        context_tokens = sum(context_counts[:kept_context])
+
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if instructions:
+            messages.append({"role": "system", "content": instructions})
+        if kept_context:
+            messages.append(
+                {
+                    "role": "system",
+                    "content": "Context:\n" + "\n\n".join(context[:kept_context]),
+                }
+            )
+        messages.extend(
+            {"role": _ROLES[type(message)], "content": message.content}
+            for message in history[len(history) - kept_history :]
+        )
+        messages.append({"role": "user", "content": user_prompt})
+
+        return {
+            "messages": messages,
+            "prompt_tokens": self.system_prompt_tokens
+            + instruction_tokens
+            + context_tokens
+            + history_tokens
+            + user_tokens,
+            "prefix_tokens": self.system_prompt_tokens,
+            "context_chunks": kept_context,
+            "history_messages": kept_history,
+        }
+
+    def record_usage(self, prompt_tokens: int, cached_tokens: int) -> Dict[str, float]:
+        """
+        Record a turn's usage as reported by the provider.
+
+        Args:
+            prompt_tokens (int): Prompt tokens billed.
+            cached_tokens (int): Of which read from the provider's prompt cache.
+
+        Returns:
+            Dict[str, float]: Statistics so far, see PromptCacheStats.stats.
+        """
+        self.cache_stats.record(prompt_tokens, cached_tokens, self.system_prompt_tokens)
+        return self.cache_stats.stats()
+
+    @staticmethod
+    def _take(counts: List[int], budget: int) -> int:
+        # Number of leading items that fit the budget together
+        taken, used = 0, 0
+        for tokens in counts:
+            if used + tokens > budget:
+                break
+            taken += 1
+            used += tokens
+        return taken
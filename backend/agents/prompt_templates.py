@@ -0,0 +1,171 @@
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.agents.prompt_builder import PromptBuilder
+
+load_dotenv()
+# Seconds a compiled template is served before the website is read again, so edits
+# made by other processes are picked up; edits through this process apply at once
+PROMPT_TEMPLATE_TTL = float(os.getenv("PROMPT_TEMPLATE_TTL", "300"))
+
+# Website fields a prompt template may reference, e.g. "{knowledge_base}"
+_PLACEHOLDER = re.compile(r"\{(site_name|domain|knowledge_base)\}")
+
+# Compiled templates by (site ID, default prompt), with their compile time
+_templates: Dict[Tuple[Optional[int], str], Tuple["PromptTemplate", float]] = {}
+_templates_lock = threading.Lock()
+
+
+class PromptTemplate:
+    """
+    A website's system prompt, compiled once: website fields substituted into its
+    placeholders, the knowledge base attached, and the result tokenized, so a turn
+    only assembles the per-turn parts behind it.
+    """
+
+    def __init__(
+        self,
+        template: str,
+        site_name: str = "",
+        domain: str = "",
+        knowledge_base: Optional[str] = None,
+        site_id: Optional[int] = None,
+        previous: Optional["PromptTemplate"] = None,
+    ):
+        """
+        Compile a template.
+
+        Args:
+            template (str): Prompt text; "{site_name}", "{domain}" and
+                "{knowledge_base}" are replaced, other braces are kept as they are.
+            site_name (str): Website name.
+            domain (str): Website domain.
+            knowledge_base (str, optional): Reference text. Appended as a
+                "## KNOWLEDGE BASE:" section unless the template places it itself.
+            site_id (int, optional): Website the template belongs to.
+            previous (PromptTemplate, optional): Earlier compilation of the website's
+                template; reused, statistics included, if the prompt is unchanged.
+        """
+        self.site_id = site_id
+        values = {
+            "site_name": site_name or "",
+            "domain": domain or "",
+            "knowledge_base": knowledge_base or "",
+        }
+        system_prompt = _PLACEHOLDER.sub(
+            lambda match: values[match.group(1)], template
+        ).strip()
+        if knowledge_base and "{knowledge_base}" not in template:
+            system_prompt += f"\n\n## KNOWLEDGE BASE:\n\n{knowledge_base.strip()}"
+        self.system_prompt = system_prompt
+
+        if previous is not None and previous.system_prompt == system_prompt:
+            self.builder = previous.builder
+        else:
+            self.builder = PromptBuilder(system_prompt)
+        # Tokenize the static prefix now rather than on a visitor's turn
+        self.prefix_tokens = self.builder.system_prompt_tokens
+
+    @classmethod
+    def from_website(
+        cls, website, default: str, previous: Optional["PromptTemplate"] = None
+    ) -> "PromptTemplate":
+        """
+        Compile a website's prompt_template, or the default prompt if it has none.
+
+        Args:
+            website (Website, optional): The website row; None for the default.
+            default (str): Prompt used when the website sets no template.
+            previous (PromptTemplate, optional): Earlier compilation to reuse if unchanged.
+        """
+        if website is None:
+            return cls(default, previous=previous)
+        return cls(
+            website.prompt_template or default,
+            site_name=website.name,
+            domain=website.domain,
+            knowledge_base=website.knowledge_base,
+            site_id=website.site_id,
+            previous=previous,
+        )
+
+
+def load_website(site_id: Optional[int]):
+    """
+    Read a website row.
+
+    Returns:
+        Website: The row, or None if there is none or the database is unavailable.
+    """
+    if site_id is None:
+        return None
+    from backend.database.base import get_db
+    from backend.models import Website
+
+    try:
+        return get_db().query(Website).filter(Website.site_id == site_id).first()
+    except Exception as e:
+        print(f"Using the default prompt for site {site_id}: {e}")
+        return None
+
+
+def get_prompt_template(site_id: Optional[int], default: str) -> PromptTemplate:
+    """
+    Return a website's compiled prompt template, compiling it on first use.
+
+    Templates are kept in memory, so a turn neither reads the database nor
+    re-tokenizes the prompt. They are recompiled after PROMPT_TEMPLATE_TTL seconds or
+    as soon as the website is changed through this process.
+
+    Args:
+        site_id (int, optional): Website ID; None for the default prompt.
+        default (str): Prompt used when the website sets no template.
+
+    Returns:
+        PromptTemplate: The compiled template.
+    """
+    key = (site_id, default)
+    cached = _templates.get(key)
+    if cached is not None and time.monotonic() - cached[1] < PROMPT_TEMPLATE_TTL:
+        return cached[0]
+
+    with _templates_lock:
+        cached = _templates.get(key)
+        if cached is not None and time.monotonic() - cached[1] < PROMPT_TEMPLATE_TTL:
+            return cached[0]
+        template = PromptTemplate.from_website(
+            load_website(site_id), default, previous=cached[0] if cached else None
+        )
+        _templates[key] = (template, time.monotonic())
+        return template
+
+
+def invalidate_prompt_template(site_id: Optional[int]) -> None:
+    """Drop a website's compiled templates; the next turn recompiles them."""
+    with _templates_lock:
+        for key in [key for key in _templates if key[0] == site_id]:
+            del _templates[key]
+
+
+def _on_website_change(mapper, connection, website) -> None:
+    invalidate_prompt_template(website.site_id)
+
+
+def _listen_for_website_changes() -> None:
+    try:
+        from sqlalchemy import event
+
+        from backend.models import Website
+    except Exception as e:
+        print(f"Prompt templates refresh every {PROMPT_TEMPLATE_TTL}s only: {e}")
+        return
+    for change in ("after_insert", "after_update", "after_delete"):
+        event.listen(Website, change, _on_website_change)
+
+
+_listen_for_website_changes()
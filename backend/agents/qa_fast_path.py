@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from typing import List, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# Cosine similarity the best "qa" hit must reach to be answered without the LLM.
+# Scores depend on the embedding model, so calibrate it for the deployed
+# VECTOR_STORE_BACKEND with `python -m backend.vector_search.evaluate ... --calibrate-fast-path`.
+# Websites override it with Website.qa_fast_path_threshold; 0 or less disables it.
+QA_FAST_PATH_THRESHOLD = float(os.getenv("QA_FAST_PATH_THRESHOLD", "0.9"))
+# Reply sent on a fast-path hit; may use {answer} and {question}
+QA_FAST_PATH_TEMPLATE = os.getenv("QA_FAST_PATH_TEMPLATE", "{answer}")
+# Generation latency assumed saved per hit until an LLM call has been timed, in seconds
+QA_FAST_PATH_DEFAULT_GENERATION_SECONDS = float(
+    os.getenv("QA_FAST_PATH_DEFAULT_GENERATION_SECONDS", "2.0")
+)
+
+# One fast path per website, shared by all conversations of this process
+_fast_paths: Dict[Optional[int], "QAFastPath"] = {}
+_fast_paths_lock = threading.Lock()
+
+
+def split_qa_text(text: str) -> Optional[Dict[str, str]]:
+    """
+    Split the text of a "qa" record ("Q: <question>\\nA: <answer>", see qa_record).
+
+    Returns:
+        Dict[str, str]: "question" and "answer", or None if the text has another shape.
+    """
+    if not text or not text.startswith("Q: ") or "\nA: " not in text:
+        return None
+    question, answer = text[len("Q: ") :].split("\nA: ", 1)
+    if not answer.strip():
+        return None
+    return {"question": question.strip(), "answer": answer.strip()}
+
+
+class QAFastPath:
+    """
+    Answers a turn with a stored, distilled answer when retrieval found a near-exact
+    match of the visitor's question, skipping generation.
+
+    Keeps hit and miss counts and the generation latency the hits saved, estimated
+    from a moving average of timed LLM calls.
+    """
+
+    def __init__(
+        self,
+        threshold: float = QA_FAST_PATH_THRESHOLD,
+        template: str = QA_FAST_PATH_TEMPLATE,
+    ):
+        """
+        Initialize the fast path.
+
+        Args:
+            threshold (float): Similarity the best "qa" hit must reach; 0 or less
+                disables the fast path.
+            template (str): Reply format with {answer} and {question} fields.
+        """
+        self.threshold = threshold
+        self.template = template
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.generations = 0
+        self.mean_generation_seconds = QA_FAST_PATH_DEFAULT_GENERATION_SECONDS
+        self._lock = threading.Lock()
+
+    def answer(self, results: List[Dict[str, any]]) -> Optional[str]:
+        """
+        Return the stored answer of the best "qa" result if it clears the threshold.
+
+        Args:
+            results (List[Dict[str, any]]): Search results of the turn, with "score"
+                and "metadata" ("chunk_text" and "category").
+
+        Returns:
+            str: The templated reply, or None to generate one with the LLM.
+        """
+        start = time.perf_counter()
+        reply = None
+        if self.threshold > 0:
+            best = max(
+                (
+                    result
+                    for result in results
+                    if (result.get("metadata") or {}).get("category") == "qa"
+                ),
+                key=lambda result: result.get("score", 0.0),
+                default=None,
+            )
+            if best is not None and best.get("score", 0.0) >= self.threshold:
+                pair = split_qa_text(best["metadata"].get("chunk_text"))
+                if pair is not None:
+                    reply = self._render(pair)
+
+        with self._lock:
+            self.lookup_seconds += time.perf_counter() - start
+            if reply is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.saved_seconds += self.mean_generation_seconds
+        return reply
+
+    def record_generation(self, seconds: float) -> None:
+        """
+        Record the latency of an LLM reply, which a hit is assumed to save.
+
+        Args:
+            seconds (float): Duration of the generation call.
+        """
+        with self._lock:
+            self.generations += 1
+            if self.generations == 1:
+                self.mean_generation_seconds = seconds
+            else:
+                # Exponential moving average, following changes in provider latency
+                self.mean_generation_seconds += 0.1 * (
+                    seconds - self.mean_generation_seconds
+                )
+
+    def stats(self) -> Dict[str, float]:
+        """Hits, misses, hit rate, mean lookup time and generation seconds saved."""
+        with self._lock:
+            turns = self.hits + self.misses
+            return {
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / turns if turns else 0.0,
+                "mean_lookup_ms": 1000 * self.lookup_seconds / turns if turns else 0.0,
+                "mean_generation_seconds": self.mean_generation_seconds,
+                "saved_seconds": self.saved_seconds,
+            }
+
+    def _render(self, pair: Dict[str, str]) -> str:
+        try:
+            return self.template.format(**pair)
+        except (KeyError, IndexError, ValueError) as e:
+            print(f"Invalid QA_FAST_PATH_TEMPLATE, replying with the plain answer: {e}")
+            return pair["answer"]
+
+
+def site_threshold(site_id: Optional[int]) -> float:
+    """
+    Fast-path threshold of a website: its qa_fast_path_threshold, or the default.
+
+    Args:
+        site_id (int, optional): Website ID; None for the default.
+
+    Returns:
+        float: The threshold.
+    """
+    if site_id is None:
+        return QA_FAST_PATH_THRESHOLD
+    from backend.database.base import get_db
+    from backend.models import Website
+
+    try:
+        website = get_db().query(Website).filter(Website.site_id == site_id).first()
+    except Exception as e:
+        print(f"Using the default fast-path threshold for site {site_id}: {e}")
+        return QA_FAST_PATH_THRESHOLD
+    if website is None or website.qa_fast_path_threshold is None:
+        return QA_FAST_PATH_THRESHOLD
+    return website.qa_fast_path_threshold
+
+
+def get_fast_path(site_id: Optional[int]) -> QAFastPath:
+    """
+    Return the fast path of a website, creating it on first use.
+
+    The website's threshold is read once; changes to the website through this
+    process reset it, others need reset_fast_path.
+    """
+    if site_id not in _fast_paths:
+        with _fast_paths_lock:
+            if site_id not in _fast_paths:
+                _fast_paths[site_id] = QAFastPath(threshold=site_threshold(site_id))
+    return _fast_paths[site_id]
+
+
+def reset_fast_path(site_id: Optional[int]) -> None:
+    """Forget a website's fast path, so the next turn re-reads its threshold."""
+    with _fast_paths_lock:
+        _fast_paths.pop(site_id, None)
+
+
+def _on_website_change(mapper, connection, website) -> None:
+    reset_fast_path(website.site_id)
+
+
+def _listen_for_website_changes() -> None:
+    try:
+        from sqlalchemy import event
+
+        from backend.models import Website
+    except Exception as e:
+        print(f"Fast-path thresholds are only re-read by reset_fast_path: {e}")
+        return
+    for change in ("after_update", "after_delete"):
+        event.listen(Website, change, _on_website_change)
+
+
+_listen_for_website_changes()
@@ -0,0 +1,26 @@
+from sqlalchemy import text
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from backend.database.base import engine
+
+# Add the qa_fast_path_threshold column to the websites table
+with engine.connect() as connection:
+    connection.execute(
+        text(
+            "ALTER TABLE websites ADD COLUMN IF NOT EXISTS qa_fast_path_threshold DOUBLE PRECISION;"
+        )
+    )
+
+    # commit the changes
+    connection.commit()
+
+    # confirm the column was added
+    result = connection.execute(
+        text(
+            "SELECT column_name FROM information_schema.columns WHERE table_name='websites';"
+        )
+    )
+    print(result.fetchall())
+    print("qa_fast_path_threshold column added to websites table.")
@@ -83,7 +83,12 @@ connected_clients = dict()
 from backend.database.base import get_db
 from fastapi import Depends
 from backend.models import Session, User, Website
+from backend.vector_search.vector_store import INTENT_CATEGORIES
 from sqlalchemy.orm import Session as SQLAlchemySession
+from urllib.parse import urlparse
+
+# Website of visitors whose origin matches no Website.domain
+DEFAULT_SITE_ID = int(os.getenv("DEFAULT_SITE_ID", "1"))
 
 
 def create_website(
@@ -104,6 +109,24 @@ def create_website(
     return new_website
 
 
+def resolve_site_id(websocket: WebSocket, db: SQLAlchemySession) -> int:
+    """
+    Resolve the visitor's website on the server, from the page that opened the socket.
+
+    The Origin host is matched against Website.domain; a site_id sent by the client
+    is never trusted, so visitors cannot read or create other websites' partitions.
+    Unknown origins get DEFAULT_SITE_ID.
+    """
+    origin = websocket.headers.get("origin") or ""
+    host = (urlparse(origin).hostname or "").lower()
+    if host:
+        domains = {host, host[len("www.") :] if host.startswith("www.") else f"www.{host}"}
+        website = db.query(Website).filter(Website.domain.in_(domains)).first()
+        if website:
+            return website.site_id
+    return DEFAULT_SITE_ID
+
+
 def create_session(
     db: SQLAlchemySession = Depends(get_db),
     site_id: int = 0,
@@ -245,8 +268,8 @@ async def websocket_endpoint(websocket: WebSocket):
         # Create or fetch the user
         db = get_db()
 
-        # create a website, one time only
-        website = create_website(site_id=1, db=db)
+        # the visitor's website, resolved on the server; its records form their own partition
+        website = create_website(site_id=resolve_site_id(websocket, db), db=db)
         user = create_user(
             db=db,
             site_id=website.site_id,
@@ -265,6 +288,7 @@ async def websocket_endpoint(websocket: WebSocket):
             user_id=user.user_id,
             session_id=session.session_id,
             websocket_object=websocket,
+            site_id=website.site_id,
         )
         graph = langgraph_class.build_graph()
 
@@ -329,6 +353,12 @@ async def websocket_endpoint(websocket: WebSocket):
                 response = graph.astream(
                     {
                         "messages": [HumanMessage(role="user", content=user_input)],
+                        # Only a retrieval hint within the website's partition
+                        "intent": (
+                            data.get("intent")
+                            if data.get("intent") in INTENT_CATEGORIES
+                            else None
+                        ),
                     },
                     config,
                     stream_mode="values",
@@ -393,6 +423,14 @@ async def websocket_endpoint(websocket: WebSocket):
                 # return None  # or raise an exception, depending on your needs
 
 
+@app.on_event("startup")
+async def warm_up_embedding_models():
+    # Load local embedding models before the first visitor query has to pay for it
+    from backend.vector_search.embeddings import EMBEDDING_PRELOAD_MODELS, preload_models
+
+    await asyncio.to_thread(preload_models, EMBEDDING_PRELOAD_MODELS)
+
+
 app.include_router(router)
 app.include_router(ppt_router, prefix="/api/ppt", tags=["ppt"])
 
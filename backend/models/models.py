@@ -6,6 +6,7 @@ from sqlalchemy import (
     TIMESTAMP,
     Boolean,
     Text,
+    Float,
     Interval,
     JSON,
     UniqueConstraint,
@@ -28,6 +29,8 @@ class Website(Base):
     voice_id = Column(String(255))
     prompt_template = Column(Text)
     knowledge_base = Column(Text)
+    # Similarity above which a stored Q&A answer is sent without calling the LLM
+    qa_fast_path_threshold = Column(Float, nullable=True)
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
 
     users = relationship("User", back_populates="website", cascade="all, delete-orphan")
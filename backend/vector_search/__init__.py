@@ -1 +1,2 @@
 from .pinecone_search import PineconeSearch
+from .vector_store import VectorStore, get_vector_store, get_site_vector_store
@@ -0,0 +1,493 @@
+import json
+import os
+import sys
+import time
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from backend.vector_search.vector_store import VectorStore, get_vector_store
+
+
+# Compression settings compared by benchmark_quantization, as build_index arguments
+QUANTIZATION_SETTINGS = {
+    "float32": {"index_type": "flat", "quantization": "none"},
+    "fp16": {"index_type": "flat", "quantization": "fp16"},
+    "sq8": {"index_type": "flat", "quantization": "sq8"},
+    "pq": {"index_type": "flat", "quantization": "pq"},
+    "pca128_sq8": {"index_type": "flat", "quantization": "sq8", "reduced_dim": 128},
+    "pq_rerank": {"index_type": "flat", "quantization": "pq", "rerank_k_factor": 4},
+}
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Return the p-th percentile of the values using nearest-rank interpolation.
+
+    Args:
+        values (List[float]): Measured values.
+        p (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The percentile, or 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[rank]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """Summarize latencies in seconds as milliseconds."""
+    return {
+        "count": len(latencies),
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p99_ms": 1000 * percentile(latencies, 99),
+    }
+
+
+def benchmark_turn_latency(
+    stores: Dict[str, VectorStore], queries: List[str], top_k: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """
+    Measure the retrieval latency a conversation turn pays with each store.
+
+    Args:
+        stores (Dict[str, VectorStore]): Stores to compare, keyed by mode name.
+        queries (List[str]): Visitor questions replayed as turns.
+        top_k (int): Number of results retrieved per turn, as in the chatbot node.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Latency summary per mode.
+    """
+    report = {}
+    for mode, store in stores.items():
+        # Warm up connections and caches before measuring
+        store.search(queries[0], top_k=top_k)
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search(query, top_k=top_k)
+            latencies.append(time.perf_counter() - start)
+        report[mode] = summarize_latencies(latencies)
+    return report
+
+
+def benchmark_embedding_throughput(
+    model_name: str, texts: List[str], batch_sizes: Optional[List[int]] = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    Measure embedding throughput of TransformerEmbedder for several batch sizes.
+
+    A batch size of 1 approximates the previous one-text-at-a-time behaviour.
+
+    Args:
+        model_name (str): Hugging Face model name, e.g. "sentence-transformers/all-MiniLM-L6-v2".
+        texts (List[str]): Texts to embed, e.g. distilled Q&A chunks.
+        batch_sizes (List[int], optional): Batch sizes to compare. Defaults to 1, 16, 64 and 128.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Seconds and texts per second for each batch size.
+    """
+    from backend.vector_search.embeddings import TransformerEmbedder
+
+    # Without the embedding cache, which would serve the repeated runs
+    embedder = TransformerEmbedder(model_name, use_cache=False)
+    embedder.embed(texts[:8])  # warm-up
+
+    report = {}
+    for batch_size in batch_sizes or [1, 16, 64, 128]:
+        embedder.batch_size = batch_size
+        start = time.perf_counter()
+        embedder.embed(texts)
+        elapsed = time.perf_counter() - start
+        report[f"batch_size_{batch_size}"] = {
+            "seconds": elapsed,
+            "texts_per_second": len(texts) / elapsed,
+        }
+    return report
+
+
+def benchmark_embedding_cold_start(
+    model_name: str, instances: int = 3
+) -> Dict[str, any]:
+    """
+    Measure the cold start of an embedding model and the memory of sharing it.
+
+    Run this before anything else loads the model, so the registry records a true
+    cold start.
+
+    Args:
+        model_name (str): Hugging Face model name, e.g. "sentence-transformers/all-MiniLM-L6-v2".
+        instances (int): Number of embedders created for the same model.
+
+    Returns:
+        Dict[str, any]: Registry load statistics, first-query latency after warm-up
+        and process RSS after each additional embedder.
+    """
+    from backend.vector_search.embeddings import (
+        TransformerEmbedder,
+        model_stats,
+        process_rss_mb,
+    )
+
+    embedders = [TransformerEmbedder(model_name, use_cache=False)]
+    embedders[0].embed(["load"])
+
+    start = time.perf_counter()
+    embedders[0].embed(["What happens in the first visit?"])
+    first_query_seconds = time.perf_counter() - start
+
+    rss_mb = [process_rss_mb()]
+    for _ in range(instances - 1):
+        embedders.append(TransformerEmbedder(model_name, use_cache=False))
+        embedders[-1].embed(["load"])
+        rss_mb.append(process_rss_mb())
+
+    return {
+        "load": model_stats().get(model_name, {}),
+        "first_query_ms": 1000 * first_query_seconds,
+        "rss_mb_per_instance": rss_mb,
+    }
+
+
+def benchmark_embedding_cache(model_name: str, texts: List[str]) -> Dict[str, float]:
+    """
+    Compare embedding texts cold with embedding them again from the embedding cache.
+
+    Uses a fresh cache in a temporary directory, so earlier runs don't count.
+
+    Args:
+        model_name (str): Hugging Face model name, e.g. "sentence-transformers/all-MiniLM-L6-v2".
+        texts (List[str]): Texts to embed, e.g. distilled Q&A chunks.
+
+    Returns:
+        Dict[str, float]: Seconds for the cold and the cached pass, the speed-up, and
+        the largest difference between cached and computed embeddings.
+    """
+    import tempfile
+
+    from backend.vector_search.embedding_cache import EmbeddingCache
+    from backend.vector_search.embeddings import TransformerEmbedder
+
+    embedder = TransformerEmbedder(model_name, use_cache=False)
+    embedder.embed(texts[:8])  # warm-up
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = EmbeddingCache(cache_dir)
+        start = time.perf_counter()
+        computed = cache.embed(model_name, texts, embedder.embed)
+        cold_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cached = cache.embed(model_name, texts, embedder.embed)
+        cached_seconds = time.perf_counter() - start
+        cache.close()
+
+    return {
+        "cold_seconds": cold_seconds,
+        "cached_seconds": cached_seconds,
+        "speedup": cold_seconds / cached_seconds,
+        "max_abs_difference": float(np.abs(computed - cached).max()),
+    }
+
+
+def benchmark_batch_search(
+    store: VectorStore, queries: List[str], top_k: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare one search call per query with a single batch_search call.
+
+    Args:
+        store (VectorStore): Store to benchmark.
+        queries (List[str]): Query strings, e.g. an evaluation set.
+        top_k (int): Number of results per query.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Wall time, throughput and per-query latency
+        summary for "sequential" and "batched".
+    """
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        store.search(query, top_k=top_k)
+        latencies.append(time.perf_counter() - query_start)
+    sequential_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store.batch_search(queries, top_k=top_k)
+    batched_seconds = time.perf_counter() - start
+
+    return {
+        "sequential": {
+            "seconds": sequential_seconds,
+            "queries_per_second": len(queries) / sequential_seconds,
+            **summarize_latencies(latencies),
+        },
+        "batched": {
+            "seconds": batched_seconds,
+            "queries_per_second": len(queries) / batched_seconds,
+            **summarize_latencies(store.last_batch_latencies),
+        },
+    }
+
+
+def benchmark_micro_batching(
+    store: VectorStore, queries: List[str], concurrency: int = 32, top_k: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare concurrent conversations searching independently with the same load
+    going through SearchMicroBatcher.
+
+    Args:
+        store (VectorStore): Store to benchmark.
+        queries (List[str]): Query strings, one per simulated turn.
+        concurrency (int): Number of conversations issuing turns at the same time.
+        top_k (int): Number of results per query.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Throughput and per-turn latency summary for
+        "independent" and "micro_batched", plus the batch statistics.
+    """
+    import asyncio
+
+    from backend.vector_search.micro_batcher import SearchMicroBatcher
+
+    batcher = SearchMicroBatcher(store)
+
+    async def run(search) -> Dict[str, float]:
+        pending = list(queries)
+        latencies = []
+
+        async def conversation():
+            while pending:
+                query = pending.pop()
+                start = time.perf_counter()
+                await search(query)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(conversation() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        return {"queries_per_second": len(queries) / elapsed, **summarize_latencies(latencies)}
+
+    async def independent(query):
+        # One thread per in-flight turn, as with a blocking search in the event loop's executor
+        return await asyncio.to_thread(store.search, query, top_k)
+
+    async def micro_batched(query):
+        return await batcher.search(query, top_k=top_k)
+
+    report = {
+        "independent": asyncio.run(run(independent)),
+        "micro_batched": asyncio.run(run(micro_batched)),
+    }
+    report["micro_batched"].update(batcher.stats())
+    return report
+
+
+def benchmark_slim_metadata(
+    store, queries: List[str], top_k: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare Pinecone queries returning the full metadata with ID-only queries whose
+    text is read from the local document store.
+
+    Args:
+        store (PineconeVectorStore): Pinecone store to benchmark.
+        queries (List[str]): Query strings.
+        top_k (int): Number of results per query.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Latency summary and mean metadata bytes returned
+        by Pinecone per query, for "include_metadata" and "ids_then_hydrate".
+    """
+    vectors = store.embed_queries(queries)
+
+    report = {}
+    for mode in ["include_metadata", "ids_then_hydrate"]:
+        latencies, payload_bytes = [], 0
+        for vector in vectors:
+            start = time.perf_counter()
+            response = store.index.query(
+                namespace=store.namespace,
+                vector=vector,
+                top_k=top_k,
+                include_metadata=mode == "include_metadata",
+            )
+            matches = [
+                {"id": match["id"], "score": match["score"], "metadata": match["metadata"]}
+                for match in response["matches"]
+            ]
+            if mode == "ids_then_hydrate":
+                store.hydrate(matches)
+            latencies.append(time.perf_counter() - start)
+            payload_bytes += sum(
+                len(json.dumps(match["metadata"]))
+                for match in response["matches"]
+                if match["metadata"]
+            )
+        report[mode] = {
+            "metadata_bytes_per_query": payload_bytes / len(vectors),
+            **summarize_latencies(latencies),
+        }
+    return report
+
+
+def benchmark_filtered_search(
+    store: VectorStore,
+    queries: List[str],
+    metadata_filters: List[Dict[str, any]],
+    top_k: int = 5,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare unfiltered search latency with filtered search latency.
+
+    Args:
+        store (VectorStore): Store to benchmark.
+        queries (List[str]): Query strings.
+        metadata_filters (List[Dict[str, any]]): Filters to compare, e.g. [{"category": "qa"}].
+        top_k (int): Number of results per query.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Latency summary for "unfiltered" and for each filter.
+    """
+    report = {}
+    for metadata_filter in [None] + list(metadata_filters):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            if metadata_filter is None:
+                store.search(query, top_k=top_k)
+            else:
+                store.filter(query, metadata_filter, top_k=top_k)
+            latencies.append(time.perf_counter() - start)
+        name = "unfiltered" if metadata_filter is None else json.dumps(metadata_filter)
+        report[name] = summarize_latencies(latencies)
+    return report
+
+
+def benchmark_quantization(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    settings: Dict[str, Dict[str, any]],
+    top_k: int = 10,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare compressed index settings against exact search.
+
+    Every setting is built with `build_index`, trained on the corpus when needed and
+    filled with all vectors. Settings may also carry "nprobe" and "ef_search", which
+    otherwise default to FAISS_NPROBE and FAISS_EF_SEARCH.
+
+    Args:
+        vectors (numpy array): Normalized corpus embeddings of shape (n, dim).
+        queries (numpy array): Normalized query embeddings of shape (q, dim).
+        settings (Dict[str, Dict[str, any]]): build_index keyword arguments keyed by
+            setting name, e.g. {"sq8": {"quantization": "sq8"}}.
+        top_k (int): Number of results per query.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Bytes per vector, recall@k against the exact
+        top-k and latency summary for each setting.
+    """
+    import faiss
+
+    from backend.vector_search.faiss_search import (
+        FAISS_EF_SEARCH,
+        FAISS_NPROBE,
+        apply_search_parameters,
+        build_index,
+    )
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    ids = np.arange(len(vectors))
+    dim = vectors.shape[1]
+
+    exact = build_index(dim, index_type="flat", quantization="none")
+    exact.add_with_ids(vectors, ids)
+    _, truth = exact.search(queries, top_k)
+
+    report = {}
+    for name, options in settings.items():
+        options = dict(options)
+        nprobe = options.pop("nprobe", FAISS_NPROBE)
+        ef_search = options.pop("ef_search", FAISS_EF_SEARCH)
+        index = build_index(dim, **options)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add_with_ids(vectors, ids)
+        apply_search_parameters(
+            index, nprobe, ef_search, options.get("rerank_k_factor")
+        )
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            _, found = index.search(query[None, :], top_k)
+            latencies.append(time.perf_counter() - start)
+            hits += len(set(found[0]) & set(expected))
+
+        report[name] = {
+            # The ID map adds 8 bytes per vector to every setting
+            "bytes_per_vector": faiss.serialize_index(index).nbytes / len(vectors),
+            f"recall@{top_k}": hits / (len(queries) * top_k),
+            **summarize_latencies(latencies),
+        }
+    return report
+
+
+def load_questions(json_file: str, limit: int = 200) -> List[str]:
+    """Load the questions of a distilled Q&A file, reading no further than needed."""
+    from backend.vector_search.readers import iter_json_records
+
+    questions = []
+    for _, item in iter_json_records(json_file):
+        if len(questions) >= limit:
+            break
+        if isinstance(item, dict) and item.get("question"):
+            questions.append(item["question"])
+    return questions
+
+
+# Example usage: python -m backend.vector_search.benchmarks <questions_and_answers.json>
+if __name__ == "__main__":
+    json_file_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("QA_JSON_PATH")
+    questions = load_questions(json_file_path)
+    corpus = load_questions(json_file_path, limit=5000)
+
+    report = {
+        # First, while the model is still cold
+        "embedding_cold_start": benchmark_embedding_cold_start(
+            "sentence-transformers/all-MiniLM-L6-v2"
+        ),
+        "turn_latency": benchmark_turn_latency(
+            {
+                "pinecone": get_vector_store("pinecone"),
+                "replica": get_vector_store("replica"),
+            },
+            questions,
+        ),
+        "batch_search": benchmark_batch_search(get_vector_store("replica"), questions),
+        "micro_batching": benchmark_micro_batching(get_vector_store("replica"), questions),
+        "slim_metadata": benchmark_slim_metadata(get_vector_store("pinecone"), questions),
+        "embedding_throughput": benchmark_embedding_throughput(
+            "sentence-transformers/all-MiniLM-L6-v2", corpus
+        ),
+        "embedding_cache": benchmark_embedding_cache(
+            "sentence-transformers/all-MiniLM-L6-v2", corpus
+        ),
+    }
+
+    from backend.vector_search.embeddings import TransformerEmbedder
+
+    corpus_vectors = TransformerEmbedder("sentence-transformers/all-MiniLM-L6-v2").embed(corpus)
+    report["quantization"] = benchmark_quantization(
+        corpus_vectors, corpus_vectors[: len(questions)], QUANTIZATION_SETTINGS
+    )
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,383 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.vector_search.embedding_cache import cached_embed
+
+load_dotenv()
+# Pinecone inference accepts at most 96 inputs per request
+BULK_MAX_BATCH_INPUTS = int(os.getenv("BULK_MAX_BATCH_INPUTS", "90"))
+# Estimated tokens per embedding request
+BULK_MAX_BATCH_TOKENS = int(os.getenv("BULK_MAX_BATCH_TOKENS", "40000"))
+# Pinecone rejects upsert requests larger than 2 MB
+BULK_MAX_BATCH_BYTES = int(os.getenv("BULK_MAX_BATCH_BYTES", str(2 * 1024 * 1024)))
+# Serialized size of one vector in an upsert request: 1024 floats as JSON text
+BULK_VECTOR_BYTES = int(os.getenv("BULK_VECTOR_BYTES", str(1024 * 20)))
+# Provider limits the rate limiters start from; they back off on 429 responses
+BULK_EMBED_TOKENS_PER_MINUTE = float(
+    os.getenv("BULK_EMBED_TOKENS_PER_MINUTE", "250000")
+)
+BULK_UPSERT_REQUESTS_PER_SECOND = float(
+    os.getenv("BULK_UPSERT_REQUESTS_PER_SECOND", "50")
+)
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "6"))
+BULK_BACKOFF_BASE = float(os.getenv("BULK_BACKOFF_BASE", "0.5"))
+BULK_BACKOFF_MAX = float(os.getenv("BULK_BACKOFF_MAX", "30"))
+
+# Process-wide rate limiters: provider limits apply per API key, not per client
+_rate_limiters: Dict[str, "RateLimiter"] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text: about four UTF-8 bytes per token."""
+    return max(1, math.ceil(len(text.encode("utf-8")) / 4))
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status of a provider error, if it carries one."""
+    for attribute in ("status", "status_code", "http_status"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return status
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether a provider error means the request rate or quota was exceeded."""
+    if error_status(error) == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "too many requests" in message or "rate limit" in message
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed when sent again unchanged."""
+    if is_rate_limited(error) or isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = error_status(error)
+    return status is not None and (status >= 500 or status == 408)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait requested by a provider error's Retry-After header."""
+    headers = getattr(error, "headers", None) or getattr(
+        getattr(error, "response", None), "headers", None
+    )
+    try:
+        return float(headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket whose rate adapts to the provider.
+
+    `acquire` blocks until enough budget has accumulated. The rate is halved on
+    every rate-limit response (`throttle`) and grows back by a twentieth of the
+    ceiling per successful request (`recover`), so concurrent writers settle just
+    below what the provider sustains.
+    """
+
+    def __init__(self, rate: float, burst_seconds: float = 1.0, min_rate: float = 0.0):
+        """
+        Initialize the limiter with a full bucket.
+
+        Args:
+            rate (float): Ceiling of the rate, in units per second.
+            burst_seconds (float): Bucket capacity, in seconds of budget at the ceiling.
+            min_rate (float): Floor of the rate; defaults to a hundredth of the ceiling.
+        """
+        self.max_rate = rate
+        self.min_rate = min_rate or rate / 100
+        self.rate = rate
+        self.capacity = rate * burst_seconds
+        self.available = self.capacity
+        self.throttles = 0
+        self.waited_seconds = 0.0
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        Take budget from the bucket, waiting for it to refill if necessary.
+
+        Args:
+            amount (float): Units to take, e.g. estimated tokens; amounts above the
+                capacity are capped at it.
+
+        Returns:
+            float: Seconds waited.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    self.waited_seconds += waited
+                    return waited
+                delay = (amount - self.available) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def throttle(self) -> None:
+        """Halve the rate after the provider rejected a request for its rate."""
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.available = min(self.available, 0.0)
+            self.throttles += 1
+
+    def recover(self) -> None:
+        """Grow the rate back towards the ceiling after a successful request."""
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def stats(self) -> Dict[str, float]:
+        """Current and maximum rate, throttle count and total seconds waited."""
+        return {
+            "rate": self.rate,
+            "max_rate": self.max_rate,
+            "throttles": self.throttles,
+            "waited_seconds": self.waited_seconds,
+        }
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(
+            self.capacity, self.available + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+
+def get_rate_limiter(name: str, rate: float, burst_seconds: float = 1.0) -> RateLimiter:
+    """
+    Return the process-wide rate limiter of a provider endpoint, creating it on first
+    use.
+
+    Args:
+        name (str): Endpoint name, e.g. "pinecone-embed-tokens".
+        rate (float): Ceiling of the rate in units per second, used on creation.
+        burst_seconds (float): Bucket capacity in seconds, used on creation.
+
+    Returns:
+        RateLimiter: The shared limiter.
+    """
+    with _rate_limiters_lock:
+        if name not in _rate_limiters:
+            _rate_limiters[name] = RateLimiter(rate, burst_seconds)
+        return _rate_limiters[name]
+
+
+class BulkUpsertError(RuntimeError):
+    """Raised when records still fail after retries and isolation."""
+
+    def __init__(self, failed: List[Tuple[str, str]]):
+        """
+        Args:
+            failed (List[Tuple[str, str]]): Record ID and error of every failed record.
+        """
+        self.failed = failed
+        record_id, error = failed[0]
+        super().__init__(
+            f"{len(failed)} records failed to upsert, e.g. {record_id}: {error}"
+        )
+
+
+class BulkUpsertClient:
+    """
+    Embeds and writes records in batches sized to the provider's request limits.
+
+    Batches are packed up to `max_inputs` records, `max_tokens` estimated tokens and
+    `max_bytes` of upsert payload. Every request first takes its budget from the
+    shared rate limiters and is retried with jittered exponential backoff on rate
+    limits and transient errors. A batch that keeps failing is split in halves until
+    the failing records are isolated, so the rest of the batch is still written.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        write_fn: Callable[[List[Dict[str, any]], List[List[float]]], None],
+        cache_model: Optional[str] = None,
+        max_inputs: int = BULK_MAX_BATCH_INPUTS,
+        max_tokens: int = BULK_MAX_BATCH_TOKENS,
+        max_bytes: int = BULK_MAX_BATCH_BYTES,
+        vector_bytes: int = BULK_VECTOR_BYTES,
+        embed_limiter: Optional[RateLimiter] = None,
+        write_limiter: Optional[RateLimiter] = None,
+        max_retries: int = BULK_MAX_RETRIES,
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            embed_fn (Callable): Provider call embedding a list of texts.
+            write_fn (Callable): Provider call writing records with their embeddings.
+            cache_model (str, optional): Embedding cache key of embed_fn, e.g.
+                "llama-text-embed-v2/passage"; cached texts are not sent to embed_fn.
+            max_inputs (int): Most records per batch.
+            max_tokens (int): Most estimated tokens per batch.
+            max_bytes (int): Most estimated upsert payload bytes per batch.
+            vector_bytes (int): Payload bytes of one vector.
+            embed_limiter (RateLimiter, optional): Token budget of embed_fn; defaults
+                to the shared "pinecone-embed-tokens" limiter.
+            write_limiter (RateLimiter, optional): Request budget of write_fn;
+                defaults to the shared "pinecone-upsert-requests" limiter.
+            max_retries (int): Attempts per request after the first.
+        """
+        self.embed_fn = embed_fn
+        self.write_fn = write_fn
+        self.cache_model = cache_model
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.max_bytes = max_bytes
+        self.vector_bytes = vector_bytes
+        self.embed_limiter = embed_limiter or get_rate_limiter(
+            "pinecone-embed-tokens",
+            BULK_EMBED_TOKENS_PER_MINUTE / 60,
+            burst_seconds=max(1.0, 60 * max_tokens / BULK_EMBED_TOKENS_PER_MINUTE),
+        )
+        self.write_limiter = write_limiter or get_rate_limiter(
+            "pinecone-upsert-requests", BULK_UPSERT_REQUESTS_PER_SECOND
+        )
+        self.max_retries = max_retries
+        self.stats = {
+            "records": 0,
+            "requests": 0,
+            "retries": 0,
+            "splits": 0,
+            "failed": 0,
+        }
+        self._stats_lock = threading.Lock()
+
+    def upsert(self, records: List[Dict[str, any]]) -> None:
+        """
+        Embed and write records with "id" and "text".
+
+        Args:
+            records (List[Dict[str, any]]): Records to write.
+
+        Raises:
+            BulkUpsertError: If some records failed; all others were written.
+        """
+        failed = []
+        for batch in self.batches(records):
+            failed += self._upsert_batch(batch)
+        if failed:
+            raise BulkUpsertError(failed)
+
+    def batches(self, records: List[Dict[str, any]]) -> Iterator[List[Dict[str, any]]]:
+        """
+        Pack records into batches within the input, token and payload limits.
+
+        Args:
+            records (List[Dict[str, any]]): Records with "id" and "text".
+
+        Yields:
+            List[Dict[str, any]]: Consecutive batches, in input order.
+        """
+        batch, tokens, size = [], 0, 0
+        for record in records:
+            record_tokens = estimate_tokens(record["text"])
+            record_size = self.payload_bytes(record)
+            if batch and (
+                len(batch) >= self.max_inputs
+                or tokens + record_tokens > self.max_tokens
+                or size + record_size > self.max_bytes
+            ):
+                yield batch
+                batch, tokens, size = [], 0, 0
+            batch.append(record)
+            tokens += record_tokens
+            size += record_size
+        if batch:
+            yield batch
+
+    def payload_bytes(self, record: Dict[str, any]) -> int:
+        """Estimated upsert payload of a record: its vector, ID and metadata."""
+        metadata = {key: value for key, value in record.items() if key != "text"}
+        return self.vector_bytes + len(json.dumps(metadata, default=str))
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts through the embedding cache, rate-limited and retried.
+
+        Args:
+            texts (List[str]): Texts of one batch.
+
+        Returns:
+            List[List[float]]: One embedding per text, in input order.
+        """
+        if self.cache_model is None:
+            return self._embed_uncached(texts)
+        return cached_embed(self.cache_model, texts, self._embed_uncached).tolist()
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(text) for text in texts)
+        vectors = self._call(self.embed_fn, (texts,), self.embed_limiter, tokens)
+        if vectors is None or len(vectors) != len(texts):
+            count = 0 if vectors is None else len(vectors)
+            raise ValueError(f"Got {count} embeddings for {len(texts)} texts.")
+        return vectors
+
+    def _upsert_batch(self, batch: List[Dict[str, any]]) -> List[Tuple[str, str]]:
+        try:
+            vectors = self.embed([record["text"] for record in batch])
+            self._call(self.write_fn, (batch, vectors), self.write_limiter, 1)
+        except Exception as e:
+            # Retries ran out on a transient error: splitting would only retry more
+            if len(batch) == 1 or is_retryable(e):
+                print(
+                    f"Failed to upsert {len(batch)} records from {batch[0]['id']}: {e}"
+                )
+                with self._stats_lock:
+                    self.stats["failed"] += len(batch)
+                return [(record["id"], str(e)) for record in batch]
+            # Isolate the failing records instead of dropping the whole batch
+            with self._stats_lock:
+                self.stats["splits"] += 1
+            middle = len(batch) // 2
+            return self._upsert_batch(batch[:middle]) + self._upsert_batch(
+                batch[middle:]
+            )
+
+        with self._stats_lock:
+            self.stats["records"] += len(batch)
+        return []
+
+    def _call(self, fn: Callable, args: tuple, limiter: RateLimiter, cost: float):
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire(cost)
+            with self._stats_lock:
+                self.stats["requests"] += 1
+            try:
+                result = fn(*args)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                if is_rate_limited(e):
+                    limiter.throttle()
+                # Full jitter keeps concurrent writers from retrying in lockstep
+                delay = random.uniform(
+                    0, min(BULK_BACKOFF_MAX, BULK_BACKOFF_BASE * 2**attempt)
+                )
+                delay = max(delay, retry_after(e) or 0.0)
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+                time.sleep(delay)
+                continue
+            limiter.recover()
+            return result
@@ -0,0 +1,224 @@
+import os
+import re
+import threading
+from typing import List, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.vector_search.bulk_client import estimate_tokens
+
+load_dotenv()
+# Fast (Rust) tokenizer counting tokens: a Hugging Face hub name or a local folder
+# with a tokenizer.json. Token counts are estimated when it cannot be loaded.
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "sentence-transformers/all-MiniLM-L6-v2")
+# Tokens per chunk the chunker aims for without exceeding
+CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", "256"))
+# Tokens of whole sentences repeated at the start of the next chunk
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "48"))
+
+# End of a sentence (punctuation, closing quotes or brackets, then whitespace) or a
+# blank line between paragraphs
+_SENTENCE_BOUNDARY = re.compile(r"([.!?]+[\"')\]]*)\s+|\n\s*\n")
+_WORD = re.compile(r"\S+")
+
+_counters: Dict[str, "TokenCounter"] = {}
+_counters_lock = threading.Lock()
+
+
+class TokenCounter:
+    """
+    Counts tokens with a Hugging Face fast tokenizer, loaded on first use.
+
+    Falls back to estimate_tokens (about four bytes per token) if the tokenizer
+    cannot be loaded, e.g. offline without a local copy.
+    """
+
+    def __init__(self, tokenizer_name: str = CHUNK_TOKENIZER):
+        """
+        Args:
+            tokenizer_name (str): Hub name, or folder containing a tokenizer.json.
+        """
+        self.tokenizer_name = tokenizer_name
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        """The loaded tokenizer, or None when token counts are estimated."""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._tokenizer = self._load()
+                    self._loaded = True
+        return self._tokenizer
+
+    def count(self, text: str) -> int:
+        """Number of tokens of a text, special tokens excluded."""
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        """
+        Count the tokens of several texts with one batched tokenizer call.
+
+        Args:
+            texts (List[str]): Texts to count.
+
+        Returns:
+            List[int]: Tokens per text, in input order.
+        """
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [estimate_tokens(text) for text in texts]
+        encodings = self.tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [len(encoding.ids) for encoding in encodings]
+
+    def _load(self):
+        try:
+            from tokenizers import Tokenizer
+
+            if os.path.isdir(self.tokenizer_name):
+                path = os.path.join(self.tokenizer_name, "tokenizer.json")
+                tokenizer = Tokenizer.from_file(path)
+            else:
+                tokenizer = Tokenizer.from_pretrained(self.tokenizer_name)
+        except Exception as e:
+            print(f"Estimating token counts, tokenizer {self.tokenizer_name} unavailable: {e}")
+            return None
+        # Count whole texts, not the model's truncated and padded inputs
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        return tokenizer
+
+
+def get_token_counter(tokenizer_name: str = CHUNK_TOKENIZER) -> TokenCounter:
+    """Return the process-wide TokenCounter of a tokenizer."""
+    with _counters_lock:
+        if tokenizer_name not in _counters:
+            _counters[tokenizer_name] = TokenCounter(tokenizer_name)
+        return _counters[tokenizer_name]
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """
+    Split text at sentence ends and blank lines.
+
+    Args:
+        text (str): Text to split.
+
+    Returns:
+        List[Tuple[int, int]]: Start and end offsets of each sentence in `text`,
+        without surrounding whitespace.
+    """
+    spans = []
+    start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text):
+        end = match.end(1) if match.group(1) else match.start()
+        spans.append((start, end))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    stripped = []
+    for start, end in spans:
+        segment = text[start:end]
+        leading = len(segment) - len(segment.lstrip())
+        trailing = len(segment) - len(segment.rstrip())
+        if end - trailing > start + leading:
+            stripped.append((start + leading, end - trailing))
+    return stripped
+
+
+def chunk_text(
+    text: str,
+    target_tokens: int = CHUNK_TARGET_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    counter: Optional[TokenCounter] = None,
+) -> List[Dict[str, any]]:
+    """
+    Pack text into chunks of up to `target_tokens`, breaking at sentence boundaries.
+
+    Sentences are packed greedily; each chunk after the first starts with the last
+    sentences of the previous one, up to `overlap_tokens`. A sentence longer than
+    `target_tokens` is split between words.
+
+    Args:
+        text (str): Text to chunk.
+        target_tokens (int): Most tokens per chunk.
+        overlap_tokens (int): Most tokens repeated from the previous chunk.
+        counter (TokenCounter, optional): Defaults to the CHUNK_TOKENIZER counter.
+
+    Returns:
+        List[Dict[str, any]]: Chunks with "text" (whitespace collapsed), "start" and
+        "end" (character offsets in `text`) and "tokens".
+    """
+    counter = counter or get_token_counter()
+    spans = split_sentences(text)
+    counts = counter.count_many([text[start:end] for start, end in spans])
+
+    # (start, end, tokens) of the pieces chunks are packed from
+    units = []
+    for (start, end), tokens in zip(spans, counts):
+        if tokens <= target_tokens:
+            units.append((start, end, tokens))
+        else:
+            units.extend(_split_words(text, start, end, target_tokens, counter))
+
+    chunks = []
+    current, tokens = [], 0
+    for unit in units:
+        if current and tokens + unit[2] > target_tokens:
+            chunks.append(_chunk(text, current, tokens))
+            # Carry the trailing sentences that fit the overlap, and still leave
+            # room for the next one
+            carried, carried_tokens = [], 0
+            for previous in reversed(current):
+                if carried_tokens + previous[2] > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[2]
+            while carried and carried_tokens + unit[2] > target_tokens:
+                carried_tokens -= carried.pop(0)[2]
+            current, tokens = carried, carried_tokens
+        current.append(unit)
+        tokens += unit[2]
+    if current:
+        chunks.append(_chunk(text, current, tokens))
+    return chunks
+
+
+def _split_words(
+    text: str, start: int, end: int, target_tokens: int, counter: TokenCounter
+) -> List[Tuple[int, int, int]]:
+    # Windows of whole words of up to target_tokens; a longer single word stays whole
+    words = [
+        (start + match.start(), start + match.end())
+        for match in _WORD.finditer(text, start, end)
+    ]
+    counts = counter.count_many([text[word_start:word_end] for word_start, word_end in words])
+
+    windows = []
+    window_start, window_end, tokens = None, None, 0
+    for (word_start, word_end), word_tokens in zip(words, counts):
+        if window_start is not None and tokens + word_tokens > target_tokens:
+            windows.append((window_start, window_end, tokens))
+            window_start, tokens = None, 0
+        if window_start is None:
+            window_start = word_start
+        window_end = word_end
+        tokens += word_tokens
+    if window_start is not None:
+        windows.append((window_start, window_end, tokens))
+    return windows
+
+
+def _chunk(
+    text: str, units: List[Tuple[int, int, int]], tokens: int
+) -> Dict[str, any]:
+    start, end = units[0][0], units[-1][1]
+    return {
+        "text": " ".join(text[start:end].split()),
+        "start": start,
+        "end": end,
+        "tokens": tokens,
+    }
@@ -1,12 +1,18 @@
-from pinecone import Pinecone
 import boto3
-from PyPDF2 import PdfReader
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
 import openai
 import os
 from dotenv import load_dotenv
 
+from backend.vector_search.bulk_client import BulkUpsertError
+from backend.vector_search.embedding_cache import cached_embed
+from backend.vector_search.pinecone_search import (
+    PINECONE_DOC_STORE_PATH,
+    PineconeVectorStore,
+    slim_metadata,
+)
+
 load_dotenv()
 PINE_API_KEY = os.getenv("PINE_API_KEY")
 PINE_INDEX_NAME = os.getenv("PINE_INDEX_NAME")
@@ -17,6 +23,8 @@ class PineconeDataImporter:
         self,
         api_key: str,
         index_name: str,
+        namespace: Optional[str] = None,
+        doc_store_path: str = PINECONE_DOC_STORE_PATH,
         # aws_access_key: str,
         # aws_secret_key: str,
         # aws_region: str,
@@ -27,22 +35,31 @@ class PineconeDataImporter:
         Args:
             api_key (str): Pinecone API key.
             index_name (str): Name of the Pinecone index.
+            namespace (str, optional): Namespace to write to, e.g. one per website (see
+                site_namespace). Defaults to the shared PINE_INDEX_NAME namespace.
+            doc_store_path (str): Local document store receiving the full metadata and
+                text; Pinecone gets the metadata slim_metadata keeps.
             aws_access_key (str): AWS access key for S3.
             aws_secret_key (str): AWS secret key for S3.
             aws_region (str): AWS region for S3.
         """
         self.api_key = api_key
         self.index_name = index_name
-
-        # Initialize Pinecone
-        pinecone = Pinecone(api_key=self.api_key)
-
-        print(pinecone.list_indexes().names())
-        if not pinecone.list_indexes() or self.index_name not in list(
-            pinecone.list_indexes().names()
-        ):
-            raise ValueError(f"Index '{self.index_name}' does not exist in Pinecone.")
-        self.index = pinecone.Index(self.index_name)
+        # Embedding, batching and writing are the vector store's, so imported records
+        # are stored exactly like the ones upserted through it
+        self.store = PineconeVectorStore(
+            api_key=api_key,
+            index_name=index_name,
+            namespace=namespace,
+            doc_store_path=doc_store_path,
+        )
+        # Read by IncrementalStore, so manifests match those of the store itself
+        self.embedding_model = self.store.embedding_model
+        self.namespace = self.store.namespace
+        self.doc_store = self.store.doc_store
+        self.index = self.store.index
+        self.pinecone = self.store.pinecone
+        self.bulk_client = self.store.bulk_client
 
         # # Initialize AWS S3 client
         # self.s3_client = boto3.client(
@@ -89,8 +106,10 @@ class PineconeDataImporter:
             },
         }
 
-        # Upsert the record into Pinecone
-        self.index.upsert(vectors=[record])
+        # Keep the text locally and upsert the slim record into Pinecone
+        self.doc_store.put_records([record])
+        record = {**record, "metadata": slim_metadata(record["metadata"])}
+        self.index.upsert(vectors=[record], namespace=self.namespace)
         print(f"Upserted record with ID: {record_id}")
 
     def upsert_all_rows(
@@ -100,71 +119,104 @@ class PineconeDataImporter:
         metadata_list: Dict[str, str],
         category: str,
         embedding_required: bool = False,
-    ) -> None:
+    ) -> List[str]:
         """
-        Upsert a single row into Pinecone.
+        Upsert many rows into Pinecone.
+
+        Rows are embedded and written by the bulk client, in batches sized to the
+        provider limits, with rate limiting and retries. Rows that keep failing are
+        isolated and reported; all others are written.
 
         Args:
-            record_id (str): Unique ID for the record.
-            text (str): Text to be embedded and stored.
-            metadata (Dict[str, str]): Metadata associated with the record.
-            category (str): Category of the record.
-            embedding_required (bool): Whether to generate an embedding for the text. Defaults to False.
+            record_id (List[str]): Unique ID of each row.
+            list_of_text (List[str]): Texts to be embedded and stored.
+            metadata_list (List[str]): Metadata associated with each row.
+            category (str): Category of the rows.
+            embedding_required (bool): Whether to generate embeddings for the texts. Defaults to False.
+
+        Returns:
+            List[str]: IDs of the rows that failed.
         """
-        # Generate embedding if required
-        embedding = None
-        if embedding_required:
-            embeddings = self._generate_bulk_embedding_using_pinecone(list_of_text)
-            if embeddings is None or len(embeddings) != len(list_of_text):
-                print("Failed to generate embedding for record ID")
-                return
+        if not embedding_required:
+            return []
+
+        records = [
+            {"id": id, "text": d, "metadata": m, "category": category}
+            for id, d, m in zip(record_id, list_of_text, metadata_list)
+        ]
+        try:
+            self.bulk_client.upsert(records)
+        except BulkUpsertError as e:
+            print(f"Failed to upsert {len(e.failed)} of {len(records)} rows: {e}")
+            return [failed_id for failed_id, _ in e.failed]
+        return []
+
+    def upsert(self, records: List[Dict[str, any]]) -> None:
+        """
+        Embed and upsert a batch of records, as VectorStore.upsert does.
 
-            vectors = []
-            for id, d, e, m in zip(record_id, list_of_text, embeddings, metadata_list):
-                vectors.append(
-                    {
-                        "id": id,
-                        "values": e,
-                        "metadata": {
-                            "chunk_text": d,
-                            "metadata": m,
-                            "category": category,
-                        },
-                    }
-                )
-            self.index.upsert(vectors=vectors, namespace=PINE_INDEX_NAME)
+        Args:
+            records (List[Dict[str, any]]): Records with "id", "text", "metadata" and "category".
+
+        Raises:
+            BulkUpsertError: If some records could not be written; the others were.
+        """
+        self.store.upsert(records)
+
+    def delete(self, ids: List[str]) -> None:
+        """
+        Delete records from Pinecone and the local document store.
+
+        Args:
+            ids (List[str]): IDs of the records to delete.
+        """
+        self.store.delete(ids)
 
     def process_pdf(self, pdf_path: str) -> None:
         """
-        Process a PDF file page by page and upsert each page into Pinecone.
+        Extract, chunk, embed and upsert a PDF with the staged ingestion pipeline.
 
         Args:
             pdf_path (str): Path to the PDF file.
         """
-        reader = PdfReader(pdf_path)
-        for page_number, page in enumerate(reader.pages, start=1):
-            text = page.extract_text()
-            if text:
-                record_id = f"{pdf_path}_page_{page_number}"
-                metadata = {"source": pdf_path, "page_number": str(page_number)}
-                self.upsert_single_row(record_id, text, metadata, category="pdf_page")
-        print(f"Processed and upserted all pages from PDF: {pdf_path}")
-
-    def process_text_file(self, text_file_path: str) -> None:
+        self.process_pdfs([pdf_path])
+
+    def process_pdfs(self, pdf_paths: List[str], manifest=None) -> Dict[str, float]:
+        """
+        Ingest several PDFs, extracting pages in parallel and upserting in batches.
+
+        Args:
+            pdf_paths (List[str]): Paths to the PDF files.
+            manifest (IngestionManifest, optional): Skip chunks that are unchanged since
+                the last ingestion and delete the ones the PDFs no longer contain.
+
+        Returns:
+            Dict[str, float]: Ingestion statistics, see IngestionPipeline.ingest_pdfs.
+        """
+        from backend.vector_search.ingestion import IngestionPipeline
+
+        return IngestionPipeline(self, manifest=manifest).ingest_pdfs(pdf_paths)
+
+    def process_text_file(
+        self, text_file_path: str, resume: bool = True, manifest=None
+    ) -> Dict[str, float]:
         """
-        Process a text file line by line and upsert each line into Pinecone.
+        Stream a text file into Pinecone in embedded, batched upserts, resuming after
+        the last committed batch of an interrupted run.
 
         Args:
             text_file_path (str): Path to the text file.
+            resume (bool): Continue from the checkpoint; False starts over.
+            manifest (IngestionManifest, optional): Skip unchanged lines and delete
+                the records of removed ones after a complete pass.
+
+        Returns:
+            Dict[str, float]: Ingestion statistics, see IngestionPipeline.ingest_text_file.
         """
-        with open(text_file_path, "r") as file:
-            for line_number, line in enumerate(file, start=1):
-                record_id = f"{text_file_path}_line_{line_number}"
-                metadata = {"source": text_file_path, "line_number": str(line_number)}
-                self.upsert_single_row(
-                    record_id, line.strip(), metadata, category="text_file"
-                )
-        print(f"Processed and upserted all lines from text file: {text_file_path}")
+        from backend.vector_search.ingestion import IngestionPipeline
+
+        pipeline = IngestionPipeline(self, manifest=manifest)
+        return pipeline.ingest_text_file(text_file_path, resume=resume)
 
     # def bulk_import_from_s3(self, bucket_name: str, s3_path: str) -> None:
     #     """
@@ -198,10 +250,17 @@ class PineconeDataImporter:
             List[float]: The generated embedding.
         """
         try:
-            response = openai.embeddings.create(
-                input=text, model="text-embedding-ada-002"
+            embeddings = cached_embed(
+                "text-embedding-ada-002",
+                [text],
+                lambda inputs: [
+                    item.embedding
+                    for item in openai.embeddings.create(
+                        input=inputs, model="text-embedding-ada-002"
+                    ).data
+                ],
             )
-            return response.data[0].embedding
+            return embeddings[0].tolist()
         except Exception as e:
             print(f"Error generating embedding: {e}")
             return None
@@ -220,14 +279,12 @@ class PineconeDataImporter:
         """
         try:
             print(f"Generating embeddings for {len(text_list)} texts.")
-            pc = Pinecone(api_key=self.api_key)
-            embeddings = pc.inference.embed(
-                model="llama-text-embed-v2",
-                inputs=text_list,
-                parameters={"input_type": "passage"},
-            )
-
-            embeddings_list = [embedding["values"] for embedding in embeddings]
+            # Cached, rate-limited and retried like the bulk upserts
+            embeddings_list = []
+            records = [{"id": str(i), "text": text} for i, text in enumerate(text_list)]
+            for batch in self.bulk_client.batches(records):
+                texts = [record["text"] for record in batch]
+                embeddings_list += self.bulk_client.embed(texts)
 
             # assert that embeddings_list has the same length as text_list
             assert len(embeddings_list) == len(text_list)
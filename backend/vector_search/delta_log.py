@@ -0,0 +1,166 @@
+import os
+import struct
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+ADD = 1
+DELETE = 2
+
+# Every record starts with the operation and the FAISS ID; additions carry the vector
+_HEADER = struct.Struct("<Bq")
+
+
+class DeltaLog:
+    """
+    Append-only binary log of additions and deletions applied on top of a base FAISS
+    snapshot.
+
+    Every process sharing an index appends its writes here and replays the records
+    written by the others, so an upsert costs O(batch) instead of rewriting the whole
+    index file.
+    """
+
+    def __init__(self, path: str, dim: int):
+        """
+        Open a delta log.
+
+        Args:
+            path (str): Path of the log file; created on first append.
+            dim (int): Dimension of the logged vectors.
+        """
+        self.path = path
+        self.dim = dim
+        # Bytes already replayed into memory by this process
+        self.offset = 0
+        self._add_size = _HEADER.size + 4 * dim
+
+    def append_additions(self, ids, vectors) -> None:
+        """
+        Log new vectors.
+
+        Args:
+            ids (list): FAISS IDs.
+            vectors (numpy array): Vectors of shape (len(ids), dim).
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        buffer = bytearray()
+        for faiss_id, vector in zip(ids, vectors):
+            buffer += _HEADER.pack(ADD, int(faiss_id))
+            buffer += vector.tobytes()
+        self._write(bytes(buffer))
+
+    def append_deletions(self, ids) -> None:
+        """
+        Log deleted IDs.
+
+        Args:
+            ids (list): FAISS IDs.
+        """
+        self._write(b"".join(_HEADER.pack(DELETE, int(faiss_id)) for faiss_id in ids))
+
+    def size(self) -> int:
+        """Current size of the log file in bytes."""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def read_new(self) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Read the records appended since the last call.
+
+        Consecutive records of the same kind are grouped, so callers can apply them
+        as batches. A truncated trailing record (e.g. a crash mid-write) is left for
+        a later call.
+
+        Returns:
+            List[Tuple[int, numpy array, numpy array]]: (operation, ids, vectors) groups;
+            vectors is None for deletions.
+        """
+        data = self.read_bytes(self.offset)
+        groups = []
+        position = 0
+        while position + _HEADER.size <= len(data):
+            operation, faiss_id = _HEADER.unpack_from(data, position)
+            if operation == ADD:
+                if position + self._add_size > len(data):
+                    break
+                vector = np.frombuffer(
+                    data, dtype=np.float32, count=self.dim, offset=position + _HEADER.size
+                )
+                position += self._add_size
+            elif operation == DELETE:
+                vector = None
+                position += _HEADER.size
+            else:
+                raise ValueError(
+                    f"Corrupt delta log {self.path} at byte {self.offset + position}."
+                )
+
+            if not groups or groups[-1][0] != operation:
+                groups.append((operation, [], []))
+            groups[-1][1].append(faiss_id)
+            groups[-1][2].append(vector)
+
+        self.offset += position
+        return [
+            (
+                operation,
+                np.array(ids, dtype=np.int64),
+                np.vstack(vectors) if operation == ADD else None,
+            )
+            for operation, ids, vectors in groups
+        ]
+
+    def read_bytes(self, start: int) -> bytes:
+        """Read the raw log from byte `start` to the end."""
+        try:
+            with open(self.path, "rb") as file:
+                file.seek(start)
+                return file.read()
+        except FileNotFoundError:
+            return b""
+
+    def _write(self, data: bytes) -> None:
+        if not data:
+            return
+        with open(self.path, "ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """
+    Hold an exclusive advisory lock on `path` across processes.
+
+    Args:
+        path (str): Lock file path; created if missing.
+        blocking (bool): Wait for the lock instead of giving up.
+
+    Yields:
+        bool: Whether the lock was acquired (always True when blocking).
+    """
+    if fcntl is None:
+        yield True
+        return
+
+    with open(path, "a") as lock_file:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file.fileno(), flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
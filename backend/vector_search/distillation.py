@@ -0,0 +1,309 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Awaitable, Callable, List, Dict, Optional
+
+from dotenv import load_dotenv
+
+from backend.vector_search.bulk_client import (
+    BULK_BACKOFF_BASE,
+    BULK_BACKOFF_MAX,
+    BULK_MAX_RETRIES,
+    get_rate_limiter,
+    is_rate_limited,
+    is_retryable,
+    retry_after,
+)
+
+load_dotenv()
+# Questions answered at the same time
+DISTILL_CONCURRENCY = int(os.getenv("DISTILL_CONCURRENCY", "8"))
+# Request limit of the LLM provider answering the questions
+DISTILL_REQUESTS_PER_MINUTE = float(os.getenv("DISTILL_REQUESTS_PER_MINUTE", "500"))
+# Answered pairs handed to the vector store per upsert call
+DISTILL_UPSERT_BATCH_SIZE = int(os.getenv("DISTILL_UPSERT_BATCH_SIZE", "90"))
+DISTILL_PROGRESS_INTERVAL = float(os.getenv("DISTILL_PROGRESS_INTERVAL", "10"))
+
+
+def qa_record(idx: int, question: str, answer: str) -> Dict[str, any]:
+    """
+    Vector store record of a question-answer pair.
+
+    Args:
+        idx (int): 1-based position of the pair in its Q&A file.
+        question (str): The question.
+        answer (str): The answer.
+
+    Returns:
+        Dict[str, any]: Record with "id", "text", "metadata" and "category".
+    """
+    metadata = {"source": "questions_and_answers", "entry_id": str(idx)}
+    return {
+        "id": f"qa_{idx}",
+        "text": f"Q: {question}\nA: {answer}",
+        "metadata": json.dumps(metadata),  # Convert metadata to a JSON string
+        "category": "qa",
+    }
+
+
+def read_checkpoint(checkpoint_path: str) -> Dict[str, str]:
+    """
+    Read the answers finished by earlier runs.
+
+    A line cut short by a crash is ignored; its question is asked again.
+
+    Args:
+        checkpoint_path (str): JSONL file with one {"question", "answer"} per line.
+
+    Returns:
+        Dict[str, str]: Answer per question.
+    """
+    answers = {}
+    if not os.path.exists(checkpoint_path):
+        return answers
+    with open(checkpoint_path, "r") as file:
+        for line_number, line in enumerate(file, start=1):
+            try:
+                entry = json.loads(line)
+                answers[entry["question"]] = entry["answer"]
+            except (ValueError, KeyError, TypeError):
+                print(f"Ignoring incomplete checkpoint line {line_number}.")
+    return answers
+
+
+class DistillationRunner:
+    """
+    Answers a list of questions with an LLM to build a Q&A file, concurrently and
+    resumably.
+
+    Up to `concurrency` questions are in flight, paced by a per-provider rate
+    limiter and retried with jittered backoff on rate limits and transient errors.
+    Every answer is appended to a JSONL checkpoint as soon as it arrives, so an
+    interrupted run only asks the questions it had not finished. With a store,
+    answered pairs are upserted in batches while distillation continues.
+    """
+
+    def __init__(
+        self,
+        answer_fn: Callable[[str], Awaitable[str]],
+        store=None,
+        concurrency: int = DISTILL_CONCURRENCY,
+        requests_per_minute: float = DISTILL_REQUESTS_PER_MINUTE,
+        provider: str = "openai",
+        upsert_batch_size: int = DISTILL_UPSERT_BATCH_SIZE,
+        max_retries: int = BULK_MAX_RETRIES,
+        progress_interval: float = DISTILL_PROGRESS_INTERVAL,
+    ):
+        """
+        Initialize the runner.
+
+        Args:
+            answer_fn (Callable): Coroutine function returning the answer to a question.
+            store (VectorStore, optional): Store receiving the answered pairs, e.g. an
+                IncrementalStore so pairs upserted before a crash are skipped.
+            concurrency (int): Questions answered at the same time.
+            requests_per_minute (float): Request limit of the provider.
+            provider (str): Provider name; runners of the same provider share a limiter.
+            upsert_batch_size (int): Pairs per upsert call.
+            max_retries (int): Attempts per question after the first.
+            progress_interval (float): Seconds between progress reports.
+        """
+        self.answer_fn = answer_fn
+        self.store = store
+        self.concurrency = concurrency
+        self.limiter = get_rate_limiter(
+            f"{provider}-requests", requests_per_minute / 60
+        )
+        self.upsert_batch_size = upsert_batch_size
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+
+    async def run_file(
+        self,
+        input_file: str,
+        output_file: str,
+        checkpoint_path: Optional[str] = None,
+        resume: bool = True,
+    ) -> Dict[str, float]:
+        """
+        Answer the questions of a file and save the pairs as a JSON array.
+
+        Args:
+            input_file (str): File with one question per line.
+            output_file (str): JSON file receiving [{"question", "answer"}, ...] in
+                question order; unanswered questions get an empty answer, so entry
+                positions (and the qa_<n> IDs derived from them) stay stable.
+            checkpoint_path (str, optional): JSONL checkpoint; defaults to
+                "<output_file>.partial.jsonl".
+            resume (bool): Reuse the answers in the checkpoint; False starts over.
+
+        Returns:
+            Dict[str, float]: Statistics, see run.
+        """
+        with open(input_file, "r") as file:
+            questions = [line.strip() for line in file if line.strip()]
+
+        checkpoint_path = checkpoint_path or f"{output_file}.partial.jsonl"
+        results, stats = await self.run(questions, checkpoint_path, resume=resume)
+
+        with open(output_file, "w") as json_file:
+            json.dump(results, json_file, indent=4)
+        print(f"Questions and answers saved to {output_file}")
+        return stats
+
+    async def run(
+        self, questions: List[str], checkpoint_path: str, resume: bool = True
+    ):
+        """
+        Answer questions, checkpointing and upserting the answers as they arrive.
+
+        Args:
+            questions (List[str]): Questions to answer.
+            checkpoint_path (str): JSONL checkpoint of finished answers.
+            resume (bool): Reuse the answers in the checkpoint; False starts over.
+
+        Returns:
+            Tuple[List[Dict[str, str]], Dict[str, float]]: The {"question", "answer"}
+            pairs in question order, and the numbers of questions, answers resumed
+            from the checkpoint, answered and failed questions, retries, pairs that
+            failed to upsert and elapsed seconds.
+        """
+        start = time.perf_counter()
+        if not resume and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        answers = read_checkpoint(checkpoint_path)
+        stats = {
+            "questions": len(questions),
+            "resumed": sum(question in answers for question in set(questions)),
+            "answered": 0,
+            "failed": 0,
+            "retries": 0,
+            "upsert_failures": 0,
+        }
+        print(
+            f"Distilling {len(questions)} questions, "
+            f"{stats['resumed']} answered in the checkpoint."
+        )
+
+        directory = os.path.dirname(checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(checkpoint_path) and os.path.getsize(checkpoint_path):
+            # Terminate a line cut short by a crash, so new entries start on their own
+            with open(checkpoint_path, "rb+") as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    file.write(b"\n")
+
+        pending = asyncio.Queue()
+        upserts = asyncio.Queue()
+        for idx, question in enumerate(questions, start=1):
+            if question in answers:
+                # Cheap when the store skips unchanged records
+                await upserts.put(qa_record(idx, question, answers[question]))
+            else:
+                pending.put_nowait((idx, question))
+
+        with open(checkpoint_path, "a") as checkpoint:
+            writer = asyncio.create_task(self._write_upserts(upserts, stats))
+            reporter = asyncio.create_task(self._report_progress(stats, pending))
+            workers = [
+                asyncio.create_task(
+                    self._answer_questions(pending, upserts, answers, checkpoint, stats)
+                )
+                for _ in range(self.concurrency)
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                reporter.cancel()
+                await upserts.put(None)
+                await writer
+
+        stats["seconds"] = time.perf_counter() - start
+        print(f"Distillation finished: {stats}")
+        results = [
+            {"question": question, "answer": answers.get(question, "")}
+            for question in questions
+        ]
+        return results, stats
+
+    async def _answer_questions(
+        self,
+        pending: asyncio.Queue,
+        upserts: asyncio.Queue,
+        answers: Dict[str, str],
+        checkpoint,
+        stats: Dict[str, float],
+    ) -> None:
+        while not pending.empty():
+            idx, question = pending.get_nowait()
+            if question in answers:
+                # A duplicate of a question answered meanwhile
+                await upserts.put(qa_record(idx, question, answers[question]))
+                continue
+            try:
+                answer = await self._answer(question, stats)
+            except Exception as e:
+                print(f"Failed to answer question {idx} ({question}): {e}")
+                stats["failed"] += 1
+                continue
+
+            answers[question] = answer
+            entry = {"question": question, "answer": answer}
+            checkpoint.write(json.dumps(entry) + "\n")
+            checkpoint.flush()
+            stats["answered"] += 1
+            await upserts.put(qa_record(idx, question, answer))
+
+    async def _answer(self, question: str, stats: Dict[str, float]) -> str:
+        for attempt in range(self.max_retries + 1):
+            await asyncio.to_thread(self.limiter.acquire)
+            try:
+                answer = await self.answer_fn(question)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                if is_rate_limited(e):
+                    self.limiter.throttle()
+                delay = random.uniform(
+                    0, min(BULK_BACKOFF_MAX, BULK_BACKOFF_BASE * 2**attempt)
+                )
+                stats["retries"] += 1
+                await asyncio.sleep(max(delay, retry_after(e) or 0.0))
+                continue
+            self.limiter.recover()
+            return answer
+
+    async def _write_upserts(
+        self, upserts: asyncio.Queue, stats: Dict[str, float]
+    ) -> None:
+        # One writer, so upserts never hold up the answering workers
+        batch = []
+        while True:
+            record = await upserts.get()
+            if record is not None:
+                batch.append(record)
+            if batch and (record is None or len(batch) >= self.upsert_batch_size):
+                if self.store is not None:
+                    try:
+                        await asyncio.to_thread(self.store.upsert, batch)
+                    except Exception as e:
+                        # The pairs are checkpointed and upserted again on resume
+                        print(f"Error upserting {len(batch)} Q&A pairs: {e}")
+                        stats["upsert_failures"] += len(batch)
+                batch = []
+            if record is None:
+                return
+
+    async def _report_progress(
+        self, stats: Dict[str, float], pending: asyncio.Queue
+    ) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            print(
+                f"Distillation progress: {stats['answered']} answered, "
+                f"{stats['failed']} failed, about {pending.qsize()} left"
+            )
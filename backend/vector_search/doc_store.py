@@ -0,0 +1,258 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# Bytes of the database file SQLite reads through a shared memory mapping instead of read()
+DOC_STORE_MMAP_SIZE = int(os.getenv("DOC_STORE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+class DocStore:
+    """
+    SQLite-backed store mapping string record IDs to the int64 IDs used by FAISS,
+    together with the metadata of every record.
+
+    FAISS only keeps vectors and integer IDs, so everything Pinecone would return as
+    metadata (chunk text, source, category) lives here. Pinecone stores use it too,
+    so queries only return IDs and scores and the text is read locally.
+    """
+
+    def __init__(self, db_path: str, mmap_size: int = DOC_STORE_MMAP_SIZE):
+        """
+        Open (or create) the document store.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            mmap_size (int): Bytes of the file accessed through a memory mapping, so
+                hot pages are shared with the page cache instead of copied; 0 disables it.
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                faiss_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                record_id TEXT UNIQUE NOT NULL,
+                category TEXT,
+                metadata TEXT NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self.connection.commit()
+
+    def assign_ids(self, record_ids: List[str]) -> List[int]:
+        """
+        Return the FAISS ID of every record, allocating new IDs for unknown records.
+
+        Args:
+            record_ids (List[str]): String record IDs, e.g. "qa_1".
+
+        Returns:
+            List[int]: FAISS IDs in the same order as `record_ids`.
+        """
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO documents (record_id, metadata) VALUES (?, '{}')",
+                [(record_id,) for record_id in record_ids],
+            )
+            self.connection.commit()
+            known = self._lookup(record_ids)
+        return [known[record_id] for record_id in record_ids]
+
+    def lookup_ids(self, record_ids: List[str]) -> Dict[str, int]:
+        """
+        Return the FAISS IDs of the records that are already stored.
+
+        Args:
+            record_ids (List[str]): String record IDs.
+
+        Returns:
+            Dict[str, int]: Mapping of record ID to FAISS ID for known records.
+        """
+        with self._lock:
+            return self._lookup(record_ids)
+
+    def put(self, faiss_ids: List[int], metadata_list: List[Dict[str, any]]) -> None:
+        """
+        Store the metadata of records whose IDs were allocated with `assign_ids`.
+
+        Args:
+            faiss_ids (List[int]): FAISS IDs of the records.
+            metadata_list (List[Dict[str, any]]): Metadata of every record.
+        """
+        with self._lock:
+            self.connection.executemany(
+                "UPDATE documents SET category = ?, metadata = ? WHERE faiss_id = ?",
+                [
+                    (metadata.get("category"), json.dumps(metadata), faiss_id)
+                    for faiss_id, metadata in zip(faiss_ids, metadata_list)
+                ],
+            )
+            self.connection.commit()
+
+    def put_records(self, records: List[Dict[str, any]]) -> List[int]:
+        """
+        Store records by record ID, replacing the metadata of existing records.
+
+        Args:
+            records (List[Dict[str, any]]): Records with "id" and "metadata".
+
+        Returns:
+            List[int]: FAISS IDs of the records, in input order.
+        """
+        faiss_ids = self.assign_ids([record["id"] for record in records])
+        self.put(faiss_ids, [record["metadata"] for record in records])
+        return faiss_ids
+
+    def get_by_record_ids(self, record_ids: List[str]) -> Dict[str, Dict[str, any]]:
+        """
+        Fetch the metadata of records by record ID.
+
+        Args:
+            record_ids (List[str]): String record IDs, e.g. "qa_1".
+
+        Returns:
+            Dict[str, Dict[str, any]]: Mapping of record ID to metadata for known records.
+        """
+        rows = []
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(record_ids), 500):
+                chunk = list(record_ids[start : start + 500])
+                placeholders = ",".join("?" * len(chunk))
+                rows += self.connection.execute(
+                    f"SELECT record_id, metadata FROM documents WHERE record_id IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+        return {record_id: json.loads(metadata) for record_id, metadata in rows}
+
+    def get_many(self, faiss_ids: List[int]) -> Dict[int, Dict[str, any]]:
+        """
+        Fetch records by FAISS ID.
+
+        Args:
+            faiss_ids (List[int]): FAISS IDs to fetch.
+
+        Returns:
+            Dict[int, Dict[str, any]]: Mapping of FAISS ID to a dictionary with the
+            record ID ("id") and its metadata ("metadata").
+        """
+        rows = []
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(faiss_ids), 500):
+                chunk = [int(faiss_id) for faiss_id in faiss_ids[start : start + 500]]
+                placeholders = ",".join("?" * len(chunk))
+                rows += self.connection.execute(
+                    f"SELECT faiss_id, record_id, metadata FROM documents WHERE faiss_id IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+        return {
+            faiss_id: {"id": record_id, "metadata": json.loads(metadata)}
+            for faiss_id, record_id, metadata in rows
+        }
+
+    def iter_metadata(self, category: Optional[str] = None):
+        """
+        Iterate over stored records.
+
+        Args:
+            category (str, optional): Only yield records of this category.
+
+        Yields:
+            Tuple[int, str, Dict[str, any]]: FAISS ID, record ID and metadata.
+        """
+        query = "SELECT faiss_id, record_id, metadata FROM documents"
+        params = []
+        if category is not None:
+            query += " WHERE category = ?"
+            params.append(category)
+        with self._lock:
+            rows = self.connection.execute(query, params).fetchall()
+        for faiss_id, record_id, metadata in rows:
+            yield faiss_id, record_id, json.loads(metadata)
+
+    def delete(self, record_ids: List[str]) -> List[int]:
+        """
+        Delete records by record ID.
+
+        Args:
+            record_ids (List[str]): String record IDs to delete.
+
+        Returns:
+            List[int]: FAISS IDs of the records that were deleted.
+        """
+        with self._lock:
+            known = self._lookup(record_ids)
+            self.connection.executemany(
+                "DELETE FROM documents WHERE record_id = ?",
+                [(record_id,) for record_id in known],
+            )
+            self.connection.commit()
+        return list(known.values())
+
+    def get_state(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Read a value from the key-value state table (e.g. the last sync time).
+
+        Args:
+            key (str): State key.
+            default (str, optional): Value returned when the key is not set.
+
+        Returns:
+            Optional[str]: The stored value or `default`.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value FROM state WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key: str, value: str) -> None:
+        """
+        Write a value to the key-value state table.
+
+        Args:
+            key (str): State key.
+            value (str): Value to store.
+        """
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value)
+            )
+            self.connection.commit()
+
+    def count(self) -> int:
+        """Return the number of stored records."""
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self.connection.close()
+
+    def _lookup(self, record_ids: List[str]) -> Dict[str, int]:
+        known = {}
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(record_ids), 500):
+            chunk = record_ids[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT record_id, faiss_id FROM documents WHERE record_id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            known.update(dict(rows))
+        return known
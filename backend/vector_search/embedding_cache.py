@@ -0,0 +1,412 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Callable, List, Dict, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache")
+# Disk budget for the vectors of each model, in MB; least recently used entries
+# are evicted beyond it
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024"))
+# Seconds between writes of the entries' last-use times; hits only record them in
+# memory until then, or until the next put needs them to pick what to evict
+EMBEDDING_CACHE_TOUCH_INTERVAL = float(
+    os.getenv("EMBEDDING_CACHE_TOUCH_INTERVAL", "30")
+)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize a text and collapse its whitespace, as tokenizers do."""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+def text_key(text: str) -> str:
+    """Cache key of a text: the SHA-256 of its normalized form."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model, normalized text hash), shared by every
+    process that points at the same directory.
+
+    The vectors of each model live in one memory-mapped float32 file with a fixed
+    number of slots, sized from `max_mb`; a SQLite index maps keys to slots and
+    tracks when each entry was last used. Once a model's file is full, new vectors
+    overwrite the slots of its least recently used entries.
+
+    A companion tag file records which key each slot holds. Writers clear a slot's
+    tag before overwriting its vector, and readers check the tag before and after
+    copying, so a vector being replaced by another process is a miss, not a wrong hit.
+    """
+
+    def __init__(
+        self, cache_dir: str = EMBEDDING_CACHE_DIR, max_mb: int = EMBEDDING_CACHE_MAX_MB
+    ):
+        """
+        Open (or create) the cache.
+
+        Args:
+            cache_dir (str): Directory holding the index and the vector files.
+            max_mb (int): Disk budget for the vectors of each model, in MB.
+        """
+        self.cache_dir = cache_dir
+        self.max_mb = max_mb
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Memory maps of the vector and slot tag files, per model
+        self._arrays: Dict[str, np.memmap] = {}
+        self._tags: Dict[str, np.memmap] = {}
+        # Last-use times of hits not yet written to the index, by (model, key)
+        self._touched: Dict[Tuple[str, str], float] = {}
+        self._touched_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.connection = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"),
+            check_same_thread=False,
+            timeout=30,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                next_slot INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, key)
+            );
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (model, last_used);
+            """
+        )
+        self.connection.commit()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up the embeddings of texts.
+
+        Args:
+            model (str): Model the embeddings were produced with, including any
+                setting that changes them, e.g. "llama-text-embed-v2/query".
+            texts (List[str]): Texts to look up.
+
+        Returns:
+            List[Optional[np.ndarray]]: The cached embedding of each text, or None.
+        """
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            array = self._array(model)
+            if array is None:
+                self.misses += len(texts)
+                return [None] * len(texts)
+
+            slots = self._slots(model, keys)
+            tags = self._tags[model]
+            found = list(slots)
+            positions = np.array([slots[key] for key in found], dtype=np.int64)
+            expected = np.array([_tag(key) for key in found], dtype=np.uint64)
+            before = tags[positions]
+            vectors = np.array(array[positions])
+            after = tags[positions]
+            # Slots another process started overwriting since the lookup are misses
+            valid = {
+                key: vector
+                for key, vector, ok in zip(
+                    found, vectors, (before == expected) & (after == expected)
+                )
+                if ok
+            }
+            results = [valid.get(key) for key in keys]
+
+            now = time.time()
+            for key in valid:
+                self._touched[(model, key)] = now
+            if time.monotonic() - self._touched_at >= EMBEDDING_CACHE_TOUCH_INTERVAL:
+                self._write_touched()
+                self.connection.commit()
+            hits = sum(key in valid for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors) -> None:
+        """
+        Store the embeddings of texts, evicting least recently used entries if needed.
+
+        Args:
+            model (str): Model the embeddings were produced with, see get_many.
+            texts (List[str]): The embedded texts.
+            vectors: Embeddings of shape (len(texts), dim), in input order.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        # The last vector wins for texts that normalize to the same key
+        by_key = {text_key(text): vector for text, vector in zip(texts, vectors)}
+
+        with self._lock:
+            array = self._array(model, vectors.shape[1])
+            tags = self._tags[model]
+            capacity = array.shape[0]
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Recent hits must count before picking the entries to evict
+                self._write_touched()
+                slots = self._slots(model, list(by_key))
+                new_keys = [key for key in by_key if key not in slots][-capacity:]
+
+                (next_slot,) = self.connection.execute(
+                    "SELECT next_slot FROM models WHERE model = ?", (model,)
+                ).fetchone()
+                fresh = min(len(new_keys), capacity - next_slot)
+                free_slots = list(range(next_slot, next_slot + fresh))
+                if len(new_keys) > fresh:
+                    # Entries being overwritten keep their slots
+                    evicted = self.connection.execute(
+                        "SELECT key, slot FROM entries WHERE model = ? "
+                        "ORDER BY last_used LIMIT ?",
+                        (model, len(new_keys) - fresh + len(slots)),
+                    ).fetchall()
+                    evicted = [row for row in evicted if row[0] not in slots]
+                    evicted = evicted[: len(new_keys) - fresh]
+                    self.connection.executemany(
+                        "DELETE FROM entries WHERE model = ? AND key = ?",
+                        [(model, key) for key, _ in evicted],
+                    )
+                    free_slots += [slot for _, slot in evicted]
+                    self.evictions += len(evicted)
+                slots.update(zip(new_keys, free_slots))
+
+                # Vectors first, so a committed entry never points at an unwritten
+                # slot; tags cleared meanwhile, so readers skip slots being rewritten
+                positions = np.array(list(slots.values()), dtype=np.int64)
+                tags[positions] = 0
+                for key, slot in slots.items():
+                    array[slot] = by_key[key]
+                tags[positions] = np.array([_tag(key) for key in slots], dtype=np.uint64)
+                array.flush()
+                tags.flush()
+
+                now = time.time()
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                    [(model, key, slot, now) for key, slot in slots.items()],
+                )
+                self.connection.execute(
+                    "UPDATE models SET next_slot = ? WHERE model = ?",
+                    (next_slot + fresh, model),
+                )
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+
+    def embed(
+        self, model: str, texts: List[str], embed_fn: Callable[[List[str]], any]
+    ) -> Optional[np.ndarray]:
+        """
+        Embed texts, computing and storing only the ones missing from the cache.
+
+        Args:
+            model (str): Model the embeddings are produced with, see get_many.
+            texts (List[str]): Texts to embed.
+            embed_fn (Callable): Embeds a list of texts, returning one vector per text
+                in input order, or None on failure.
+
+        Returns:
+            np.ndarray: float32 embeddings of shape (len(texts), dim), in input order;
+            None when embed_fn failed.
+        """
+        if not texts:
+            return _as_array(embed_fn(texts))
+
+        cached = self.get_many(model, texts)
+        missing = {}
+        for position, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(texts[position], []).append(position)
+        if missing:
+            computed = _as_array(embed_fn(list(missing)))
+            if computed is None:
+                return None
+            self.put_many(model, list(missing), computed)
+            for positions, vector in zip(missing.values(), computed):
+                for position in positions:
+                    cached[position] = vector
+        return np.stack(cached)
+
+    def stats(self) -> Dict[str, any]:
+        """Hits, misses and evictions of this process, and entries and capacity per model."""
+        with self._lock:
+            rows = self.connection.execute(
+                """
+                SELECT models.model, models.dim, models.capacity, COUNT(entries.key)
+                FROM models LEFT JOIN entries ON entries.model = models.model
+                GROUP BY models.model
+                """
+            ).fetchall()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "models": {
+                model: {"dim": dim, "capacity": capacity, "entries": entries}
+                for model, dim, capacity, entries in rows
+            },
+        }
+
+    def close(self) -> None:
+        """Write pending last-use times, flush the vector files and close the index."""
+        with self._lock:
+            self._write_touched()
+            self.connection.commit()
+            for array in [*self._arrays.values(), *self._tags.values()]:
+                array.flush()
+            self._arrays.clear()
+            self._tags.clear()
+            self.connection.close()
+
+    def _write_touched(self) -> None:
+        # Write the pending last-use times; the caller commits
+        if self._touched:
+            self.connection.executemany(
+                "UPDATE entries SET last_used = MAX(last_used, ?) "
+                "WHERE model = ? AND key = ?",
+                [(used, model, key) for (model, key), used in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def _array(self, model: str, dim: Optional[int] = None) -> Optional[np.memmap]:
+        # Memory map of a model's vectors, created on its first put
+        if model in self._arrays:
+            array = self._arrays[model]
+            if dim is not None and array.shape[1] != dim:
+                raise ValueError(
+                    f"Embeddings of {model} have dimension {array.shape[1]}, got {dim}."
+                )
+            return array
+
+        row = self.connection.execute(
+            "SELECT file, dim, capacity FROM models WHERE model = ?", (model,)
+        ).fetchone()
+        if row is None:
+            if dim is None:
+                return None
+            capacity = max(1, self.max_mb * 2**20 // (4 * dim))
+            digest = hashlib.sha1(model.encode("utf-8")).hexdigest()[:16]
+            file_name = f"{digest}_{dim}.f32"
+            self.connection.execute(
+                "INSERT OR IGNORE INTO models VALUES (?, ?, ?, ?, 0)",
+                (model, file_name, dim, capacity),
+            )
+            self.connection.commit()
+            # Another process may have registered the model first
+            row = self.connection.execute(
+                "SELECT file, dim, capacity FROM models WHERE model = ?", (model,)
+            ).fetchone()
+
+        file_name, stored_dim, capacity = row
+        if dim is not None and stored_dim != dim:
+            raise ValueError(
+                f"Embeddings of {model} have dimension {stored_dim}, got {dim}."
+            )
+        path = os.path.join(self.cache_dir, file_name)
+        # Slots of caches written before the tag file existed read as misses once
+        tags_path = os.path.splitext(path)[0] + ".tags"
+        sizes = ((path, capacity * stored_dim * 4), (tags_path, capacity * 8))
+        for file_path, size in sizes:
+            # Grow the file in place (sparse) rather than truncating what others wrote
+            with open(file_path, "ab") as file:
+                if file.tell() < size:
+                    file.truncate(size)
+        array = np.memmap(
+            path, dtype=np.float32, mode="r+", shape=(capacity, stored_dim)
+        )
+        self._tags[model] = np.memmap(
+            tags_path, dtype=np.uint64, mode="r+", shape=(capacity,)
+        )
+        self._arrays[model] = array
+        return array
+
+    def _slots(self, model: str, keys: List[str]) -> Dict[str, int]:
+        slots = {}
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                "SELECT key, slot FROM entries "
+                f"WHERE model = ? AND key IN ({placeholders})",
+                [model, *chunk],
+            ).fetchall()
+            slots.update(rows)
+        return slots
+
+
+def _tag(key: str) -> int:
+    # Slot tag of a key: its leading 64 bits, never 0, which marks a slot being written
+    return int(key[:16], 16) or 1
+
+
+def _as_array(vectors) -> Optional[np.ndarray]:
+    if vectors is None:
+        return None
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Return the process-wide embedding cache, or None when EMBEDDING_CACHE_ENABLED is off.
+    """
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+def cached_embed(
+    model: str, texts: List[str], embed_fn: Callable[[List[str]], any]
+) -> Optional[np.ndarray]:
+    """
+    Embed texts through the process-wide cache, see EmbeddingCache.embed.
+
+    Args:
+        model (str): Model the embeddings are produced with, including any setting
+            that changes them, e.g. "llama-text-embed-v2/passage".
+        texts (List[str]): Texts to embed.
+        embed_fn (Callable): Embeds the texts missing from the cache.
+
+    Returns:
+        np.ndarray: float32 embeddings of shape (len(texts), dim); None when embed_fn
+        failed.
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return _as_array(embed_fn(texts))
+    return cache.embed(model, texts, embed_fn)
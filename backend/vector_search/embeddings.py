@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from typing import List, Dict, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from backend.vector_search.embedding_cache import get_embedding_cache
+
+load_dotenv()
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# 0 keeps torch's default (one thread per physical core)
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", "0"))
+# all-MiniLM-L6-v2 was trained on sequences of at most 256 word pieces
+EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "256"))
+# Comma-separated models to load and warm up at server startup
+EMBEDDING_PRELOAD_MODELS = [
+    name.strip()
+    for name in os.getenv("EMBEDDING_PRELOAD_MODELS", "").split(",")
+    if name.strip()
+]
+
+# Process-wide model registry: model name -> (tokenizer, model)
+_models: Dict[str, Tuple[any, any]] = {}
+# Load timings and memory per model, see model_stats
+_model_stats: Dict[str, Dict[str, float]] = {}
+_registry_lock = threading.Lock()
+
+
+def process_rss_mb() -> float:
+    """Resident set size of this process in MB; the peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_model(model_name: str, num_threads: int = EMBEDDING_NUM_THREADS):
+    """
+    Return the shared tokenizer and model for a model name, loading them on first use.
+
+    The first call imports torch and transformers, loads the weights and runs a
+    warm-up inference so the first real query doesn't pay for lazy initialization
+    and allocator growth. Later calls, from any store or thread, get the same objects.
+
+    Args:
+        model_name (str): Hugging Face model name or local path.
+        num_threads (int): Torch intra-op threads; 0 keeps the torch default.
+
+    Returns:
+        Tuple[tokenizer, model]: The shared tokenizer and model in eval mode.
+    """
+    if model_name in _models:
+        return _models[model_name]
+
+    with _registry_lock:
+        if model_name in _models:
+            return _models[model_name]
+
+        rss_before = process_rss_mb()
+        start = time.perf_counter()
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        import_seconds = time.perf_counter() - start
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+        load_seconds = time.perf_counter() - start - import_seconds
+
+        warm_up_start = time.perf_counter()
+        with torch.inference_mode():
+            model(**tokenizer(["warm-up query"], return_tensors="pt"))
+        warm_up_seconds = time.perf_counter() - warm_up_start
+
+        _models[model_name] = (tokenizer, model)
+        _model_stats[model_name] = {
+            "import_seconds": import_seconds,
+            "load_seconds": load_seconds,
+            "warm_up_seconds": warm_up_seconds,
+            "cold_start_seconds": time.perf_counter() - start,
+            "rss_before_mb": rss_before,
+            "rss_after_mb": process_rss_mb(),
+        }
+        print(f"Loaded embedding model {model_name}: {_model_stats[model_name]}")
+        return _models[model_name]
+
+
+def preload_models(model_names: List[str] = EMBEDDING_PRELOAD_MODELS) -> None:
+    """Load and warm up models ahead of the first query, e.g. at server startup."""
+    for model_name in model_names:
+        load_model(model_name)
+
+
+def model_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Cold-start timings and memory of every loaded model.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Per model, the seconds spent importing torch and
+        transformers, loading the weights and warming up, the total cold start, and
+        the process RSS in MB before and after loading.
+    """
+    return {model_name: dict(stats) for model_name, stats in _model_stats.items()}
+
+
+class TransformerEmbedder:
+    """
+    Batched sentence-embedding inference for Hugging Face encoder models such as
+    `sentence-transformers/all-MiniLM-L6-v2`.
+
+    Texts are sorted by token length and padded per batch, so each batch only pays
+    for the padding of its own longest text. Embeddings are mean-pooled over the
+    attention mask and L2-normalized, matching sentence-transformers.
+
+    The model itself lives in the process-wide registry (see load_model), so any
+    number of embedders for the same model share one copy, loaded on first use.
+    Texts embedded before, by any process, are read from the embedding cache.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        num_threads: int = EMBEDDING_NUM_THREADS,
+        max_length: int = EMBEDDING_MAX_LENGTH,
+        use_cache: bool = True,
+    ):
+        """
+        Configure the embedder; the model is loaded on the first embedding.
+
+        Args:
+            model_name (str): Hugging Face model name or local path.
+            batch_size (int): Number of texts per forward pass.
+            num_threads (int): Torch intra-op threads; 0 keeps the torch default.
+            max_length (int): Texts are truncated to this many tokens.
+            use_cache (bool): Reuse embeddings from the process-wide embedding cache.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.max_length = max_length
+        self.cache = get_embedding_cache() if use_cache else None
+
+    @property
+    def tokenizer(self):
+        """The shared tokenizer."""
+        return load_model(self.model_name, self.num_threads)[0]
+
+    @property
+    def model(self):
+        """The shared model."""
+        return load_model(self.model_name, self.num_threads)[1]
+
+    @property
+    def dim(self) -> int:
+        """Dimension of the produced embeddings."""
+        return self.model.config.hidden_size
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Create normalized embeddings for a list of texts.
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            numpy array: float32 embeddings of shape (len(texts), dim), in input order.
+        """
+        if self.cache is None:
+            return self._embed(texts)
+        # Truncation changes the embeddings of long texts
+        cache_model = f"{self.model_name}@{self.max_length}"
+        return self.cache.embed(cache_model, list(texts), self._embed)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        import torch
+
+        tokenizer, model = load_model(self.model_name, self.num_threads)
+        embeddings = np.empty((len(texts), model.config.hidden_size), dtype=np.float32)
+        if not texts:
+            return embeddings
+
+        # Tokenize once without padding to bucket texts of similar length together
+        encodings = tokenizer(list(texts), truncation=True, max_length=self.max_length)
+        order = np.argsort([len(ids) for ids in encodings["input_ids"]], kind="stable")
+
+        with torch.inference_mode():
+            for start in range(0, len(texts), self.batch_size):
+                batch_indices = order[start : start + self.batch_size]
+                features = [
+                    {key: encodings[key][i] for key in encodings.keys()}
+                    for i in batch_indices
+                ]
+                inputs = tokenizer.pad(features, return_tensors="pt")
+                outputs = model(**inputs)
+                embeddings[batch_indices] = self._mean_pool(
+                    outputs.last_hidden_state, inputs["attention_mask"]
+                ).numpy()
+
+        return embeddings
+
+    @staticmethod
+    def _mean_pool(hidden_states, attention_mask):
+        import torch
+
+        mask = attention_mask.unsqueeze(-1).to(hidden_states.dtype)
+        summed = (hidden_states * mask).sum(dim=1)
+        pooled = summed / mask.sum(dim=1).clamp(min=1e-9)
+        return torch.nn.functional.normalize(pooled, p=2, dim=1)
@@ -0,0 +1,674 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+from typing import List, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.vector_search.benchmarks import summarize_latencies
+from backend.vector_search.distillation import qa_record
+from backend.vector_search.readers import iter_json_records
+from backend.vector_search.vector_store import (
+    VECTOR_STORE_BACKEND,
+    VectorStore,
+    get_vector_store,
+)
+
+load_dotenv()
+# Cut-offs reported as recall@k; the largest one is also the retrieval depth for MRR
+EVAL_TOP_KS = [1, 5, 10]
+# Pinecone-hosted cross-encoder used by the "reranked" retriever
+EVAL_RERANK_MODEL = os.getenv("EVAL_RERANK_MODEL", "bge-reranker-v2-m3")
+
+RETRIEVERS = [
+    "pinecone",
+    "replica",
+    "pinecone-embeddings",
+    "pinecone-local",
+    "faiss",
+    "hybrid",
+    "reranked",
+]
+# Retrievers scoring with the embeddings of a deployable backend, as the Q&A fast
+# path sees them: "pinecone-embeddings" for Pinecone and its replica, "faiss" for FAISS
+CALIBRATION_RETRIEVERS = {
+    "pinecone": "pinecone-embeddings",
+    "replica": "pinecone-embeddings",
+    "faiss": "faiss",
+}
+VARIANTS = ["original", "lowercase", "keywords", "reworded", "llm"]
+
+_QUESTION_OPENER = re.compile(
+    r"^(what|how|why|when|where|which|who|can|could|should|is|are|do|does|will|would)\s+"
+    r"((is|are|do|does|can|should|i|you|it)\s+)?",
+    re.IGNORECASE,
+)
+_STOPWORDS = set(
+    "a an and are as at be by can could do does for from how i if in is it my of on "
+    "or should that the to what when where which who why will with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without punctuation."""
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def load_qa_records(json_file: str, limit: Optional[int] = None) -> List[Dict[str, any]]:
+    """
+    Load a distilled Q&A file as vector store records plus their source question.
+
+    Records are built with qa_record, as upsert_questions_and_answers_v2 does, so
+    they match what is already stored and each question's own record is its
+    ground truth.
+
+    Args:
+        json_file (str): Path to the JSON file with "question" and "answer" items.
+        limit (int, optional): Maximum number of records to load; None for all.
+
+    Returns:
+        List[Dict[str, any]]: Records with "id", "text", "metadata", "category" and "question".
+    """
+    records = []
+    if limit is not None and limit <= 0:
+        return records
+    for idx, item in iter_json_records(json_file, start=1):
+        if not isinstance(item, dict):
+            continue
+        question = item.get("question", "").strip()
+        answer = item.get("answer", "").strip()
+        if not question or not answer:
+            continue
+        records.append({**qa_record(idx, question, answer), "question": question})
+        if limit is not None and len(records) >= limit:
+            break
+    return records
+
+
+def paraphrase(question: str, variant: str) -> str:
+    """
+    Produce a variant of a question the way visitors tend to rephrase it.
+
+    Args:
+        question (str): The original question.
+        variant (str): "original", "lowercase" (no casing or punctuation), "keywords"
+            (content words only), "reworded" (imperative instead of a question) or
+            "llm" (free-form paraphrase from the chat model).
+
+    Returns:
+        str: The rephrased question.
+    """
+    if variant == "original":
+        return question
+    if variant == "lowercase":
+        return " ".join(tokenize(question))
+    if variant == "keywords":
+        keywords = [token for token in tokenize(question) if token not in _STOPWORDS]
+        return " ".join(keywords) or question
+    if variant == "reworded":
+        topic = _QUESTION_OPENER.sub("", question.strip()).rstrip("?").strip()
+        return f"Tell me about {topic}" if topic else question
+    if variant == "llm":
+        from backend.agents.openai_chat_completion import deephermes_free
+
+        prompt = (
+            "Rephrase the following question the way a website visitor might ask it. "
+            "Keep its meaning, change the wording, and reply with the question only.\n\n"
+            f"{question}"
+        )
+        return deephermes_free("user", prompt).strip().strip('"') or question
+    raise ValueError(f"Unknown paraphrase variant '{variant}', expected one of {VARIANTS}.")
+
+
+class KeywordIndex:
+    """In-memory BM25 index over record texts, the lexical half of the hybrid retriever."""
+
+    def __init__(self, records: List[Dict[str, any]], k1: float = 1.2, b: float = 0.75):
+        """
+        Index the records.
+
+        Args:
+            records (List[Dict[str, any]]): Records with "id" and "text".
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self.ids = [record["id"] for record in records]
+        self.term_counts = [Counter(tokenize(record["text"])) for record in records]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = sum(self.lengths) / max(len(self.lengths), 1)
+
+        self.postings: Dict[str, List[int]] = {}
+        for position, counts in enumerate(self.term_counts):
+            for term in counts:
+                self.postings.setdefault(term, []).append(position)
+        self.idf = {
+            term: math.log(1 + (len(records) - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, any]]:
+        """
+        Return the top-k records by BM25 score.
+
+        Args:
+            query (str): The query string.
+            top_k (int): The number of results to return.
+
+        Returns:
+            List[Dict[str, any]]: Results with "id" and "score".
+        """
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            for position in self.postings.get(term, []):
+                frequency = self.term_counts[position][term]
+                norm = self.k1 * (
+                    1 - self.b + self.b * self.lengths[position] / self.average_length
+                )
+                scores[position] = scores.get(position, 0.0) + self.idf[term] * (
+                    frequency * (self.k1 + 1) / (frequency + norm)
+                )
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [{"id": self.ids[position], "score": score} for position, score in best]
+
+
+class HybridRetriever:
+    """Dense search fused with BM25 keyword search by reciprocal rank fusion."""
+
+    def __init__(
+        self,
+        dense: VectorStore,
+        keyword_index: KeywordIndex,
+        candidates: int = 50,
+        rrf_k: int = 60,
+    ):
+        """
+        Initialize the hybrid retriever.
+
+        Args:
+            dense (VectorStore): The semantic retriever.
+            keyword_index (KeywordIndex): The lexical retriever.
+            candidates (int): Results taken from each retriever before fusion.
+            rrf_k (int): Reciprocal rank fusion constant; larger values flatten the ranks.
+        """
+        self.dense = dense
+        self.keyword_index = keyword_index
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, any]]:
+        """Return the top-k fused results with "id", "score" and "metadata"."""
+        dense_results = self.dense.search(query, top_k=self.candidates)
+        keyword_results = self.keyword_index.search(query, top_k=self.candidates)
+
+        scores: Dict[str, float] = {}
+        metadata = {result["id"]: result.get("metadata") for result in dense_results}
+        for results in (dense_results, keyword_results):
+            for rank, result in enumerate(results, start=1):
+                scores[result["id"]] = scores.get(result["id"], 0.0) + 1 / (
+                    self.rrf_k + rank
+                )
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            {"id": record_id, "score": score, "metadata": metadata.get(record_id)}
+            for record_id, score in best
+        ]
+
+
+class RerankedRetriever:
+    """Dense candidates re-ordered by a Pinecone-hosted cross-encoder reranker."""
+
+    def __init__(
+        self,
+        base: VectorStore,
+        pinecone,
+        texts: Dict[str, str],
+        candidates: int = 20,
+        model: str = EVAL_RERANK_MODEL,
+    ):
+        """
+        Initialize the reranked retriever.
+
+        Args:
+            base (VectorStore): Retriever producing the candidates.
+            pinecone (Pinecone): Pinecone client used for inference.
+            texts (Dict[str, str]): Record texts by ID, sent to the reranker.
+            candidates (int): Number of candidates to rerank.
+            model (str): Pinecone rerank model.
+        """
+        self.base = base
+        self.pinecone = pinecone
+        self.texts = texts
+        self.candidates = candidates
+        self.model = model
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, any]]:
+        """Return the top-k reranked results with "id", "score" and "metadata"."""
+        results = self.base.search(query, top_k=max(self.candidates, top_k))
+        if not results:
+            return []
+        reranked = self.pinecone.inference.rerank(
+            model=self.model,
+            query=query,
+            documents=[self.texts.get(result["id"], "") for result in results],
+            top_n=top_k,
+            return_documents=False,
+        )
+        return [
+            {
+                "id": results[row.index]["id"],
+                "score": row.score,
+                "metadata": results[row.index].get("metadata"),
+            }
+            for row in reranked.data
+        ]
+
+
+class PineconeEmbeddingRetriever:
+    """
+    Exact cosine search over the corpus embedded with Pinecone's hosted model, in a
+    local index laid out like the replica, so scores are those the Pinecone
+    backend returns without writing the corpus to the live index.
+    """
+
+    def __init__(self, embedder, store):
+        """
+        Initialize the retriever.
+
+        Args:
+            embedder (PineconeVectorStore): Embeds the queries, as in production.
+            store (FaissVectorStore): Local index of the normalized passage embeddings.
+        """
+        self.embedder = embedder
+        self.store = store
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, any]]:
+        """Return the top-k results with "id", "score" and "metadata"."""
+        from backend.vector_search.replica import normalize
+
+        vector = normalize(self.embedder.embed_queries([query]))[0]
+        return self.store.search_vector(vector, top_k=top_k)
+
+
+def build_retriever(name: str, records: List[Dict[str, any]], work_dir: str):
+    """
+    Create a retriever configuration over the evaluation corpus.
+
+    "pinecone" and "replica" query the live index and its local mirror, which must
+    already hold the corpus. "pinecone-embeddings" embeds the corpus with Pinecone's
+    model into a local exact index. "pinecone-local" stands in for Pinecone offline:
+    an exact, uncompressed cosine index with Pinecone's result shape, embedded with
+    the FAISS model. "faiss" uses the configured FAISS index type and compression.
+    "hybrid" and "reranked" build on "faiss".
+
+    Args:
+        name (str): One of RETRIEVERS.
+        records (List[Dict[str, any]]): The evaluation corpus.
+        work_dir (str): Directory for local indexes.
+
+    Returns:
+        A retriever with a `search(query, top_k)` method.
+    """
+    if name in ("pinecone", "replica"):
+        return get_vector_store(name)
+    if name == "pinecone-embeddings":
+        return _build_pinecone_embedding_store(records, work_dir, name)
+    if name == "pinecone-local":
+        return _build_faiss_store(
+            records, work_dir, name, index_type="flat", quantization="none"
+        )
+    if name == "faiss":
+        return _build_faiss_store(records, work_dir, name)
+    if name == "hybrid":
+        return HybridRetriever(
+            build_retriever("faiss", records, work_dir), KeywordIndex(records)
+        )
+    if name == "reranked":
+        from pinecone import Pinecone
+
+        return RerankedRetriever(
+            build_retriever("faiss", records, work_dir),
+            Pinecone(api_key=os.getenv("PINE_API_KEY")),
+            {record["id"]: record["text"] for record in records},
+        )
+    raise ValueError(f"Unknown retriever '{name}', expected one of {RETRIEVERS}.")
+
+
+def _build_faiss_store(records, work_dir, name, **index_options):
+    from backend.vector_search.faiss_search import FaissVectorStore
+
+    index_dir = _corpus_dir(work_dir, name, records)
+    store = FaissVectorStore(
+        index_path=os.path.join(index_dir, "index.faiss"),
+        doc_store_path=os.path.join(index_dir, "docs.sqlite"),
+        **index_options,
+    )
+    if store.faiss_search.ntotal == 0 and records:
+        if not store.faiss_search.is_trained:
+            store.train([record["text"] for record in records])
+        store.upsert(records)
+    return store
+
+
+def _corpus_dir(work_dir, name, records):
+    # One directory per retriever and corpus, so an index left in the work directory
+    # is only reused for the records it was built from
+    digest = hashlib.sha256()
+    for record in records:
+        digest.update(f"{record['id']}\0{record['text']}\0".encode("utf-8"))
+    return os.path.join(work_dir, f"{name}-{len(records)}-{digest.hexdigest()[:16]}")
+
+
+def _build_pinecone_embedding_store(records, work_dir, name):
+    from backend.vector_search.faiss_search import FaissVectorStore
+    from backend.vector_search.pinecone_search import PineconeVectorStore
+    from backend.vector_search.replica import PINECONE_REPLICA_DIM, normalize
+
+    embedder = PineconeVectorStore(
+        api_key=os.getenv("PINE_API_KEY"), index_name=os.getenv("PINE_INDEX_NAME")
+    )
+    index_dir = _corpus_dir(work_dir, name, records)
+    store = FaissVectorStore(
+        index_path=os.path.join(index_dir, "index.faiss"),
+        doc_store_path=os.path.join(index_dir, "docs.sqlite"),
+        dim=PINECONE_REPLICA_DIM,
+        model_name=None,
+        index_type="flat",
+        quantization="none",
+    )
+    if store.faiss_search.ntotal == 0 and records:
+        # Normalized, so inner products equal the cosine scores Pinecone returns
+        vectors = normalize(
+            embedder.embed_texts([record["text"] for record in records], "passage")
+        )
+        store.upsert_embeddings(
+            [
+                {
+                    "id": record["id"],
+                    "metadata": {
+                        "chunk_text": record["text"],
+                        "metadata": record.get("metadata"),
+                        "category": record.get("category"),
+                    },
+                }
+                for record in records
+            ],
+            vectors,
+        )
+    return PineconeEmbeddingRetriever(embedder, store)
+
+
+def evaluate_retriever(
+    retriever, queries: List[Tuple[str, str]], top_ks: List[int] = EVAL_TOP_KS
+) -> Dict[str, float]:
+    """
+    Replay queries through a retriever and score them against their expected record.
+
+    Args:
+        retriever: Object with a `search(query, top_k)` method.
+        queries (List[Tuple[str, str]]): (query, expected record ID) pairs.
+        top_ks (List[int]): Cut-offs to report recall for.
+
+    Returns:
+        Dict[str, float]: recall@k for every cut-off, MRR, latency summary and QPS;
+        all zero without queries.
+    """
+    depth = max(top_ks)
+    ranks, latencies = [], []
+    start = time.perf_counter()
+    for query, expected_id in queries:
+        query_start = time.perf_counter()
+        results = retriever.search(query, top_k=depth)
+        latencies.append(time.perf_counter() - query_start)
+        ids = [result["id"] for result in results]
+        ranks.append(ids.index(expected_id) + 1 if expected_id in ids else None)
+    elapsed = time.perf_counter() - start
+
+    total = len(ranks) or 1
+    report = {
+        f"recall@{k}": sum(1 for rank in ranks if rank and rank <= k) / total
+        for k in top_ks
+    }
+    report["mrr"] = sum(1 / rank for rank in ranks if rank) / total
+    report.update(summarize_latencies(latencies))
+    report["qps"] = len(queries) / elapsed if elapsed > 0 else 0.0
+    return report
+
+
+def run_evaluation(
+    json_file: str,
+    retrievers: List[str],
+    variants: List[str],
+    limit: Optional[int] = None,
+    work_dir: Optional[str] = None,
+) -> Dict[str, any]:
+    """
+    Evaluate every retriever on every question variant.
+
+    Args:
+        json_file (str): Distilled Q&A file providing corpus and ground truth.
+        retrievers (List[str]): Retriever names, see RETRIEVERS.
+        variants (List[str]): Question variants, see VARIANTS.
+        limit (int, optional): Maximum number of Q&A pairs.
+        work_dir (str, optional): Directory for local indexes; reused between runs
+            over the same corpus.
+            Defaults to a temporary directory.
+
+    Returns:
+        Dict[str, any]: Report with the configuration and metrics per retriever and variant.
+    """
+    records = load_qa_records(json_file, limit=limit)
+    work_dir = work_dir or tempfile.mkdtemp(prefix="retrieval_eval_")
+    query_sets = {
+        variant: [
+            (paraphrase(record["question"], variant), record["id"]) for record in records
+        ]
+        for variant in variants
+    }
+
+    results = {}
+    for name in retrievers:
+        retriever = build_retriever(name, records, work_dir)
+        results[name] = {
+            variant: evaluate_retriever(retriever, queries)
+            for variant, queries in query_sets.items()
+        }
+        print(f"Evaluated {name}: {json.dumps(results[name])}")
+
+    return {
+        "config": {
+            "json_file": json_file,
+            "records": len(records),
+            "top_ks": EVAL_TOP_KS,
+            "faiss_index_type": os.getenv("FAISS_INDEX_TYPE", "flat"),
+            "faiss_quantization": os.getenv("FAISS_QUANTIZATION", "none"),
+        },
+        "results": results,
+    }
+
+
+def calibrate_fast_path(
+    json_file: str,
+    retriever_name: Optional[str] = None,
+    variants: Optional[List[str]] = None,
+    target_precision: float = 0.98,
+    holdout_every: int = 5,
+    limit: Optional[int] = None,
+    work_dir: Optional[str] = None,
+) -> Dict[str, any]:
+    """
+    Pick the lowest Q&A fast-path threshold that keeps its answers right.
+
+    Every `holdout_every`-th pair is left out of the index, so its questions stand
+    in for visitor questions the corpus has no answer for. All questions are
+    replayed, and a top-1 "qa" hit counts as right only if it is the question's own
+    record. The threshold is the lowest top-1 score at which the answers sent would
+    still be right `target_precision` of the time.
+
+    Scores depend on the embedding model, so a threshold only applies to the backend
+    it was calibrated for: "pinecone-embeddings" for the Pinecone and replica
+    backends (llama-text-embed-v2), "faiss" for the FAISS backend.
+
+    Args:
+        json_file (str): Distilled Q&A file.
+        retriever_name (str, optional): One of the CALIBRATION_RETRIEVERS values;
+            defaults to the one of the configured VECTOR_STORE_BACKEND.
+        variants (List[str], optional): Question variants replayed; defaults to
+            "original" and "lowercase", the near-exact rephrasings.
+        target_precision (float): Share of fast-path answers that must be right.
+        holdout_every (int): Hold out one pair in this many.
+        limit (int, optional): Maximum number of Q&A pairs.
+        work_dir (str, optional): Directory for the local index.
+
+    Returns:
+        Dict[str, any]: The threshold (None if no score reaches the precision), its
+        precision, and the share of indexed and held-out questions it answers.
+    """
+    retriever_name = retriever_name or CALIBRATION_RETRIEVERS.get(VECTOR_STORE_BACKEND)
+    if retriever_name not in CALIBRATION_RETRIEVERS.values():
+        raise ValueError(
+            f"Cannot calibrate on '{retriever_name}', expected one of "
+            f"{sorted(set(CALIBRATION_RETRIEVERS.values()))}."
+        )
+    variants = variants or ["original", "lowercase"]
+    records = load_qa_records(json_file, limit=limit)
+    indexed = [
+        record
+        for position, record in enumerate(records)
+        if position % holdout_every != holdout_every - 1
+    ]
+    indexed_ids = {record["id"] for record in indexed}
+    work_dir = work_dir or tempfile.mkdtemp(prefix="fast_path_calibration_")
+    retriever = build_retriever(retriever_name, indexed, work_dir)
+
+    # (score, right, indexed) of every replayed question's top-1 hit
+    hits = []
+    for variant in variants:
+        for record in records:
+            results = retriever.search(paraphrase(record["question"], variant), top_k=1)
+            if results:
+                hits.append(
+                    (
+                        results[0]["score"],
+                        results[0]["id"] == record["id"],
+                        record["id"] in indexed_ids,
+                    )
+                )
+    hits.sort(key=lambda hit: hit[0], reverse=True)
+
+    threshold, precision, right = None, None, 0
+    for answered, (score, is_right, _) in enumerate(hits, start=1):
+        right += is_right
+        # Only a score below all ties can separate answered from unanswered questions
+        if answered < len(hits) and hits[answered][0] == score:
+            continue
+        if right / answered >= target_precision:
+            threshold, precision = score, right / answered
+
+    answered = [hit for hit in hits if threshold is not None and hit[0] >= threshold]
+    indexed_total = sum(1 for hit in hits if hit[2])
+    return {
+        "retriever": retriever_name,
+        "backends": sorted(
+            backend
+            for backend, name in CALIBRATION_RETRIEVERS.items()
+            if name == retriever_name
+        ),
+        "variants": variants,
+        "records": len(records),
+        "held_out": len(records) - len(indexed),
+        "target_precision": target_precision,
+        "threshold": threshold,
+        "precision": precision,
+        "indexed_answer_rate": (
+            sum(1 for hit in answered if hit[2]) / indexed_total if indexed_total else 0.0
+        ),
+        "held_out_answer_rate": (
+            sum(1 for hit in answered if not hit[2]) / (len(hits) - indexed_total)
+            if len(hits) > indexed_total
+            else 0.0
+        ),
+    }
+
+
+# Example usage:
+#   python -m backend.vector_search.evaluate pregnancy_questions_and_answers.json \
+#       --retrievers faiss hybrid --variants original keywords reworded --output report.json
+#   python -m backend.vector_search.evaluate pregnancy_questions_and_answers.json \
+#       --calibrate-fast-path --target-precision 0.98
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure retrieval quality and latency on the distilled Q&A corpus."
+    )
+    parser.add_argument("json_file", help="Distilled questions and answers JSON file.")
+    parser.add_argument(
+        "--retrievers",
+        nargs="+",
+        default=["pinecone-local", "faiss", "hybrid"],
+        choices=RETRIEVERS,
+    )
+    parser.add_argument(
+        "--variants",
+        nargs="+",
+        default=["original", "lowercase", "keywords", "reworded"],
+        choices=VARIANTS,
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None, help="Maximum number of Q&A pairs."
+    )
+    parser.add_argument(
+        "--work-dir", default=None, help="Directory for local indexes."
+    )
+    parser.add_argument(
+        "--output", default=None, help="Write the JSON report to this file."
+    )
+    parser.add_argument(
+        "--calibrate-fast-path",
+        action="store_true",
+        help=(
+            "Calibrate the Q&A fast-path threshold (QA_FAST_PATH_THRESHOLD or "
+            "Website.qa_fast_path_threshold) instead, with the embeddings of the "
+            "configured VECTOR_STORE_BACKEND."
+        ),
+    )
+    parser.add_argument(
+        "--calibration-retriever",
+        default=None,
+        choices=sorted(set(CALIBRATION_RETRIEVERS.values())),
+        help="Calibrate for another backend's embeddings than the configured one.",
+    )
+    parser.add_argument(
+        "--target-precision",
+        type=float,
+        default=0.98,
+        help="Share of fast-path answers that must be right.",
+    )
+    args = parser.parse_args()
+
+    if args.calibrate_fast_path:
+        report = calibrate_fast_path(
+            args.json_file,
+            args.calibration_retriever,
+            target_precision=args.target_precision,
+            limit=args.limit,
+            work_dir=args.work_dir,
+        )
+    else:
+        report = run_evaluation(
+            args.json_file,
+            args.retrievers,
+            args.variants,
+            limit=args.limit,
+            work_dir=args.work_dir,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+    print(json.dumps(report, indent=4))
@@ -1,6 +1,230 @@
 import faiss
 import numpy as np
-from transformers import AutoModel, AutoTokenizer
+from typing import List, Dict, Optional
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+from backend.vector_search.delta_log import DeltaLog, ADD, file_lock
+from backend.vector_search.doc_store import DocStore
+from backend.vector_search.embeddings import (
+    TransformerEmbedder,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_NUM_THREADS,
+)
+from backend.vector_search.vector_store import matches_filter
+
+load_dotenv()
+FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "data/faiss/index.faiss")
+FAISS_DOC_STORE_PATH = os.getenv("FAISS_DOC_STORE_PATH", f"{FAISS_INDEX_PATH}.docs.sqlite")
+FAISS_EMBEDDING_MODEL = os.getenv(
+    "FAISS_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+)
+FAISS_DIM = int(os.getenv("FAISS_DIM", "384"))
+
+# Index layout, see build_index: "flat", "ivf_flat", "ivf_pq" or "hnsw"
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "1024"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+# Vector compression, see build_index: "none", "sq8", "fp16" or "pq"
+FAISS_QUANTIZATION = os.getenv("FAISS_QUANTIZATION", "none")
+# Reduce vectors to this many dimensions before indexing; 0 keeps the full dimension
+FAISS_REDUCED_DIM = int(os.getenv("FAISS_REDUCED_DIM", "0"))
+# "pca" (learned projection) or "truncate" (Matryoshka models such as llama-text-embed-v2)
+FAISS_DIM_REDUCTION = os.getenv("FAISS_DIM_REDUCTION", "pca")
+# Re-score k * factor compressed candidates with the exact vectors; 0 disables re-scoring
+FAISS_RERANK_K_FACTOR = int(os.getenv("FAISS_RERANK_K_FACTOR", "0"))
+# Search-time knobs trading latency for recall
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+# Memory-map base snapshots so uvicorn workers share pages instead of private copies
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+# Background merge of the delta log into a new base snapshot
+FAISS_BACKGROUND_MERGE = os.getenv("FAISS_BACKGROUND_MERGE", "1") == "1"
+FAISS_MERGE_INTERVAL = float(os.getenv("FAISS_MERGE_INTERVAL", "60"))
+FAISS_MERGE_MIN_DELTA = int(os.getenv("FAISS_MERGE_MIN_DELTA", "10000"))
+# Rebuild the base snapshot once this fraction of its vectors are tombstoned
+FAISS_COMPACTION_RATIO = float(os.getenv("FAISS_COMPACTION_RATIO", "0.2"))
+# Metadata fields whose per-value ID bitmaps are precomputed for filtered search
+FAISS_FILTER_FIELDS = [
+    field.strip()
+    for field in os.getenv("FAISS_FILTER_FIELDS", "category,site_id").split(",")
+    if field.strip()
+]
+
+
+def build_index(
+    dim,
+    metric=faiss.METRIC_INNER_PRODUCT,
+    index_type=FAISS_INDEX_TYPE,
+    nlist=FAISS_NLIST,
+    pq_m=FAISS_PQ_M,
+    pq_nbits=FAISS_PQ_NBITS,
+    hnsw_m=FAISS_HNSW_M,
+    quantization=FAISS_QUANTIZATION,
+    reduced_dim=FAISS_REDUCED_DIM,
+    dim_reduction=FAISS_DIM_REDUCTION,
+    rerank_k_factor=FAISS_RERANK_K_FACTOR,
+):
+    """
+    Build an empty index of the requested type, wrapped in an ID map.
+
+    Index types, roughly in order of corpus size they suit:
+        flat:     exact search, no training, fine up to a few hundred thousand vectors.
+        hnsw:     graph search, no training, fast and accurate but memory hungry.
+        ivf_flat: inverted lists over `nlist` clusters, needs training; tune `nprobe`.
+        ivf_pq:   inverted lists with product-quantized codes (`pq_m` bytes per vector
+                  at 8 bits), needs training; the most compact option.
+
+    The vectors stored by flat, hnsw and ivf_flat indexes can be compressed with
+    `quantization`:
+        none: float32, 4 bytes per dimension.
+        fp16: half precision, 2 bytes per dimension, no training.
+        sq8:  8-bit scalar quantization, 1 byte per dimension, needs training.
+        pq:   product quantization, `pq_m` codes of `pq_nbits` bits, needs training.
+
+    `reduced_dim` shrinks vectors before they are stored, either with a learned PCA
+    projection (needs training) or by keeping the leading dimensions of a
+    Matryoshka-trained embedding. Both renormalize for inner-product search. With
+    `rerank_k_factor` the exact vectors are kept next to the compressed ones and the
+    top k * rerank_k_factor candidates are re-scored with them, restoring recall at
+    the cost of the memory saved.
+
+    Args:
+        dim (int): Dimension of the vectors.
+        metric (int): faiss.METRIC_INNER_PRODUCT or faiss.METRIC_L2.
+        index_type (str): One of "flat", "ivf_flat", "ivf_pq" or "hnsw".
+        nlist (int): Number of IVF clusters; about 4 * sqrt(n) is a good start.
+        pq_m (int): Number of PQ sub-quantizers; must divide the (reduced) dimension.
+        pq_nbits (int): Bits per PQ sub-quantizer code.
+        hnsw_m (int): Number of HNSW graph neighbours per node.
+        quantization (str): One of "none", "fp16", "sq8" or "pq".
+        reduced_dim (int): Target dimension; 0 keeps `dim`.
+        dim_reduction (str): "pca" or "truncate".
+        rerank_k_factor (int): Candidate multiplier for exact re-scoring; 0 disables it.
+
+    Returns:
+        faiss.IndexIDMap2: The empty index.
+    """
+    codecs = {
+        "none": "Flat",
+        "fp16": "SQfp16",
+        "sq8": "SQ8",
+        "pq": f"PQ{pq_m}x{pq_nbits}",
+    }
+    if quantization not in codecs:
+        raise ValueError(
+            f"Unknown FAISS quantization '{quantization}', expected one of {list(codecs)}."
+        )
+    codec = codecs[quantization]
+    descriptions = {
+        # IndexPQ can't take search parameters, so flat PQ is a single-list IVF to keep ID filters working
+        "flat": f"IVF1,{codec}" if quantization == "pq" else codec,
+        "ivf_flat": f"IVF{nlist},{codec}",
+        "ivf_pq": f"IVF{nlist},PQ{pq_m}x{pq_nbits}",
+        "hnsw": f"HNSW{hnsw_m},{codec}",
+    }
+    if index_type not in descriptions:
+        raise ValueError(
+            f"Unknown FAISS index type '{index_type}', expected one of {list(descriptions)}."
+        )
+
+    if not reduced_dim or reduced_dim >= dim:
+        index = faiss.index_factory(dim, descriptions[index_type], metric)
+    elif dim_reduction == "pca":
+        normalize = "L2norm," if metric == faiss.METRIC_INNER_PRODUCT else ""
+        index = faiss.index_factory(
+            dim, f"PCAR{reduced_dim},{normalize}{descriptions[index_type]}", metric
+        )
+    elif dim_reduction == "truncate":
+        index = faiss.index_factory(reduced_dim, descriptions[index_type], metric)
+        if metric == faiss.METRIC_INNER_PRODUCT:
+            index = faiss.IndexPreTransform(faiss.NormalizationTransform(reduced_dim), index)
+        else:
+            index = faiss.IndexPreTransform(index)
+        # Keep the first `reduced_dim` dimensions
+        index.prepend_transform(faiss.RemapDimensionsTransform(dim, reduced_dim, False))
+    else:
+        raise ValueError(
+            f"Unknown dimension reduction '{dim_reduction}', expected 'pca' or 'truncate'."
+        )
+
+    if rerank_k_factor:
+        # The refine index holds the original float32 vectors, not the reduced ones
+        index = faiss.IndexRefineFlat(index)
+        index.k_factor = rerank_k_factor
+    return faiss.IndexIDMap2(index)
+
+
+def apply_search_parameters(index, nprobe=None, ef_search=None, rerank_k_factor=None):
+    """
+    Set the search-time knobs that apply to an index built by build_index.
+
+    Args:
+        index (faiss.Index): The index to tune.
+        nprobe (int, optional): Number of IVF clusters visited per query.
+        ef_search (int, optional): Size of the HNSW candidate list per query.
+        rerank_k_factor (int, optional): Candidates re-scored exactly per result.
+    """
+    parameter_space = faiss.ParameterSpace()
+    for name, value in (
+        ("nprobe", nprobe),
+        ("efSearch", ef_search),
+        ("k_factor_rf", rerank_k_factor),
+    ):
+        if not value:
+            continue
+        try:
+            parameter_space.set_index_parameter(index, name, value)
+        except RuntimeError:
+            # The parameter doesn't apply to this index type
+            pass
+
+
+def make_id_selector(ids):
+    """
+    Build the cheapest FAISS IDSelector accepting exactly the given IDs.
+
+    A contiguous ID block becomes an IDSelectorRange, dense ID sets a bitmap and
+    sparse ones an IDSelectorBatch (hash set with a bloom filter).
+
+    Args:
+        ids (list): IDs to accept.
+
+    Returns:
+        faiss.IDSelector: The selector.
+    """
+    ids = np.unique(np.asarray(ids, dtype=np.int64))
+    if len(ids) and ids[0] >= 0 and ids[-1] - ids[0] + 1 == len(ids):
+        return faiss.IDSelectorRange(int(ids[0]), int(ids[-1]) + 1)
+    if len(ids) and ids[0] >= 0 and ids[-1] < 64 * len(ids):
+        bitmap = np.zeros(int(ids[-1]) // 8 + 1, dtype=np.uint8)
+        np.bitwise_or.at(bitmap, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+        return bitmap_selector(bitmap)
+    selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    # FAISS doesn't own the array, keep it alive as long as the selector
+    selector.referenced_array = ids
+    return selector
+
+
+def bitmap_selector(bitmap):
+    """
+    Wrap a packed little-endian ID bitmap (bit i set = ID i accepted) in an IDSelectorBitmap.
+
+    Args:
+        bitmap (numpy array): uint8 array of packed bits.
+
+    Returns:
+        faiss.IDSelectorBitmap: The selector.
+    """
+    bitmap = np.ascontiguousarray(bitmap, dtype=np.uint8)
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    selector.referenced_array = bitmap
+    return selector
 
 
 class FaissVectorSearch:
@@ -10,22 +234,178 @@ class FaissVectorSearch:
         dim,
         metric=faiss.METRIC_INNER_PRODUCT,
         model_name="sentence-transformers/all-MiniLM-L6-v2",
+        batch_size=EMBEDDING_BATCH_SIZE,
+        num_threads=EMBEDDING_NUM_THREADS,
+        index_type=FAISS_INDEX_TYPE,
+        nprobe=FAISS_NPROBE,
+        ef_search=FAISS_EF_SEARCH,
+        mmap=FAISS_MMAP,
+        compaction_ratio=FAISS_COMPACTION_RATIO,
+        quantization=FAISS_QUANTIZATION,
+        reduced_dim=FAISS_REDUCED_DIM,
+        dim_reduction=FAISS_DIM_REDUCTION,
+        rerank_k_factor=FAISS_RERANK_K_FACTOR,
     ):
         self.index_path = index_path
         self.dim = dim
         self.metric = metric
-        self.index = self.load_index()
-        self.model = AutoModel.from_pretrained(model_name)
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.index_type = index_type
+        self.quantization = quantization
+        self.reduced_dim = reduced_dim
+        self.dim_reduction = dim_reduction
+        self.rerank_k_factor = rerank_k_factor
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.mmap = mmap
+        self.compaction_ratio = compaction_ratio
+
+        directory = os.path.dirname(index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Serializes appends to the delta log and generation swaps across processes
+        self._lock_path = f"{index_path}.lock"
+        self._pointer_path = f"{index_path}.current"
+        self._lock = threading.RLock()
+        self._merge_thread = None
+        # Called with (operation, ids) for every replayed delta record
+        self.on_replay = None
+        self.reload()
+
+        # Indexes holding externally computed vectors (e.g. a Pinecone mirror) need no model
+        self.embedder = (
+            TransformerEmbedder(
+                model_name, batch_size=batch_size, num_threads=num_threads
+            )
+            if model_name
+            else None
+        )
 
     def load_index(self):
-        try:
-            return faiss.read_index(self.index_path)
-        except FileNotFoundError:
-            return faiss.IndexFlatL2(self.dim)
+        """
+        Load the base snapshot of the current generation.
+
+        With `mmap` the snapshot is memory-mapped read-only, so every process serving
+        the same index shares the page cache instead of holding a private copy.
+        """
+        base_path = self._base_path(self.generation)
+        if os.path.exists(base_path):
+            flags = 0
+            if self.mmap:
+                # Zero-copy for flat, HNSW and IVF alike; IO_FLAG_MMAP would switch IVF to on-disk lists
+                flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+            index = faiss.read_index(base_path, flags)
+            if index.metric_type != self.metric:
+                raise ValueError(
+                    f"Index at {base_path} uses metric {index.metric_type}, expected {self.metric}."
+                )
+        else:
+            index = self.build_index()
+
+        self._apply_search_parameters(index)
+        return index
+
+    def build_index(self):
+        """Build an empty index with this instance's layout and compression settings."""
+        # add_with_ids needs an ID map on top of the underlying index
+        return build_index(
+            self.dim,
+            self.metric,
+            self.index_type,
+            quantization=self.quantization,
+            reduced_dim=self.reduced_dim,
+            dim_reduction=self.dim_reduction,
+            rerank_k_factor=self.rerank_k_factor,
+        )
+
+    def reload(self):
+        """Re-open the current base snapshot and replay its delta log."""
+        with self._lock:
+            self.generation = self._read_generation()
+            self.index = self.load_index()
+            self._base_ids = np.sort(faiss.vector_to_array(self.index.id_map))
+            # Vectors added since the snapshot, searched alongside the base index
+            self.delta_index = faiss.IndexIDMap2(
+                faiss.IndexFlatIP(self.dim)
+                if self.metric == faiss.METRIC_INNER_PRODUCT
+                else faiss.IndexFlatL2(self.dim)
+            )
+            # IDs whose vector in the read-only base snapshot was deleted
+            self.tombstones = set()
+            self._tombstone_selector = None
+            self.delta_log = DeltaLog(self._log_path(self.generation), self.dim)
+            self._catch_up()
+
+    @property
+    def ntotal(self):
+        """Number of live vectors across the base snapshot and the delta."""
+        return self.index.ntotal - len(self.tombstones) + self.delta_index.ntotal
+
+    @property
+    def tombstone_ratio(self):
+        """Fraction of the base snapshot's vectors that were deleted or replaced."""
+        if self.index.ntotal == 0:
+            return 0.0
+        return len(self.tombstones) / self.index.ntotal
+
+    @property
+    def is_trained(self):
+        """Whether the index is ready to accept vectors."""
+        return self.index.is_trained
+
+    def train(self, sample_embeddings):
+        """
+        Train the index (IVF centroids, PQ codebooks, SQ8 ranges, PCA) on a
+        representative sample.
+
+        IVF indexes need roughly 30 to 256 samples per cluster; uncompressed flat
+        and HNSW indexes need no training and ignore this call.
+
+        Args:
+            sample_embeddings (numpy array): Sample of shape (n, dim).
+        """
+        with self._lock:
+            if self.index.is_trained:
+                return
+            # An untrained index is empty, so train a fresh in-memory copy
+            index = self.build_index()
+            index.train(np.ascontiguousarray(sample_embeddings, dtype=np.float32))
+            self._apply_search_parameters(index)
+            self.index = index
+            self.save_index()
+
+    def train_from_texts(self, texts):
+        """
+        Embed a sample of texts and train the index on it.
+
+        Args:
+            texts (list): Representative texts, e.g. a random sample of the corpus.
+        """
+        self.train(self.create_embeddings(texts))
+
+    def set_search_parameters(self, nprobe=None, ef_search=None, rerank_k_factor=None):
+        """
+        Tune the search-time latency/recall trade-off.
+
+        Args:
+            nprobe (int, optional): Number of IVF clusters visited per query.
+            ef_search (int, optional): Size of the HNSW candidate list per query.
+            rerank_k_factor (int, optional): Candidates re-scored exactly per result,
+                for indexes built with re-scoring.
+        """
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if rerank_k_factor is not None:
+            self.rerank_k_factor = rerank_k_factor
+        self._apply_search_parameters(self.index)
+
+    def _apply_search_parameters(self, index):
+        apply_search_parameters(index, self.nprobe, self.ef_search, self.rerank_k_factor)
 
     def save_index(self):
-        faiss.write_index(self.index, self.index_path)
+        """Write the base snapshot of the current generation."""
+        _write_index_atomically(self.index, self._base_path(self.generation))
 
     def create_embedding(self, text):
         """
@@ -37,22 +417,183 @@ class FaissVectorSearch:
         Returns:
             embeddings (numpy array): Embeddings for the input text.
         """
-        inputs = self.tokenizer(text, return_tensors="pt")
-        outputs = self.model(**inputs)
-        embeddings = outputs.pooler_output.detach().numpy()[0]
-        return embeddings
+        return self.embedder.embed([text])[0]
+
+    def create_embeddings(self, texts):
+        """
+        Create embeddings for many texts in padded, length-sorted batches.
+
+        Args:
+            texts (list): Texts to create embeddings for.
+
+        Returns:
+            embeddings (numpy array): Embeddings of shape (len(texts), dim).
+        """
+        return self.embedder.embed(texts)
 
     def upsert(self, texts, ids):
         """
-        Upsert embeddings into the index.
+        Embed texts and store them, replacing any vectors already stored under the same IDs.
 
         Args:
             texts (list): List of texts to upsert.
             ids (list): IDs corresponding to the texts.
         """
-        embeddings = np.array([self.create_embedding(text) for text in texts])
-        self.index.add_with_ids(embeddings, np.array(ids, dtype=np.int64))
-        self.save_index()
+        self.add_embeddings(self.create_embeddings(texts), ids)
+
+    def add_embeddings(self, embeddings, ids):
+        """
+        Store precomputed embeddings, replacing any vectors already stored under the same IDs.
+
+        The vectors are appended to the delta log and the in-memory delta index; the
+        base snapshot is only rewritten by `merge`. Replaced base vectors are
+        tombstoned until then. If an ID appears more than once, the last embedding wins.
+
+        Args:
+            embeddings (numpy array): Embeddings of shape (n, dim).
+            ids (list): IDs corresponding to the embeddings.
+        """
+        if not self.index.is_trained:
+            raise ValueError(
+                f"The {self.index_type} index must be trained before adding vectors; call train() with a sample first."
+            )
+        ids = np.asarray(ids, dtype=np.int64)
+        # Keep the last occurrence of every ID
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = np.sort(len(ids) - 1 - last)
+        with self._lock, file_lock(self._lock_path):
+            self.refresh()
+            self.delta_log.append_additions(ids[keep], np.asarray(embeddings)[keep])
+            self._catch_up()
+        self.compact_if_needed()
+
+    def delete(self, ids):
+        """
+        Remove embeddings from the index.
+
+        Vectors in the delta are dropped right away; vectors in the base snapshot are
+        tombstoned until the next merge.
+
+        Args:
+            ids (list): IDs of the embeddings to remove.
+        """
+        with self._lock, file_lock(self._lock_path):
+            self.refresh()
+            self.delta_log.append_deletions(ids)
+            self._catch_up()
+        self.compact_if_needed()
+
+    def compact_if_needed(self):
+        """
+        Rebuild the base snapshot once too many of its vectors are tombstoned.
+
+        Tombstoned vectors are still scanned (and filtered out) by every search, so
+        past `compaction_ratio` the index is rebuilt from the live vectors only.
+
+        Returns:
+            bool: Whether a compaction was performed.
+        """
+        if self.tombstone_ratio < self.compaction_ratio:
+            return False
+        return self.merge()
+
+    def refresh(self):
+        """Pick up writes made by other processes: a new base generation or new delta records."""
+        with self._lock:
+            if self._read_generation() != self.generation:
+                self.reload()
+            elif self.delta_log.size() != self.delta_log.offset:
+                self._catch_up()
+
+    def merge(self):
+        """
+        Fold the delta log into a new base snapshot and swap it in atomically.
+
+        Only one process merges at a time; others keep serving from the previous
+        generation until they notice the new one on their next refresh.
+
+        Returns:
+            bool: Whether a merge was performed.
+        """
+        merge_lock_path = f"{self.index_path}.merge.lock"
+        with file_lock(merge_lock_path, blocking=False) as acquired:
+            if not acquired:
+                return False
+
+            with self._lock:
+                self._catch_up()
+                generation = self.generation
+                log_offset = self.delta_log.offset
+                if log_offset == 0:
+                    return False
+                tombstones = np.array(sorted(self.tombstones), dtype=np.int64)
+                delta_ids = faiss.vector_to_array(self.delta_index.id_map).copy()
+                delta_vectors = self.delta_index.index.reconstruct_n(
+                    0, self.delta_index.ntotal
+                )
+
+            # Build the new snapshot from a private, writable copy of the base
+            base_path = self._base_path(generation)
+            if os.path.exists(base_path):
+                merged = faiss.read_index(base_path)
+            else:
+                # No snapshot yet (untrained index types); clone_index can't copy every
+                # transform, e.g. the truncating RemapDimensionsTransform, serialization can
+                merged = faiss.deserialize_index(faiss.serialize_index(self.index))
+            if len(tombstones):
+                merged = self._remove_from_base(merged, tombstones)
+            if len(delta_ids):
+                merged.add_with_ids(delta_vectors, delta_ids)
+            _write_index_atomically(merged, self._base_path(generation + 1))
+
+            with file_lock(self._lock_path):
+                # Carry over records appended while the snapshot was being built
+                tail = self.delta_log.read_bytes(log_offset)
+                new_log_path = self._log_path(generation + 1)
+                with open(f"{new_log_path}.tmp", "wb") as file:
+                    file.write(tail)
+                os.replace(f"{new_log_path}.tmp", new_log_path)
+                with open(f"{self._pointer_path}.tmp", "w") as file:
+                    json.dump({"generation": generation + 1}, file)
+                os.replace(f"{self._pointer_path}.tmp", self._pointer_path)
+
+            self.reload()
+
+            # Processes still mapping the old files keep them alive until they reload
+            for path in (self._base_path(generation), self._log_path(generation)):
+                if os.path.exists(path):
+                    os.remove(path)
+            print(f"Merged FAISS delta into generation {generation + 1} ({merged.ntotal} vectors).")
+            return True
+
+    def start_background_merge(
+        self, interval=FAISS_MERGE_INTERVAL, min_delta=FAISS_MERGE_MIN_DELTA
+    ):
+        """
+        Periodically merge the delta into a new base snapshot from a daemon thread.
+
+        Args:
+            interval (float): Seconds between checks.
+            min_delta (int): Merge once the delta holds at least this many additions or deletions.
+        """
+        if self._merge_thread is not None:
+            return
+
+        def merge_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                    if (
+                        self.delta_index.ntotal + len(self.tombstones) >= min_delta
+                        or self.tombstone_ratio >= self.compaction_ratio
+                    ):
+                        self.merge()
+                except Exception as e:
+                    print(f"Error during background FAISS merge: {e}")
+
+        self._merge_thread = threading.Thread(target=merge_loop, daemon=True)
+        self._merge_thread.start()
 
     def search(self, query_text, k=10):
         """
@@ -66,9 +607,69 @@ class FaissVectorSearch:
             distances (numpy array): Distances to the nearest neighbors.
             indices (numpy array): Indices of the nearest neighbors.
         """
-        query_embedding = self.create_embedding(query_text)
-        distances, indices = self.index.search(np.array([query_embedding]), k)
-        return distances, indices
+        return self.search_embeddings(self.create_embedding(query_text), k)
+
+    def search_embeddings(self, query_embeddings, k=10, selector=None):
+        """
+        Search with precomputed query embeddings, optionally restricted to a set of IDs.
+
+        The selector is evaluated inside FAISS during the scan, so filtered searches
+        neither copy nor reconstruct any vectors. Results from the base snapshot and
+        the delta are merged by score.
+
+        Args:
+            query_embeddings (numpy array): One embedding of shape (dim,) or a batch of shape (n, dim).
+            k (int, optional): Number of nearest neighbors to return. Defaults to 10.
+            selector (faiss.IDSelector, optional): Only IDs accepted by the selector are returned.
+
+        Returns:
+            distances (numpy array): Distances to the nearest neighbors.
+            indices (numpy array): Indices of the nearest neighbors.
+        """
+        queries = np.ascontiguousarray(np.atleast_2d(query_embeddings), dtype=np.float32)
+        self.refresh()
+
+        with self._lock:
+            base_selector = self._live_selector(selector)
+            if base_selector is None:
+                distances, indices = self.index.search(queries, k)
+            else:
+                distances, indices = self.index.search(
+                    queries, k, params=self._search_parameters(base_selector)
+                )
+            if self.delta_index.ntotal == 0:
+                return distances, indices
+
+            params = faiss.SearchParameters(sel=selector) if selector is not None else None
+            delta_distances, delta_indices = self.delta_index.search(
+                queries, k, params=params
+            )
+
+        distances = np.hstack([distances, delta_distances])
+        indices = np.hstack([indices, delta_indices])
+        # Missing results come back with the worst possible score, so they sort last
+        if self.metric == faiss.METRIC_INNER_PRODUCT:
+            order = np.argsort(-distances, axis=1, kind="stable")[:, :k]
+        else:
+            order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(distances, order, axis=1),
+            np.take_along_axis(indices, order, axis=1),
+        )
+
+    def batch_search(self, query_texts, k=10):
+        """
+        Search many query texts with one batched embedding call and one FAISS search.
+
+        Args:
+            query_texts (list): Query texts to search for.
+            k (int, optional): Number of nearest neighbors per query. Defaults to 10.
+
+        Returns:
+            distances (numpy array): Distances of shape (len(query_texts), k).
+            indices (numpy array): Indices of shape (len(query_texts), k).
+        """
+        return self.search_embeddings(self.create_embeddings(query_texts), k)
 
     def hybrid_search(self, query_text, k=10, filter_ids=None):
         """
@@ -83,24 +684,515 @@ class FaissVectorSearch:
             distances (numpy array): Distances to the nearest neighbors.
             indices (numpy array): Indices of the nearest neighbors.
         """
-        if filter_ids is not None:
-            filter_ids = np.array(filter_ids, dtype=np.int64)
-            filtered_index = faiss.IndexFlatL2(self.dim)
-            filtered_index.add_with_ids(
-                self.index.reconstruct_n(0, self.index.ntotal), self.index.id_map
-            )
-            filtered_index.filter(filter_ids)
-            distances, indices = filtered_index.search(
-                np.array([self.create_embedding(query_text)]), k
-            )
+        selector = make_id_selector(filter_ids) if filter_ids is not None else None
+        return self.search_embeddings(self.create_embedding(query_text), k, selector)
+
+    def _search_parameters(self, selector):
+        # SearchParameters replace the index's own nprobe/efSearch, so pass them along
+        inner = faiss.downcast_index(self.index.index)
+        refine = None
+        if isinstance(inner, faiss.IndexRefine):
+            refine, inner = inner, faiss.downcast_index(inner.base_index)
+            # IndexIDMap2 only translates the outer selector, but IndexRefine hands
+            # the nested one to its base index, so translate it up front
+            selector = faiss.IDSelectorTranslated(self.index.id_map, selector)
+        if isinstance(inner, faiss.IndexPreTransform):
+            inner = faiss.downcast_index(inner.index)
+
+        if isinstance(inner, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        elif isinstance(inner, faiss.IndexHNSW):
+            # Very selective filters starve the HNSW candidate list; raise ef_search for them
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
         else:
-            distances, indices = self.search(query_text, k)
-        return distances, indices
+            params = faiss.SearchParameters(sel=selector)
+        if refine is None:
+            return params
+
+        refine_params = faiss.IndexRefineSearchParameters(
+            k_factor=refine.k_factor, base_index_params=params
+        )
+        refine_params.sel = selector
+        refine_params.referenced_objects = (selector, params)
+        return refine_params
+
+    def _live_selector(self, selector):
+        # Hide base vectors that were deleted or replaced since the snapshot
+        if not self.tombstones:
+            return selector
+        if self._tombstone_selector is None:
+            excluded = make_id_selector(sorted(self.tombstones))
+            self._tombstone_selector = faiss.IDSelectorNot(excluded)
+            # SWIG doesn't keep the wrapped selector alive on its own
+            self._tombstone_selector.referenced_selector = excluded
+        if selector is None:
+            return self._tombstone_selector
+        combined = faiss.IDSelectorAnd(selector, self._tombstone_selector)
+        combined.referenced_selectors = (selector, self._tombstone_selector)
+        return combined
+
+    def _catch_up(self):
+        # Apply delta records appended by this or any other process, in log order
+        for operation, ids, vectors in self.delta_log.read_new():
+            # Additions replace earlier versions, so both kinds retire the current vectors
+            self.delta_index.remove_ids(make_id_selector(ids))
+            in_base = ids[np.isin(ids, self._base_ids)]
+            if len(in_base):
+                self.tombstones.update(in_base.tolist())
+                self._tombstone_selector = None
+            if operation == ADD:
+                self.delta_index.add_with_ids(vectors, ids)
+            if self.on_replay is not None:
+                self.on_replay(operation, ids)
+
+    def _remove_from_base(self, index, ids):
+        if isinstance(faiss.downcast_index(index.index), faiss.IndexFlatCodes):
+            index.remove_ids(make_id_selector(ids))
+            return index
+
+        # IVF keeps stale internal labels after IndexIDMap2.remove_ids and HNSW can't
+        # remove at all, so re-add the surviving vectors to the emptied (still trained) index
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        base_ids = faiss.vector_to_array(index.id_map)
+        live_ids = base_ids[~np.isin(base_ids, ids)]
+        live_vectors = index.reconstruct_batch(live_ids) if len(live_ids) else None
+        if ivf is not None:
+            ivf.make_direct_map(False)
+        index.reset()
+        if len(live_ids):
+            index.add_with_ids(live_vectors, live_ids)
+        return index
+
+    def _read_generation(self):
+        try:
+            with open(self._pointer_path, "r") as file:
+                return json.load(file)["generation"]
+        except FileNotFoundError:
+            return 0
+
+    def _base_path(self, generation):
+        return self.index_path if generation == 0 else f"{self.index_path}.{generation}"
+
+    def _log_path(self, generation):
+        return f"{self._base_path(generation)}.delta"
+
+
+def _write_index_atomically(index, path):
+    # Write to a temporary file and swap it in so readers never see a partial index
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _set_bits(bitmap, ids, value=True):
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) == 0:
+        return bitmap
+    size = int(ids.max()) // 8 + 1
+    if value and size > len(bitmap):
+        bitmap = np.concatenate([bitmap, np.zeros(size - len(bitmap), dtype=np.uint8)])
+    ids = ids[(ids >> 3) < len(bitmap)]
+    masks = (1 << (ids & 7)).astype(np.uint8)
+    if value:
+        np.bitwise_or.at(bitmap, ids >> 3, masks)
+    else:
+        np.bitwise_and.at(bitmap, ids >> 3, ~masks)
+    return bitmap
+
+
+def _combine_bitmaps(left, right, operation):
+    size = max(len(left), len(right))
+    left = np.pad(left, (0, size - len(left)))
+    right = np.pad(right, (0, size - len(right)))
+    return operation(left, right)
+
+
+class MetadataBitmaps:
+    """
+    Packed ID bitmaps for every value of selected metadata fields (category, site_id),
+    kept in sync with the document store so common filters are ready-made IDSelectors.
+    """
+
+    def __init__(self, doc_store: DocStore, fields: List[str] = FAISS_FILTER_FIELDS):
+        """
+        Build the bitmaps from the document store.
+
+        Args:
+            doc_store (DocStore): Store holding the metadata of every record.
+            fields (List[str]): Metadata fields to precompute bitmaps for.
+        """
+        self.doc_store = doc_store
+        # field -> value -> packed bitmap over FAISS IDs
+        self._bitmaps: Dict[str, Dict[any, np.ndarray]] = {}
+        self._load_fields(fields)
+
+    def add(self, faiss_ids: List[int], metadata_list: List[Dict[str, any]]) -> None:
+        """Record the metadata of new or updated records."""
+        self.remove(faiss_ids)
+        for field, values in self._bitmaps.items():
+            for faiss_id, metadata in zip(faiss_ids, metadata_list):
+                value = metadata.get(field)
+                if _is_scalar(value):
+                    values[value] = _set_bits(
+                        values.get(value, np.zeros(0, dtype=np.uint8)), [faiss_id]
+                    )
+
+    def remove(self, faiss_ids: List[int]) -> None:
+        """Forget deleted records."""
+        for values in self._bitmaps.values():
+            for value, bitmap in values.items():
+                values[value] = _set_bits(bitmap, faiss_ids, value=False)
+
+    def bitmap(self, metadata_filter: Dict[str, any]) -> np.ndarray:
+        """
+        Return the packed bitmap of the records matching a Pinecone-style filter.
+
+        Equality and "$in" conditions are answered from the precomputed bitmaps; other
+        operators fall back to a scan of the document store.
+
+        Args:
+            metadata_filter (Dict[str, any]): Filter, e.g. {"category": {"$in": ["qa", "pdf_page"]}}.
+
+        Returns:
+            numpy array: uint8 array of packed bits.
+        """
+        result = None
+        for field, condition in metadata_filter.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                if operator == "$eq" and _is_scalar(operand):
+                    bitmap = self._value_bitmap(field, operand)
+                elif operator == "$in" and all(_is_scalar(value) for value in operand):
+                    bitmap = np.zeros(0, dtype=np.uint8)
+                    for value in operand:
+                        bitmap = _combine_bitmaps(
+                            bitmap, self._value_bitmap(field, value), np.bitwise_or
+                        )
+                else:
+                    bitmap = self._scan({field: {operator: operand}})
+                result = (
+                    bitmap
+                    if result is None
+                    else _combine_bitmaps(result, bitmap, np.bitwise_and)
+                )
+        return result if result is not None else np.zeros(0, dtype=np.uint8)
+
+    def _value_bitmap(self, field, value) -> np.ndarray:
+        if field not in self._bitmaps:
+            self._load_fields([field])
+        return self._bitmaps[field].get(value, np.zeros(0, dtype=np.uint8))
+
+    def _load_fields(self, fields: List[str]) -> None:
+        ids_by_value = {field: {} for field in fields}
+        for faiss_id, _, metadata in self.doc_store.iter_metadata():
+            for field in fields:
+                value = metadata.get(field)
+                if _is_scalar(value):
+                    ids_by_value[field].setdefault(value, []).append(faiss_id)
+        for field, values in ids_by_value.items():
+            self._bitmaps[field] = {
+                value: _set_bits(np.zeros(0, dtype=np.uint8), ids)
+                for value, ids in values.items()
+            }
+
+    def _scan(self, metadata_filter: Dict[str, any]) -> np.ndarray:
+        ids = [
+            faiss_id
+            for faiss_id, _, metadata in self.doc_store.iter_metadata()
+            if matches_filter(metadata, metadata_filter)
+        ]
+        return _set_bits(np.zeros(0, dtype=np.uint8), ids)
+
+
+def _is_scalar(value) -> bool:
+    return isinstance(value, (str, int, float, bool))
+
+
+class FaissVectorStore:
+    """
+    VectorStore implementation running fully in-process on top of FaissVectorSearch,
+    with record metadata kept in a local DocStore.
+    """
+
+    def __init__(
+        self,
+        index_path: str = FAISS_INDEX_PATH,
+        doc_store_path: str = FAISS_DOC_STORE_PATH,
+        dim: int = FAISS_DIM,
+        model_name: str = FAISS_EMBEDDING_MODEL,
+        index_type: str = FAISS_INDEX_TYPE,
+        quantization: str = FAISS_QUANTIZATION,
+        reduced_dim: int = FAISS_REDUCED_DIM,
+        dim_reduction: str = FAISS_DIM_REDUCTION,
+        rerank_k_factor: int = FAISS_RERANK_K_FACTOR,
+    ):
+        """
+        Initialize the FAISS vector store.
+
+        Args:
+            index_path (str): Path of the FAISS index file.
+            doc_store_path (str): Path of the SQLite document store.
+            dim (int): Dimension of the embeddings.
+            model_name (str): Hugging Face model used to embed texts.
+            index_type (str): Index layout used when creating a new index, see build_index.
+            quantization (str): Vector compression, see build_index.
+            reduced_dim (int): Dimension vectors are reduced to before indexing; 0 keeps `dim`.
+            dim_reduction (str): "pca" or "truncate".
+            rerank_k_factor (int): Candidate multiplier for exact re-scoring; 0 disables it.
+        """
+        self.faiss_search = FaissVectorSearch(
+            index_path,
+            dim,
+            model_name=model_name,
+            index_type=index_type,
+            quantization=quantization,
+            reduced_dim=reduced_dim,
+            dim_reduction=dim_reduction,
+            rerank_k_factor=rerank_k_factor,
+        )
+        self.embedding_model = model_name
+        self.doc_store = DocStore(doc_store_path)
+        self.metadata_bitmaps = MetadataBitmaps(self.doc_store)
+        # Seconds from the start of the last batch_search until each query's results were ready
+        self.last_batch_latencies: List[float] = []
+        # Keep the bitmaps in step with writes replayed from other processes
+        self.faiss_search.on_replay = self._on_replay
+        if FAISS_BACKGROUND_MERGE:
+            self.faiss_search.start_background_merge()
+
+    def train(self, texts: List[str]) -> None:
+        """
+        Train an IVF index on a sample of texts before the first upsert.
+
+        Args:
+            texts (List[str]): Representative sample of the corpus.
+        """
+        self.faiss_search.train_from_texts(texts)
+
+    def reload(self) -> None:
+        """Re-read the index and metadata from disk."""
+        self.faiss_search.reload()
+        self.metadata_bitmaps = MetadataBitmaps(self.doc_store)
+
+    def upsert(self, records: List[Dict[str, any]]) -> None:
+        """
+        Embed and store records, replacing existing records with the same IDs.
+
+        Args:
+            records (List[Dict[str, any]]): Records with "id", "text", "metadata" and "category".
+        """
+        if not records:
+            return
+        faiss_ids = self.doc_store.assign_ids([record["id"] for record in records])
+        metadata_list = [
+            {
+                "chunk_text": record["text"],
+                "metadata": record.get("metadata"),
+                "category": record.get("category"),
+            }
+            for record in records
+        ]
+        self.doc_store.put(faiss_ids, metadata_list)
+        self.metadata_bitmaps.add(faiss_ids, metadata_list)
+        self.faiss_search.upsert([record["text"] for record in records], faiss_ids)
+
+    def delete(self, ids: List[str]) -> None:
+        """
+        Remove records from the index and the document store.
+
+        Args:
+            ids (List[str]): Record IDs to remove.
+        """
+        faiss_ids = self.doc_store.delete(ids)
+        if faiss_ids:
+            self.metadata_bitmaps.remove(faiss_ids)
+            self.faiss_search.delete(faiss_ids)
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, any]]:
+        """
+        Perform a semantic search and retrieve the top-k results.
+
+        Args:
+            query (str): The query string to search for.
+            top_k (int): The number of top results to retrieve. Defaults to 5.
+
+        Returns:
+            List[Dict[str, any]]: Results with "id", "score" and "metadata".
+        """
+        if not query or not query.strip():
+            raise ValueError("Query string cannot be empty or None.")
+        distances, indices = self.faiss_search.search(query, k=top_k)
+        return self._format_results(distances[0], indices[0])
+
+    def search_vector(
+        self,
+        vector,
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, any]] = None,
+    ) -> List[Dict[str, any]]:
+        """
+        Search with a precomputed query embedding.
+
+        Args:
+            vector (numpy array): Query embedding of shape (dim,).
+            top_k (int): The number of top results to retrieve. Defaults to 5.
+            metadata_filter (Dict[str, any], optional): Pinecone-style metadata filter.
+
+        Returns:
+            List[Dict[str, any]]: Results with "id", "score" and "metadata".
+        """
+        return self.search_vectors(
+            np.atleast_2d(vector), top_k=top_k, metadata_filter=metadata_filter
+        )[0]
+
+    def search_vectors(
+        self,
+        vectors,
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, any]] = None,
+    ) -> List[List[Dict[str, any]]]:
+        """
+        Search with a batch of precomputed query embeddings in one FAISS call.
+
+        Args:
+            vectors (numpy array): Query embeddings of shape (n, dim).
+            top_k (int): The number of top results per query. Defaults to 5.
+            metadata_filter (Dict[str, any], optional): Pinecone-style metadata filter
+                applied to every query.
+
+        Returns:
+            List[List[Dict[str, any]]]: One result list per query, in input order.
+        """
+        # Replay writes from other processes first so the bitmaps cover them too
+        self.faiss_search.refresh()
+        selector = None
+        if metadata_filter is not None:
+            bitmap = self.metadata_bitmaps.bitmap(metadata_filter)
+            if not bitmap.any():
+                return [[] for _ in range(len(vectors))]
+            selector = bitmap_selector(bitmap)
+
+        distances, indices = self.faiss_search.search_embeddings(vectors, top_k, selector)
+        return self._format_batch_results(distances, indices)
+
+    def upsert_embeddings(self, records: List[Dict[str, any]], embeddings) -> None:
+        """
+        Store records whose embeddings were computed elsewhere, replacing existing
+        records with the same IDs.
+
+        Args:
+            records (List[Dict[str, any]]): Records with "id" and the full "metadata"
+                dictionary to return from searches.
+            embeddings (numpy array): Embeddings of shape (len(records), dim).
+        """
+        if not records:
+            return
+        faiss_ids = self.doc_store.assign_ids([record["id"] for record in records])
+        metadata_list = [record["metadata"] for record in records]
+        self.doc_store.put(faiss_ids, metadata_list)
+        self.metadata_bitmaps.add(faiss_ids, metadata_list)
+        self.faiss_search.add_embeddings(embeddings, faiss_ids)
+
+    def batch_search(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, any]] = None,
+    ) -> List[List[Dict[str, any]]]:
+        """
+        Search several queries, returning results in input order.
+
+        The queries are embedded in length-sorted batches and searched with a single
+        vectorized FAISS call. All queries finish together, so each entry of
+        `last_batch_latencies` is the latency of the whole batch.
+
+        Args:
+            queries (List[str]): Query strings.
+            top_k (int): The number of top results per query. Defaults to 5.
+            metadata_filter (Dict[str, any], optional): Pinecone-style metadata filter
+                applied to every query.
+
+        Returns:
+            List[List[Dict[str, any]]]: One result list per query.
+        """
+        if any(not query or not query.strip() for query in queries):
+            raise ValueError("Query strings cannot be empty or None.")
+        if not queries:
+            self.last_batch_latencies = []
+            return []
+
+        start = time.perf_counter()
+        results = self.search_vectors(
+            self.faiss_search.create_embeddings(queries),
+            top_k=top_k,
+            metadata_filter=metadata_filter,
+        )
+        self.last_batch_latencies = [time.perf_counter() - start] * len(queries)
+        return results
+
+    def filter(
+        self, query: str, metadata_filter: Dict[str, any], top_k: int = 5
+    ) -> List[Dict[str, any]]:
+        """
+        Search among the records whose metadata matches a filter.
+
+        Args:
+            query (str): The query string to search for.
+            metadata_filter (Dict[str, any]): Pinecone-style filter, e.g. {"category": "qa"}.
+            top_k (int): The number of top results to retrieve. Defaults to 5.
+
+        Returns:
+            List[Dict[str, any]]: Matching results with "id", "score" and "metadata".
+        """
+        return self.search_vector(
+            self.faiss_search.create_embedding(query),
+            top_k=top_k,
+            metadata_filter=metadata_filter,
+        )
+
+    def _on_replay(self, operation: int, faiss_ids) -> None:
+        faiss_ids = faiss_ids.tolist()
+        if operation != ADD:
+            self.metadata_bitmaps.remove(faiss_ids)
+            return
+        documents = self.doc_store.get_many(faiss_ids)
+        present = [faiss_id for faiss_id in faiss_ids if faiss_id in documents]
+        self.metadata_bitmaps.add(
+            present, [documents[faiss_id]["metadata"] for faiss_id in present]
+        )
+
+    def _format_results(self, distances, indices) -> List[Dict[str, any]]:
+        return self._format_batch_results([distances], [indices])[0]
+
+    def _format_batch_results(self, distances, indices) -> List[List[Dict[str, any]]]:
+        hits = [
+            [(int(i), float(d)) for d, i in zip(row_distances, row_indices) if i != -1]
+            for row_distances, row_indices in zip(distances, indices)
+        ]
+        # One document store lookup for the whole batch
+        documents = self.doc_store.get_many(
+            list({faiss_id for row in hits for faiss_id, _ in row})
+        )
+        return [
+            [
+                {
+                    "id": documents[faiss_id]["id"],
+                    "score": score,
+                    "metadata": documents[faiss_id]["metadata"],
+                }
+                for faiss_id, score in row
+                if faiss_id in documents
+            ]
+            for row in hits
+        ]
 
 
 if __name__ == "__main__":
     # Create a FaissVectorSearch instance
-    search = FaissVectorSearch("index.faiss", 128)
+    search = FaissVectorSearch("index.faiss", FAISS_DIM)
 
     # Create some embeddings
     texts = ["This is a sample text.", "This is another sample text."]
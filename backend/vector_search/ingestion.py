@@ -0,0 +1,647 @@
+import argparse
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, List, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.vector_search.chunking import (
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_TARGET_TOKENS,
+    TokenCounter,
+    chunk_text,
+    get_token_counter,
+)
+from backend.vector_search.manifest import (
+    IncrementalStore,
+    IngestionManifest,
+    manifest_path,
+)
+
+load_dotenv()
+# Processes extracting PDF pages; defaults to one per core
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+# Pages extracted per task, large enough to amortize opening the PDF in a worker
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+# Records per upsert call and checkpoint; stores split it further to provider limits
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "90"))
+# Upsert calls (embedding included) in flight at once
+INGEST_UPSERT_CONCURRENCY = int(os.getenv("INGEST_UPSERT_CONCURRENCY", "4"))
+# Resume points of text-file ingestion, one JSON file per source
+INGEST_CHECKPOINT_DIR = os.getenv("INGEST_CHECKPOINT_DIR", "data/ingest_checkpoints")
+# Seconds between progress reports
+INGEST_PROGRESS_INTERVAL = float(os.getenv("INGEST_PROGRESS_INTERVAL", "5"))
+
+
+def count_pages(pdf_path: str) -> int:
+    """Return the number of pages of a PDF without extracting any text."""
+    from PyPDF2 import PdfReader
+
+    return len(PdfReader(pdf_path).pages)
+
+
+def extract_pages(pdf_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """
+    Extract the text of a page range; runs in a worker process.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        start (int): First page, 0-based.
+        stop (int): Page after the last one.
+
+    Returns:
+        List[Tuple[int, str]]: 1-based page numbers and their text, skipping empty pages.
+    """
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(pdf_path)
+    pages = []
+    for page_index in range(start, min(stop, len(reader.pages))):
+        text = reader.pages[page_index].extract_text()
+        if text and text.strip():
+            pages.append((page_index + 1, text))
+    return pages
+
+
+class IngestionCheckpoint:
+    """
+    Resume point of an interrupted, streamed source: the byte offset and line number
+    up to which every batch has been upserted.
+
+    Batches are upserted concurrently and may finish out of order, so the
+    checkpoint only advances over an unbroken run of committed batches; a failed
+    batch holds it back and is redone on the next run. A run that completes clears
+    the checkpoint, so the next one reads the whole source again.
+    """
+
+    def __init__(self, path: str, source: str):
+        """
+        Load the checkpoint of a source, if any.
+
+        It is only used if the source still has the size and modification time it
+        had when the checkpoint was written; an edited file is read from the start.
+
+        Args:
+            path (str): Checkpoint file.
+            source (str): Path of the ingested file.
+        """
+        self.path = path
+        self.source = source
+        self.offset = 0
+        self.line_number = 0
+        status = os.stat(source)
+        self.size = status.st_size
+        self.mtime = status.st_mtime_ns
+        self._pending: Dict[int, Tuple[int, int]] = {}
+        self._next_batch = 0
+        self._lock = threading.Lock()
+
+        try:
+            with open(path, "r") as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return
+        if (
+            saved.get("source") == source
+            and saved.get("size") == self.size
+            and saved.get("mtime") == self.mtime
+        ):
+            self.offset = saved["offset"]
+            self.line_number = saved["line_number"]
+
+    def commit(self, batch_index: int, offset: int, line_number: int) -> None:
+        """
+        Record that a batch was upserted.
+
+        Args:
+            batch_index (int): Position of the batch in this run, starting at 0.
+            offset (int): Byte offset right after the batch's last line.
+            line_number (int): Number of the batch's last line.
+        """
+        with self._lock:
+            self._pending[batch_index] = (offset, line_number)
+            advanced = False
+            while self._next_batch in self._pending:
+                self.offset, self.line_number = self._pending.pop(self._next_batch)
+                self._next_batch += 1
+                advanced = True
+            if advanced:
+                self._save()
+
+    def clear(self) -> None:
+        """Forget the resume point after the whole source was upserted."""
+        with self._lock:
+            self.offset, self.line_number = 0, 0
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(
+                {
+                    "source": self.source,
+                    "size": self.size,
+                    "mtime": self.mtime,
+                    "offset": self.offset,
+                    "line_number": self.line_number,
+                },
+                file,
+            )
+        os.replace(temporary_path, self.path)
+
+
+class IngestionPipeline:
+    """
+    Staged ingestion into a vector store: reading (PDF pages in a process pool, or
+    text files streamed line by line), chunking, and batched embedding and upserts
+    in a bounded pool of writer threads.
+
+    Content streams through the stages. At most two extraction tasks per worker and
+    two batches per writer are pending at any time, so memory stays bounded however
+    large the documents are, and a slow store throttles reading instead of piling
+    up text.
+    """
+
+    def __init__(
+        self,
+        store,
+        workers: int = INGEST_WORKERS,
+        pages_per_task: int = INGEST_PAGES_PER_TASK,
+        batch_size: int = INGEST_BATCH_SIZE,
+        upsert_concurrency: int = INGEST_UPSERT_CONCURRENCY,
+        chunk_tokens: int = CHUNK_TARGET_TOKENS,
+        chunk_overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        token_counter: Optional[TokenCounter] = None,
+        checkpoint_dir: str = INGEST_CHECKPOINT_DIR,
+        progress_interval: float = INGEST_PROGRESS_INTERVAL,
+        manifest: Optional[IngestionManifest] = None,
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            store (VectorStore): Destination; anything with `upsert(records)` that
+                embeds the records itself.
+            workers (int): Extraction processes.
+            pages_per_task (int): Pages extracted per task.
+            batch_size (int): Records per upsert call.
+            upsert_concurrency (int): Upsert calls in flight at once.
+            chunk_tokens (int): Most tokens per chunk.
+            chunk_overlap_tokens (int): Most tokens repeated from the previous chunk
+                of a page.
+            token_counter (TokenCounter, optional): Defaults to the CHUNK_TOKENIZER counter.
+            checkpoint_dir (str): Where text-file ingestion keeps its resume points.
+            progress_interval (float): Seconds between progress reports.
+            manifest (IngestionManifest, optional): Manifest of the store's partition.
+                With it, unchanged records are skipped and records that disappeared
+                from a completely re-ingested source are deleted (see IncrementalStore).
+        """
+        self.store = store
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.batch_size = batch_size
+        self.upsert_concurrency = upsert_concurrency
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.token_counter = token_counter or get_token_counter()
+        self.checkpoint_dir = checkpoint_dir
+        self.progress_interval = progress_interval
+        self.manifest = manifest
+
+    def ingest_folder(self, folder: str) -> Dict[str, float]:
+        """
+        Ingest every PDF below a folder.
+
+        With a manifest, records of PDFs that were removed from the folder are
+        deleted as well.
+
+        Args:
+            folder (str): Folder to scan recursively.
+
+        Returns:
+            Dict[str, float]: Statistics, see ingest_pdfs.
+        """
+        pdf_paths = sorted(
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(folder)
+            for name in names
+            if name.lower().endswith(".pdf")
+        )
+        return self.ingest_pdfs(pdf_paths, source_prefix=folder)
+
+    def ingest_pdfs(
+        self, pdf_paths: List[str], source_prefix: Optional[str] = None
+    ) -> Dict[str, float]:
+        """
+        Ingest PDFs page by page.
+
+        Pages are packed into chunks of up to `chunk_tokens` at sentence boundaries
+        (see chunking.chunk_text). Every chunk becomes a "pdf_page" record with the ID
+        "<pdf_path>_page_<page>_chunk_<chunk>" and its source, page, chunk number,
+        character offsets in the page text and token count in the metadata.
+
+        Args:
+            pdf_paths (List[str]): PDFs to ingest.
+            source_prefix (str, optional): With a manifest, also delete the records of
+                previously ingested sources under this prefix that were not ingested now.
+
+        Returns:
+            Dict[str, float]: Documents, pages, chunks and batches processed, failed
+            extraction tasks and upserts, elapsed seconds and pages per second, and with
+            a manifest the chunks skipped as unchanged and the records deleted.
+        """
+        stats = {
+            "documents": 0,
+            "pages": 0,
+            "chunks": 0,
+            "batches": 0,
+            "failed_tasks": 0,
+            "failed_batches": 0,
+        }
+        start = time.perf_counter()
+        target = self._target()
+        batches, writers = self._start_writers(stats, target)
+
+        pending_records = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = {}
+            tasks = self._page_tasks(pdf_paths, stats)
+            while True:
+                # Keep every worker busy with one task queued behind it
+                while len(in_flight) < 2 * self.workers:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    in_flight[executor.submit(extract_pages, *task)] = task
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pdf_path, first_page, _ = in_flight.pop(future)
+                    try:
+                        pages = future.result()
+                    except Exception as e:
+                        print(
+                            f"Error extracting {pdf_path} from page {first_page + 1}: {e}"
+                        )
+                        stats["failed_tasks"] += 1
+                        continue
+
+                    for page_number, text in pages:
+                        pending_records.extend(
+                            self._page_records(pdf_path, page_number, text)
+                        )
+                        stats["pages"] += 1
+                    while len(pending_records) >= self.batch_size:
+                        # Blocks while the writers are behind, throttling extraction
+                        batches.put((pending_records[: self.batch_size], None))
+                        del pending_records[: self.batch_size]
+
+        if pending_records:
+            batches.put((pending_records, None))
+        self._stop_writers(batches, writers)
+        complete = not stats["failed_tasks"] and not stats["failed_batches"]
+        self._finish(target, stats, complete, source_prefix)
+
+        stats["seconds"] = time.perf_counter() - start
+        stats["pages_per_second"] = stats["pages"] / stats["seconds"]
+        print(f"Ingestion finished: {stats}")
+        return stats
+
+    def ingest_text_file(
+        self, text_file_path: str, resume: bool = True
+    ) -> Dict[str, float]:
+        """
+        Stream a text file, e.g. a FAQ dump with one entry per line, into the store.
+
+        The file is read lazily. Consecutive non-empty lines are grouped into chunks
+        of up to `chunk_tokens`, and the chunks are embedded and upserted in batches
+        of `batch_size`. After every committed batch the byte offset is checkpointed,
+        so an interrupted run resumes after the last committed batch, provided the
+        file was not modified since; a completed run clears the checkpoint. A chunk gets the
+        ID "<path>_line_<first line>" and its first line, line count, byte offset in
+        the file and token count in the metadata. A line longer than `chunk_tokens` is
+        split between words into parts with "_part_<n>" IDs and their character offsets
+        in the line.
+
+        Args:
+            text_file_path (str): Path to the text file.
+            resume (bool): Continue from the checkpoint; False starts over.
+
+        Returns:
+            Dict[str, float]: Lines, chunks and batches processed, failed batches, the
+            line resumed from, elapsed seconds and chunks per second.
+        """
+        checkpoint = IngestionCheckpoint(
+            self._checkpoint_path(text_file_path), text_file_path
+        )
+        if not resume:
+            checkpoint.offset, checkpoint.line_number = 0, 0
+        total_bytes = os.path.getsize(text_file_path)
+        stats = {
+            "resumed_from_line": checkpoint.line_number,
+            "lines": 0,
+            "chunks": 0,
+            "batches": 0,
+            "failed_batches": 0,
+        }
+        start = time.perf_counter()
+        last_report = start
+        target = self._target()
+        batches, writers = self._start_writers(stats, target)
+
+        batch, batch_index = [], 0
+        for records, offset, line_number in self._text_chunks(
+            text_file_path, checkpoint.offset, checkpoint.line_number
+        ):
+            batch.extend(records)
+            stats["lines"] = line_number - stats["resumed_from_line"]
+            if len(batch) >= self.batch_size:
+                on_commit = self._committer(
+                    checkpoint, batch_index, offset, line_number
+                )
+                batches.put((batch, on_commit))
+                batch, batch_index = [], batch_index + 1
+
+            if time.perf_counter() - last_report >= self.progress_interval:
+                last_report = time.perf_counter()
+                self._report_progress(stats, start, offset, total_bytes)
+        if batch:
+            on_commit = self._committer(checkpoint, batch_index, offset, line_number)
+            batches.put((batch, on_commit))
+        self._stop_writers(batches, writers)
+        if not stats["failed_batches"]:
+            checkpoint.clear()
+        # Lines before the checkpoint were not seen again and must not count as removed
+        complete = not stats["failed_batches"] and not stats["resumed_from_line"]
+        self._finish(target, stats, complete)
+
+        stats["seconds"] = time.perf_counter() - start
+        stats["chunks_per_second"] = stats["chunks"] / stats["seconds"]
+        print(f"Ingestion of {text_file_path} finished: {stats}")
+        return stats
+
+    def _text_chunks(
+        self, text_file_path: str, offset: int, line_number: int
+    ) -> Iterator[Tuple[List[Dict[str, any]], int, int]]:
+        # Yields the records of a chunk with the byte offset and line number after it
+        lines, tokens = [], 0
+        first_line, first_offset = None, offset
+        chunk_offset, chunk_line = offset, line_number
+        with open(text_file_path, "rb") as file:
+            file.seek(offset)
+            for raw_line in file:
+                line_offset = offset
+                offset += len(raw_line)
+                line_number += 1
+                line = raw_line.decode("utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                line_tokens = self.token_counter.count(line)
+                if lines and tokens + line_tokens > self.chunk_tokens:
+                    records = self._text_records(
+                        text_file_path, first_line, first_offset, lines, tokens
+                    )
+                    yield records, chunk_offset, chunk_line
+                    lines, tokens = [], 0
+                if not lines:
+                    first_line, first_offset = line_number, line_offset
+                lines.append(line)
+                tokens += line_tokens
+                chunk_offset, chunk_line = offset, line_number
+        if lines:
+            records = self._text_records(
+                text_file_path, first_line, first_offset, lines, tokens
+            )
+            yield records, chunk_offset, chunk_line
+
+    def _text_records(
+        self,
+        text_file_path: str,
+        first_line: int,
+        first_offset: int,
+        lines: List[str],
+        tokens: int,
+    ) -> List[Dict[str, any]]:
+        metadata = {
+            "source": text_file_path,
+            "line_number": str(first_line),
+            "line_count": str(len(lines)),
+            "offset": str(first_offset),
+        }
+        if tokens <= self.chunk_tokens:
+            metadata["tokens"] = str(tokens)
+            return [
+                {
+                    "id": f"{text_file_path}_line_{first_line}",
+                    "text": "\n".join(lines),
+                    "metadata": json.dumps(metadata),
+                    "category": "text_file",
+                }
+            ]
+
+        # Only a single overlong line exceeds the budget
+        parts = chunk_text(
+            lines[0], self.chunk_tokens, self.chunk_overlap_tokens, self.token_counter
+        )
+        return [
+            {
+                "id": f"{text_file_path}_line_{first_line}"
+                + (f"_part_{part_number}" if part_number else ""),
+                "text": part["text"],
+                "metadata": json.dumps(
+                    {
+                        **metadata,
+                        "start": str(part["start"]),
+                        "end": str(part["end"]),
+                        "tokens": str(part["tokens"]),
+                    }
+                ),
+                "category": "text_file",
+            }
+            for part_number, part in enumerate(parts)
+        ]
+
+    def _checkpoint_path(self, source: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.checkpoint_dir, f"{digest}.json")
+
+    @staticmethod
+    def _committer(
+        checkpoint: IngestionCheckpoint, batch_index: int, offset: int, line_number: int
+    ):
+        return lambda: checkpoint.commit(batch_index, offset, line_number)
+
+    @staticmethod
+    def _report_progress(
+        stats: Dict[str, float], start: float, offset: int, total_bytes: int
+    ) -> None:
+        elapsed = time.perf_counter() - start
+        print(
+            f"Read {offset / max(total_bytes, 1):.1%} ({stats['lines']} lines), "
+            f"upserted {stats['chunks']} chunks at {stats['chunks'] / elapsed:.1f} chunks/s"
+        )
+
+    def _page_tasks(
+        self, pdf_paths: List[str], stats: Dict[str, float]
+    ) -> Iterator[Tuple[str, int, int]]:
+        for pdf_path in pdf_paths:
+            try:
+                page_count = count_pages(pdf_path)
+            except Exception as e:
+                print(f"Error opening {pdf_path}: {e}")
+                stats["failed_tasks"] += 1
+                continue
+            stats["documents"] += 1
+            for first_page in range(0, page_count, self.pages_per_task):
+                yield pdf_path, first_page, first_page + self.pages_per_task
+
+    def _page_records(
+        self, pdf_path: str, page_number: int, text: str
+    ) -> List[Dict[str, any]]:
+        chunks = chunk_text(
+            text, self.chunk_tokens, self.chunk_overlap_tokens, self.token_counter
+        )
+        return [
+            {
+                "id": f"{pdf_path}_page_{page_number}_chunk_{chunk_number}",
+                "text": chunk["text"],
+                "metadata": json.dumps(
+                    {
+                        "source": pdf_path,
+                        "page_number": str(page_number),
+                        "chunk": str(chunk_number),
+                        "start": str(chunk["start"]),
+                        "end": str(chunk["end"]),
+                        "tokens": str(chunk["tokens"]),
+                    }
+                ),
+                "category": "pdf_page",
+            }
+            for chunk_number, chunk in enumerate(chunks)
+        ]
+
+    def _target(self):
+        if self.manifest is None:
+            return self.store
+        return IncrementalStore(self.store, self.manifest)
+
+    @staticmethod
+    def _finish(
+        target,
+        stats: Dict[str, float],
+        complete: bool,
+        source_prefix: Optional[str] = None,
+    ) -> None:
+        if not isinstance(target, IncrementalStore):
+            return
+        if complete:
+            target.delete_missing(source_prefix)
+        stats["skipped"] = target.stats["skipped"]
+        stats["deleted"] = target.stats["deleted"]
+
+    def _start_writers(self, stats: Dict[str, float], store):
+        batches = queue.Queue(maxsize=2 * self.upsert_concurrency)
+        stats_lock = threading.Lock()
+        writers = [
+            threading.Thread(
+                target=self._write_batches,
+                args=(batches, store, stats, stats_lock),
+                daemon=True,
+            )
+            for _ in range(self.upsert_concurrency)
+        ]
+        for writer in writers:
+            writer.start()
+        return batches, writers
+
+    @staticmethod
+    def _stop_writers(batches: queue.Queue, writers: List[threading.Thread]) -> None:
+        for _ in writers:
+            batches.put(None)
+        for writer in writers:
+            writer.join()
+
+    @staticmethod
+    def _write_batches(
+        batches: queue.Queue, store, stats: Dict[str, float], stats_lock: threading.Lock
+    ) -> None:
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            batch, on_commit = item
+            try:
+                store.upsert(batch)
+            except Exception as e:
+                print(f"Error upserting {len(batch)} chunks: {e}")
+                with stats_lock:
+                    stats["failed_batches"] += 1
+                continue
+            with stats_lock:
+                stats["chunks"] += len(batch)
+                stats["batches"] += 1
+            if on_commit is not None:
+                on_commit()
+
+
+# Example usage: python -m backend.vector_search.ingestion <folder or file> [--site-id 7]
+if __name__ == "__main__":
+    from backend.vector_search.vector_store import get_vector_store
+
+    parser = argparse.ArgumentParser(
+        description=(
+            "Ingest a folder of PDFs, a PDF or a text file into the configured vector store."
+        )
+    )
+    parser.add_argument("path", help="Folder of PDFs, a PDF or a text file.")
+    parser.add_argument(
+        "--site-id",
+        type=int,
+        default=None,
+        help="Website whose partition receives the records; defaults to the shared one.",
+    )
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the checkpoint of a text file and ingest it from the start.",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-embed everything instead of only records changed since the last run.",
+    )
+    args = parser.parse_args()
+
+    checkpoint_dir = INGEST_CHECKPOINT_DIR
+    if args.site_id is not None:
+        checkpoint_dir = os.path.join(checkpoint_dir, f"site_{args.site_id}")
+    manifest = None
+    if not args.full:
+        manifest = IngestionManifest(manifest_path(site_id=args.site_id))
+    pipeline = IngestionPipeline(
+        get_vector_store(site_id=args.site_id),
+        workers=args.workers,
+        checkpoint_dir=checkpoint_dir,
+        manifest=manifest,
+    )
+    if os.path.isdir(args.path):
+        stats = pipeline.ingest_folder(args.path)
+    elif args.path.lower().endswith(".pdf"):
+        stats = pipeline.ingest_pdfs([args.path])
+    else:
+        stats = pipeline.ingest_text_file(args.path, resume=not args.restart)
+    print(json.dumps(stats, indent=4))
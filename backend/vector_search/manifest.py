@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional, Set
+
+from dotenv import load_dotenv
+
+from backend.vector_search.vector_store import VECTOR_STORE_BACKEND, site_namespace
+
+load_dotenv()
+INGEST_MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", "data/ingest_manifests")
+# Bump to re-embed everything, e.g. after changing how texts are chunked
+INGEST_PIPELINE_VERSION = os.getenv("INGEST_PIPELINE_VERSION", "1")
+
+
+def content_hash(record: Dict[str, any]) -> str:
+    """Hash of everything that ends up in the index for a record."""
+    payload = json.dumps(
+        [record.get("text"), record.get("metadata"), record.get("category")],
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def record_source(record: Dict[str, any]) -> str:
+    """
+    Source a record was ingested from: the "source" of its metadata, e.g. a PDF path
+    or "questions_and_answers", or "" when it has none.
+    """
+    metadata = record.get("metadata")
+    if isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except ValueError:
+            return ""
+    if isinstance(metadata, dict):
+        return str(metadata.get("source") or "")
+    return ""
+
+
+def manifest_path(backend: Optional[str] = None, site_id: Optional[int] = None) -> str:
+    """
+    Manifest file of a vector store partition.
+
+    Args:
+        backend (str, optional): Vector store backend; defaults to VECTOR_STORE_BACKEND.
+        site_id (int, optional): Website; None for the shared partition.
+
+    Returns:
+        str: e.g. data/ingest_manifests/pinecone_<namespace>.sqlite
+    """
+    backend = (backend or VECTOR_STORE_BACKEND).lower()
+    # The replica backend writes to Pinecone
+    if backend == "replica":
+        backend = "pinecone"
+    return os.path.join(INGEST_MANIFEST_DIR, f"{backend}_{site_namespace(site_id)}.sqlite")
+
+
+class IngestionManifest:
+    """
+    SQLite record of what is in a vector store partition: for every record ID, its
+    source, content hash and the embedding model and pipeline version that produced
+    its vector.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the manifest.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS manifest (
+                record_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS manifest_source ON manifest (source)"
+        )
+        self.connection.commit()
+
+    def changed(
+        self, records: List[Dict[str, any]], model: str
+    ) -> List[Dict[str, any]]:
+        """
+        Return the records that are new or differ from what was last ingested.
+
+        Args:
+            records (List[Dict[str, any]]): Records with "id", "text", "metadata" and "category".
+            model (str): Embedding model and version the records would be embedded with.
+
+        Returns:
+            List[Dict[str, any]]: Records whose content hash or model changed.
+        """
+        known = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(records), 500):
+                chunk = [record["id"] for record in records[start : start + 500]]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT record_id, content_hash, model FROM manifest WHERE record_id IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                known.update({record_id: (digest, m) for record_id, digest, m in rows})
+        return [
+            record
+            for record in records
+            if known.get(record["id"]) != (content_hash(record), model)
+        ]
+
+    def record(self, records: List[Dict[str, any]], model: str) -> None:
+        """
+        Mark records as ingested.
+
+        Args:
+            records (List[Dict[str, any]]): Records that were upserted.
+            model (str): Embedding model and version they were embedded with.
+        """
+        now = time.time()
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?)",
+                [
+                    (record["id"], record_source(record), content_hash(record), model, now)
+                    for record in records
+                ],
+            )
+            self.connection.commit()
+
+    def ids_for_source(self, source: str) -> Set[str]:
+        """Return the IDs of the records ingested from a source."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT record_id FROM manifest WHERE source = ?", (source,)
+            ).fetchall()
+        return {record_id for record_id, in rows}
+
+    def sources(self, prefix: str = "") -> Set[str]:
+        """Return the known sources starting with a prefix, e.g. a folder path."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT DISTINCT source FROM manifest WHERE substr(source, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+        return {source for source, in rows}
+
+    def remove(self, record_ids: List[str]) -> None:
+        """Forget records that were deleted from the store."""
+        with self._lock:
+            self.connection.executemany(
+                "DELETE FROM manifest WHERE record_id = ?",
+                [(record_id,) for record_id in record_ids],
+            )
+            self.connection.commit()
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self.connection.close()
+
+
+class IncrementalStore:
+    """
+    Wraps a vector store so that ingestion only pays for what changed.
+
+    `upsert` skips records whose content and embedding model match the manifest,
+    and `delete_missing` removes the records of re-ingested sources that were not
+    seen again. Usable wherever a store is expected by the ingestion code.
+    """
+
+    def __init__(self, store, manifest: IngestionManifest):
+        """
+        Initialize the wrapper.
+
+        Args:
+            store (VectorStore): Store receiving the changed records.
+            manifest (IngestionManifest): Manifest of the store's partition.
+        """
+        self.store = store
+        self.manifest = manifest
+        self.model = (
+            f"{getattr(store, 'embedding_model', None) or 'unknown'}"
+            f"@{INGEST_PIPELINE_VERSION}"
+        )
+        self.stats = {"seen": 0, "skipped": 0, "upserted": 0, "deleted": 0}
+        self._seen: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, records: List[Dict[str, any]]) -> None:
+        """
+        Upsert the records that are new or changed since the last ingestion.
+
+        Args:
+            records (List[Dict[str, any]]): Records with "id", "text", "metadata" and "category".
+        """
+        with self._lock:
+            for record in records:
+                self._seen.setdefault(record_source(record), set()).add(record["id"])
+            self.stats["seen"] += len(records)
+
+        changed = self.manifest.changed(records, self.model)
+        if changed:
+            self.store.upsert(changed)
+            self.manifest.record(changed, self.model)
+        with self._lock:
+            self.stats["skipped"] += len(records) - len(changed)
+            self.stats["upserted"] += len(changed)
+
+    def delete(self, ids: List[str]) -> None:
+        """Delete records from the store and the manifest."""
+        self.store.delete(ids)
+        self.manifest.remove(ids)
+
+    def delete_missing(self, source_prefix: Optional[str] = None) -> List[str]:
+        """
+        Delete the records of every source seen by `upsert` that were not seen again.
+
+        Only call this after a complete pass over the sources; records that failed to
+        be read would otherwise be deleted too.
+
+        Args:
+            source_prefix (str, optional): Also treat every known source starting with
+                this prefix as re-ingested, so records of removed files are deleted.
+
+        Returns:
+            List[str]: IDs of the deleted records.
+        """
+        sources = set(self._seen)
+        if source_prefix is not None:
+            sources |= self.manifest.sources(source_prefix)
+
+        stale = []
+        for source in sources:
+            seen = self._seen.get(source, set())
+            stale += sorted(self.manifest.ids_for_source(source) - seen)
+        # Pinecone accepts at most 1000 IDs per delete request
+        for start in range(0, len(stale), 1000):
+            self.delete(stale[start : start + 1000])
+        self.stats["deleted"] += len(stale)
+        if stale:
+            print(f"Deleted {len(stale)} records no longer present in their sources.")
+        return stale
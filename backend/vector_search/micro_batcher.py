@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+from typing import Callable, List, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.vector_search.vector_store import VectorStore
+
+load_dotenv()
+# Largest number of queries sent in one batched call
+SEARCH_MICRO_BATCH_SIZE = int(os.getenv("SEARCH_MICRO_BATCH_SIZE", "64"))
+# Longest a query waits for others to join its batch, in milliseconds
+SEARCH_MICRO_BATCH_WAIT_MS = float(os.getenv("SEARCH_MICRO_BATCH_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """
+    Collects items submitted concurrently from many coroutines and processes them
+    with one call of a batch function.
+
+    A batch is sent when `max_batch_size` items are waiting or `max_wait_ms` after
+    its first item arrived, whichever comes first, so an idle server adds at most
+    `max_wait_ms` to a request. Batches run one at a time in a worker thread; items
+    arriving meanwhile form the next batch, so batches grow with the load.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[any]], List[any]],
+        max_batch_size: int = SEARCH_MICRO_BATCH_SIZE,
+        max_wait_ms: float = SEARCH_MICRO_BATCH_WAIT_MS,
+    ):
+        """
+        Initialize the batcher.
+
+        Args:
+            batch_fn (Callable): Blocking function mapping a list of items to a list of
+                results in the same order.
+            max_batch_size (int): Largest number of items per call.
+            max_wait_ms (float): Longest time the first item of a batch waits for more.
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.items = 0
+        self._pending: List[Tuple[any, asyncio.Future]] = []
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+
+    async def submit(self, item) -> any:
+        """
+        Process an item as part of the next batch.
+
+        Args:
+            item: One input of batch_fn.
+
+        Returns:
+            The result of batch_fn for this item; exceptions of batch_fn are re-raised
+            in every caller of the failed batch.
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            # Events and the worker belong to the loop that created them
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        return await future
+
+    def stats(self) -> Dict[str, float]:
+        """Number of batches and items processed so far and the mean batch size."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            if len(self._pending) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+
+            batch = self._pending[: self.max_batch_size]
+            del self._pending[: self.max_batch_size]
+            if len(self._pending) >= self.max_batch_size:
+                self._full.set()
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[Tuple[any, asyncio.Future]]) -> None:
+        # Callers that gave up (e.g. a closed websocket) are dropped from the batch
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        try:
+            results = await asyncio.to_thread(self.batch_fn, [item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"Batch function returned {len(results)} results for {len(batch)} items."
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class SearchMicroBatcher:
+    """
+    Async front end of a VectorStore that merges the queries of concurrent
+    conversations into batch_search calls.
+
+    Each batch embeds all of its queries with one inference call and searches them
+    together, instead of one embedding and one search per conversation turn.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        max_batch_size: int = SEARCH_MICRO_BATCH_SIZE,
+        max_wait_ms: float = SEARCH_MICRO_BATCH_WAIT_MS,
+    ):
+        """
+        Initialize the batcher.
+
+        Args:
+            store (VectorStore): Store whose batch_search serves the queries.
+            max_batch_size (int): Largest number of queries per batch_search call.
+            max_wait_ms (float): Longest time a query waits for others to join it.
+        """
+        self.store = store
+        self.batcher = MicroBatcher(self._search_batch, max_batch_size, max_wait_ms)
+
+    async def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, any]] = None,
+    ) -> List[Dict[str, any]]:
+        """
+        Perform a semantic search as part of the next batch.
+
+        Args:
+            query (str): The query string to search for.
+            top_k (int): The number of top results to retrieve. Defaults to 5.
+            metadata_filter (Dict[str, any], optional): Pinecone-style metadata filter.
+
+        Returns:
+            List[Dict[str, any]]: Results with "id", "score" and "metadata".
+        """
+        if not query or not query.strip():
+            raise ValueError("Query string cannot be empty or None.")
+        return await self.batcher.submit((query, top_k, metadata_filter))
+
+    def stats(self) -> Dict[str, float]:
+        """Batching statistics, see MicroBatcher.stats."""
+        return self.batcher.stats()
+
+    def _search_batch(
+        self, requests: List[Tuple[str, int, Optional[Dict[str, any]]]]
+    ) -> List[List[Dict[str, any]]]:
+        # batch_search takes one top_k and filter, so requests are grouped by both
+        groups: Dict[str, List[int]] = {}
+        for position, (_, top_k, metadata_filter) in enumerate(requests):
+            key = json.dumps([top_k, metadata_filter], sort_keys=True)
+            groups.setdefault(key, []).append(position)
+
+        results = [None] * len(requests)
+        for positions in groups.values():
+            _, top_k, metadata_filter = requests[positions[0]]
+            group_results = self.store.batch_search(
+                [requests[position][0] for position in positions],
+                top_k=top_k,
+                metadata_filter=metadata_filter,
+            )
+            for position, result in zip(positions, group_results):
+                results[position] = result
+        return results
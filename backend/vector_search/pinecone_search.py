@@ -1,13 +1,54 @@
 from pinecone import Pinecone
-from typing import List, Dict
+from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import openai
 from dotenv import load_dotenv
 import os
+import time
+
+from backend.vector_search.bulk_client import BulkUpsertClient
+from backend.vector_search.doc_store import DocStore
+from backend.vector_search.embedding_cache import cached_embed
 
 load_dotenv()
 PINE_API_KEY = os.getenv("PINE_API_KEY")
 PINE_INDEX_NAME = os.getenv("PINE_INDEX_NAME")
+# Local store of the full record metadata (chunk text included), keyed by record ID
+PINECONE_DOC_STORE_PATH = os.getenv("PINECONE_DOC_STORE_PATH", "data/pinecone/docs.sqlite")
+# Store only the filterable fields in Pinecone, leaving the text in the document store.
+# Only enable it when every host reads one shared PINECONE_DOC_STORE_PATH: records
+# written elsewhere would otherwise have no text anywhere this host can read.
+PINECONE_SLIM_METADATA = os.getenv("PINECONE_SLIM_METADATA", "0") == "1"
+# Metadata fields kept in Pinecone for server-side filtering
+PINECONE_FILTER_FIELDS = [
+    field.strip()
+    for field in os.getenv("PINECONE_FILTER_FIELDS", "category").split(",")
+    if field.strip()
+]
+# Maximum number of Pinecone queries in flight for one batch_search call
+PINECONE_QUERY_CONCURRENCY = int(os.getenv("PINECONE_QUERY_CONCURRENCY", "8"))
+
+
+def slim_metadata(metadata: Dict[str, any]) -> Dict[str, any]:
+    """
+    Reduce record metadata to what Pinecone needs for filtering.
+
+    Args:
+        metadata (Dict[str, any]): Full metadata with "chunk_text", "metadata" and "category".
+
+    Returns:
+        Dict[str, any]: The PINECONE_FILTER_FIELDS that are set, or the full metadata
+        when PINECONE_SLIM_METADATA is off.
+    """
+    if not PINECONE_SLIM_METADATA:
+        return metadata
+    return {
+        field: metadata[field]
+        for field in PINECONE_FILTER_FIELDS
+        if metadata.get(field) is not None
+    }
 
 
 class PineconeSearch:
@@ -34,7 +75,11 @@ class PineconeSearch:
         self.index = pinecone.Index(self.index_name)
 
     def search(
-        self, query: str, requires_embedding: bool = False, top_k: int = 5
+        self,
+        query: str,
+        requires_embedding: bool = False,
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, any]] = None,
     ) -> List[Dict[str, any]]:
         """
         Perform a semantic search on Pinecone and retrieve the top-k results.
@@ -43,6 +88,7 @@ class PineconeSearch:
             query (str): The query string to search for.
             requires_embedding (bool): Whether to generate an embedding for the query.
             top_k (int): The number of top results to retrieve. Defaults to 5.
+            metadata_filter (Dict[str, any], optional): Metadata filter applied to the semantic search.
 
         Returns:
             List[Dict[str, any]]: A list of dictionaries containing the search results.
@@ -55,18 +101,26 @@ class PineconeSearch:
             # Optionally generate an embedding for the query
             query_embedding = None
             if requires_embedding:
-                query_embedding = self.pinecone.inference.embed(
-                    model="llama-text-embed-v2",
-                    inputs=[query],
-                    parameters={"input_type": "query"},
+                query_embedding = cached_embed(
+                    "llama-text-embed-v2/query",
+                    [query],
+                    lambda inputs: [
+                        embedding["values"]
+                        for embedding in self.pinecone.inference.embed(
+                            model="llama-text-embed-v2",
+                            inputs=inputs,
+                            parameters={"input_type": "query"},
+                        )
+                    ],
                 )
-                if not query_embedding:
+                if query_embedding is None or not len(query_embedding):
                     raise ValueError("Failed to generate embedding for the query.")
 
                 # Perform semantic search using the embedding
                 results = self.index.query(
                     namespace=os.getenv("PINE_INDEX_NAME"),
-                    vector=query_embedding[0].values,
+                    vector=query_embedding[0].tolist(),
+                    filter=metadata_filter,
                     top_k=top_k,
                     include_metadata=True,
                 )
@@ -202,6 +256,327 @@ class PineconeSearch:
             return None
 
 
+class PineconeVectorStore:
+    """
+    VectorStore implementation backed by a Pinecone index, embedding texts with
+    Pinecone's hosted `llama-text-embed-v2` model.
+
+    The full metadata, chunk text included, is written to a local DocStore at upsert
+    time; queries return IDs and scores only, and `hydrate` reads the text of the
+    final results from the local store. Records missing locally (written before the
+    store existed, or by another host) are fetched from Pinecone once and cached.
+    Pinecone keeps the full metadata too, unless PINECONE_SLIM_METADATA reduces it
+    to the filterable fields.
+    """
+
+    # Hosted model embedding records and queries
+    embedding_model = "llama-text-embed-v2"
+    # Maximum number of inputs per Pinecone inference request
+    embed_batch_size = 90
+
+    def __init__(
+        self,
+        api_key: str,
+        index_name: str,
+        query_concurrency: int = PINECONE_QUERY_CONCURRENCY,
+        namespace: Optional[str] = None,
+        doc_store_path: str = PINECONE_DOC_STORE_PATH,
+    ):
+        """
+        Initialize the Pinecone vector store.
+
+        Args:
+            api_key (str): Pinecone API key.
+            index_name (str): Name of the Pinecone index.
+            query_concurrency (int): Maximum number of concurrent queries in batch_search.
+            namespace (str, optional): Namespace holding the records, e.g. one per
+                website (see site_namespace). Defaults to the shared PINE_INDEX_NAME namespace.
+            doc_store_path (str): Path of the local document store holding the record text.
+        """
+        self.searcher = PineconeSearch(api_key=api_key, index_name=index_name)
+        self.pinecone = self.searcher.pinecone
+        self.index = self.searcher.index
+        self.namespace = namespace or PINE_INDEX_NAME
+        self.doc_store = DocStore(doc_store_path)
+        self.query_concurrency = query_concurrency
+        # Seconds from the start of the last batch_search until each query's results were ready
+        self.last_batch_latencies: List[float] = []
+        self.bulk_client = BulkUpsertClient(
+            self._embed_passages,
+            self._write_vectors,
+            cache_model=f"{self.embedding_model}/passage",
+        )
+
+    def upsert(self, records: List[Dict[str, any]]) -> None:
+        """
+        Embed and upsert records into Pinecone.
+
+        Requests are sized, rate-limited and retried by BulkUpsertClient.
+
+        Args:
+            records (List[Dict[str, any]]): Records with "id", "text", "metadata" and "category".
+
+        Raises:
+            BulkUpsertError: If some records could not be written; the others were.
+        """
+        self.bulk_client.upsert(records)
+
+    def _embed_passages(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.pinecone.inference.embed(
+            model=self.embedding_model,
+            inputs=texts,
+            parameters={"input_type": "passage"},
+        )
+        return [embedding["values"] for embedding in embeddings]
+
+    def _write_vectors(
+        self, records: List[Dict[str, any]], embeddings: List[List[float]]
+    ) -> None:
+        documents = [
+            {
+                "id": record["id"],
+                "metadata": {
+                    "chunk_text": record["text"],
+                    "metadata": record.get("metadata"),
+                    "category": record.get("category"),
+                },
+            }
+            for record in records
+        ]
+        vectors = [
+            {
+                "id": document["id"],
+                "values": embedding,
+                "metadata": slim_metadata(document["metadata"]),
+            }
+            for document, embedding in zip(documents, embeddings)
+        ]
+        # Local text first, so a record is never searchable without its text
+        self.doc_store.put_records(documents)
+        self.index.upsert(vectors=vectors, namespace=self.namespace)
+        print(f"Upserted {len(vectors)} records into Pinecone.")
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query with the same model used for the stored passages.
+
+        Args:
+            query (str): The query string to embed.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several queries with as few inference requests as possible.
+
+        Args:
+            queries (List[str]): The query strings to embed.
+
+        Returns:
+            List[List[float]]: One embedding per query, in input order.
+        """
+        return self.embed_texts(queries, "query").tolist()
+
+    def embed_texts(self, texts: List[str], input_type: str) -> np.ndarray:
+        """
+        Embed texts with the hosted model, skipping the ones in the embedding cache.
+
+        Args:
+            texts (List[str]): Texts to embed.
+            input_type (str): "passage" for stored records, "query" for queries.
+
+        Returns:
+            np.ndarray: float32 embeddings of shape (len(texts), dim), in input order.
+        """
+
+        def embed(inputs: List[str]) -> List[List[float]]:
+            vectors = []
+            for start in range(0, len(inputs), self.embed_batch_size):
+                embeddings = self.pinecone.inference.embed(
+                    model=self.embedding_model,
+                    inputs=inputs[start : start + self.embed_batch_size],
+                    parameters={"input_type": input_type},
+                )
+                vectors.extend(embedding["values"] for embedding in embeddings)
+            return vectors
+
+        return cached_embed(f"{self.embedding_model}/{input_type}", texts, embed)
+
+    def delete(self, ids: List[str]) -> None:
+        """
+        Delete records from Pinecone.
+
+        Args:
+            ids (List[str]): Record IDs to delete.
+        """
+        self.index.delete(ids=ids, namespace=self.namespace)
+        self.doc_store.delete(ids)
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, any]]:
+        """
+        Perform a semantic search and retrieve the top-k results.
+
+        Args:
+            query (str): The query string to search for.
+            top_k (int): The number of top results to retrieve. Defaults to 5.
+
+        Returns:
+            List[Dict[str, any]]: Results with "id", "score" and "metadata".
+        """
+        return self.filter(query, None, top_k=top_k)
+
+    def batch_search(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, any]] = None,
+    ) -> List[List[Dict[str, any]]]:
+        """
+        Search several queries, returning results in input order.
+
+        All queries are embedded in batched inference requests, then queried
+        concurrently with at most `query_concurrency` requests in flight. Per-query
+        latencies are kept in `last_batch_latencies`.
+
+        Args:
+            queries (List[str]): Query strings.
+            top_k (int): The number of top results per query. Defaults to 5.
+            metadata_filter (Dict[str, any], optional): Pinecone metadata filter applied to every query.
+
+        Returns:
+            List[List[Dict[str, any]]]: One result list per query.
+        """
+        if any(not query or not query.strip() for query in queries):
+            raise ValueError("Query strings cannot be empty or None.")
+        if not queries:
+            self.last_batch_latencies = []
+            return []
+
+        start = time.perf_counter()
+        vectors = self.embed_queries(queries)
+
+        def query_one(vector):
+            results = self.query_vector(
+                vector, top_k=top_k, metadata_filter=metadata_filter, hydrate=False
+            )
+            return results, time.perf_counter() - start
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.query_concurrency, len(queries))
+        ) as executor:
+            # map preserves input order regardless of completion order
+            outcomes = list(executor.map(query_one, vectors))
+
+        # One local lookup for the text of the whole batch
+        self.hydrate([result for results, _ in outcomes for result in results])
+        hydrated_at = time.perf_counter() - start
+        self.last_batch_latencies = [max(latency, hydrated_at) for _, latency in outcomes]
+        return [results for results, _ in outcomes]
+
+    def query_vector(
+        self,
+        vector: List[float],
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, any]] = None,
+        hydrate: bool = True,
+    ) -> List[Dict[str, any]]:
+        """
+        Query Pinecone with a precomputed embedding.
+
+        Only IDs and scores come back from Pinecone; the metadata is read locally.
+
+        Args:
+            vector (List[float]): Query embedding from embed_query or embed_queries.
+            top_k (int): The number of top results to retrieve. Defaults to 5.
+            metadata_filter (Dict[str, any], optional): Pinecone metadata filter.
+            hydrate (bool): Fill in "metadata" now; otherwise it is None until `hydrate`.
+
+        Returns:
+            List[Dict[str, any]]: Results with "id", "score" and "metadata".
+        """
+        try:
+            results = self.index.query(
+                namespace=self.namespace,
+                vector=vector,
+                filter=metadata_filter,
+                top_k=top_k,
+                include_metadata=False,
+            )
+        except Exception as e:
+            print(f"Error during Pinecone search: {e}")
+            return []
+        matches = [
+            {"id": match["id"], "score": match["score"], "metadata": None}
+            for match in results["matches"]
+        ]
+        return self.hydrate(matches) if hydrate else matches
+
+    def hydrate(self, results: List[Dict[str, any]]) -> List[Dict[str, any]]:
+        """
+        Fill in the full metadata of search results from the local document store.
+
+        Records missing locally (upserted before the store existed, or by another
+        host) are fetched from Pinecone once and cached.
+
+        Args:
+            results (List[Dict[str, any]]): Results with "id"; updated in place.
+
+        Returns:
+            List[Dict[str, any]]: The same results.
+        """
+        if not results:
+            return results
+        record_ids = list({result["id"] for result in results})
+        documents = self.doc_store.get_by_record_ids(record_ids)
+
+        missing = [record_id for record_id in record_ids if record_id not in documents]
+        if missing:
+            try:
+                fetched = self.index.fetch(ids=missing, namespace=self.namespace).vectors
+            except Exception as e:
+                print(f"Error fetching metadata from Pinecone: {e}")
+                fetched = {}
+            backfill = [
+                {"id": record_id, "metadata": dict(vector.metadata or {})}
+                for record_id, vector in fetched.items()
+            ]
+            documents.update({record["id"]: record["metadata"] for record in backfill})
+            # Only full copies are worth caching; slim ones would hide the text forever
+            self.doc_store.put_records(
+                [record for record in backfill if "chunk_text" in record["metadata"]]
+            )
+
+        for result in results:
+            result["metadata"] = documents.get(result["id"], result.get("metadata"))
+        return results
+
+    def filter(
+        self, query: str, metadata_filter: Optional[Dict[str, any]], top_k: int = 5
+    ) -> List[Dict[str, any]]:
+        """
+        Search this store's namespace among the records whose metadata matches a filter.
+
+        Args:
+            query (str): The query string to search for.
+            metadata_filter (Dict[str, any], optional): Pinecone metadata filter, e.g. {"category": "qa"}.
+            top_k (int): The number of top results to retrieve. Defaults to 5.
+
+        Returns:
+            List[Dict[str, any]]: Matching results with "id", "score" and "metadata".
+        """
+        if not query or not query.strip():
+            raise ValueError("Query string cannot be empty or None.")
+        try:
+            vector = self.embed_query(query)
+        except Exception as e:
+            print(f"Error embedding query for Pinecone search: {e}")
+            return []
+        return self.query_vector(vector, top_k=top_k, metadata_filter=metadata_filter)
+
+
 from pinecone import Pinecone
 import time
 from pinecone import ServerlessSpec
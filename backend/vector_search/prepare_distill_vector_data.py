@@ -17,11 +17,14 @@ from typing import Optional, Dict
 from fastapi import WebSocket
 import psycopg2
 
+from backend.agents.prompt_templates import get_prompt_template
 from backend.agents.pydantic_agents import basic_communication_agent
 from backend.vector_search import PineconeSearch
+from backend.vector_search.distillation import DistillationRunner, qa_record
 import os
 import json
 import asyncio
+import functools
 from enum import Enum
 
 
@@ -37,11 +40,8 @@ PINE_API_KEY = os.getenv("PINE_API_KEY")
 PINE_INDEX_NAME = os.getenv("PINE_INDEX_NAME")
 
 
-async def chatbot_node(prompt: str, state: Dict) -> Dict:
-    """Handles chatbot responses using pydantic_ai LLM."""
-    user_prompt = prompt
-
-    system_prompt = """Above all else, obey this rule: KEEP YOUR RESPONSES TO 50 CHARACTERS MAXIMUM. THE SHORTER AND MORE HUMAN-LIKE YOUR RESPONSE, THE BETTER.
+# Persona of the distillation agent for websites without a prompt_template
+SOPHIE_SYSTEM_PROMPT = """Above all else, obey this rule: KEEP YOUR RESPONSES TO 50 CHARACTERS MAXIMUM. THE SHORTER AND MORE HUMAN-LIKE YOUR RESPONSE, THE BETTER.
 
 ##PERSONA:
 
@@ -128,7 +128,15 @@ When interacting with users:
 Use History for context regarding past user interactions.
 
 At all times, keep interactions polite, concise, and focused on providing value to the user. Keep answers short, to the point and conversational, keeping within 10 words per response for most questions, and upto 30 words when explaining anything
-            """
+"""
+
+
+async def chatbot_node(prompt: str, state: Dict, site_id: Optional[int] = None) -> Dict:
+    """Handles chatbot responses using pydantic_ai LLM."""
+    user_prompt = prompt
+
+    # The website's own persona, compiled once and cached
+    system_prompt = get_prompt_template(site_id, SOPHIE_SYSTEM_PROMPT).system_prompt
 
     History = state.get("messages", [])
 
@@ -148,51 +156,45 @@ import json
 import asyncio
 
 
-async def process_questions(input_file: str, output_file: str):
-    """
-    Reads questions from a file, sends them to the chatbot_node, and stores the questions and answers in a JSON file.
-
-    Args:
-        input_file (str): Path to the file containing questions (one question per line).
-        output_file (str): Path to the JSON file where questions and answers will be stored.
-    """
-    # Read questions from the input file
-    with open(input_file, "r") as file:
-        questions = file.readlines()
-
+async def answer_question(question: str, site_id: Optional[int] = None) -> str:
+    """Answers a single question with chatbot_node, without conversation history."""
     # Initialize state for the chatbot
     state = {
         "messages": [],
         "context": None,
     }
+    response = await chatbot_node(prompt=question, state=state, site_id=site_id)
+    return response.data
 
-    # Initialize a list to store the results
-    results = []
-
-    # Process each question
-    for question in questions:
-        question = question.strip()  # Remove any leading/trailing whitespace
-        if not question:
-            continue  # Skip empty lines
 
-        print(f"Asking question: {question}")
-
-        # Call the chatbot_node function
-        response = await chatbot_node(prompt=question, state=state)
-
-        # Append the question and answer to the results list
-        results.append({"question": question, "answer": response})
+async def process_questions(
+    input_file: str,
+    output_file: str,
+    vector_store=None,
+    resume: bool = True,
+    site_id: Optional[int] = None,
+) -> Dict[str, float]:
+    """
+    Reads questions from a file, sends them to the chatbot_node, and stores the questions and answers in a JSON file.
 
-        # # Update the state with the latest question and answer
-        # state["messages"].append(
-        #     {"role": "user", "content": question, "answer": response}
-        # )
+    Questions are answered concurrently and checkpointed as they finish, so an
+    interrupted run resumes where it stopped (see DistillationRunner).
 
-    # Save the results to the JSON file
-    with open(output_file, "w") as json_file:
-        json.dump(results, json_file, indent=4)
+    Args:
+        input_file (str): Path to the file containing questions (one question per line).
+        output_file (str): Path to the JSON file where questions and answers will be stored.
+        vector_store (VectorStore, optional): Store the answered pairs are upserted
+            into while distillation runs.
+        resume (bool): Continue from the checkpoint of an interrupted run.
+        site_id (int, optional): Website whose prompt_template answers the questions.
 
-    print(f"Questions and answers saved to {output_file}")
+    Returns:
+        Dict[str, float]: Distillation statistics, see DistillationRunner.run.
+    """
+    runner = DistillationRunner(
+        functools.partial(answer_question, site_id=site_id), store=vector_store
+    )
+    return await runner.run_file(input_file, output_file, resume=resume)
 
 
 # # Example usage
@@ -205,7 +207,14 @@ async def process_questions(input_file: str, output_file: str):
 
 import json
 from typing import Dict
-from data_upsert import PineconeDataImporter
+from backend.vector_search.data_upsert import PineconeDataImporter
+from backend.vector_search.readers import iter_json_records
+from backend.vector_search.vector_store import VectorStore, get_vector_store
+from backend.vector_search.manifest import (
+    IncrementalStore,
+    IngestionManifest,
+    manifest_path,
+)
 
 
 def upsert_questions_and_answers(
@@ -215,15 +224,14 @@ def upsert_questions_and_answers(
     Reads a JSON file with questions and answers and upserts the data into Pinecone.
 
     Args:
-        json_file (str): Path to the JSON file containing questions and answers.
+        json_file (str): Path to the JSON (array or JSONL) file containing questions and answers.
         pinecone_importer (PineconeDataImporter): An instance of PineconeDataImporter to upsert data.
     """
-    # Read the JSON file
-    with open(json_file, "r") as file:
-        data = json.load(file)
-
-    # Iterate through each question-answer pair and upsert into Pinecone
-    for idx, item in enumerate(data, start=1):
+    # Iterate through each question-answer pair, read lazily, and upsert into Pinecone
+    for idx, item in iter_json_records(json_file, start=1):
+        if not isinstance(item, dict):
+            print(f"Skipping entry {idx} as it is not an object.")
+            continue
         question = item.get("question", "").strip()
         answer = item.get("answer", "").strip()
 
@@ -250,24 +258,33 @@ def upsert_questions_and_answers(
 
 
 def upsert_questions_and_answers_v2(
-    json_file: str, pinecone_importer: PineconeDataImporter
+    json_file: str,
+    vector_store: VectorStore,
+    manifest: Optional[IngestionManifest] = None,
 ):
     """
-    Reads a JSON file with questions and answers and upserts the data into Pinecone.
+    Reads a JSON file with questions and answers and upserts the data into the vector store.
+
+    The file is read lazily, so memory use does not grow with its size.
 
     Args:
-        json_file (str): Path to the JSON file containing questions and answers.
-        pinecone_importer (PineconeDataImporter): An instance of PineconeDataImporter to upsert data.
+        json_file (str): Path to the JSON (array or JSONL) file containing questions and answers.
+        vector_store (VectorStore): The configured vector store (Pinecone or FAISS).
+        manifest (IngestionManifest, optional): Only embed pairs that are new or changed
+            since the last run, and delete the pairs that were removed from the file.
     """
-    # Read the JSON file
-    with open(json_file, "r") as file:
-        data = json.load(file)
+    if manifest is not None:
+        vector_store = IncrementalStore(vector_store, manifest)
 
     data_as_input = []
 
-    # Iterate through each question-answer pair and upsert into Pinecone
-    batch_size = 90
-    for idx, item in enumerate(data, start=1):
+    # Iterate through each question-answer pair and upsert into the vector store;
+    # the store's bulk client splits each call into requests within provider limits
+    batch_size = 1000
+    for idx, item in iter_json_records(json_file, start=1):
+        if not isinstance(item, dict):
+            print(f"Skipping entry {idx} as it is not an object.")
+            continue
         question = item.get("question", "").strip()
         answer = item.get("answer", "").strip()
 
@@ -275,36 +292,18 @@ def upsert_questions_and_answers_v2(
             print(f"Skipping entry {idx} due to missing question or answer.")
             continue
 
-        combined_text = f"Q: {question}\nA: {answer}"
-        metadata = {"source": "questions_and_answers", "entry_id": str(idx)}
-
-        data_as_input.append(
-            {
-                "id": f"qa_{idx}",
-                "values": combined_text,
-                "metadata": json.dumps(metadata),  # Convert metadata to a JSON string
-                "category": "qa",
-            }
-        )
+        data_as_input.append(qa_record(idx, question, answer))
 
         if len(data_as_input) == batch_size:
-            pinecone_importer.upsert_all_rows(
-                record_id=[d["id"] for d in data_as_input],
-                list_of_text=[d["values"] for d in data_as_input],
-                metadata_list=[d["metadata"] for d in data_as_input],
-                category="qa",
-                embedding_required=True,
-            )
-            data_as_input.clear()
+            vector_store.upsert(data_as_input)
+            data_as_input = []
 
     if data_as_input:
-        pinecone_importer.upsert_all_rows(
-            record_id=[d["id"] for d in data_as_input],
-            list_of_text=[d["values"] for d in data_as_input],
-            metadata_list=[d["metadata"] for d in data_as_input],
-            category="qa",
-            embedding_required=True,
-        )
+        vector_store.upsert(data_as_input)
+
+    if manifest is not None:
+        vector_store.delete_missing()
+        print(f"Q&A ingestion: {vector_store.stats}")
 
 
 # Example usage
@@ -312,20 +311,18 @@ if __name__ == "__main__":
     from dotenv import load_dotenv
     import os
 
-    load_dotenv()
+    import sys
 
-    # Load Pinecone credentials
-    api_key = os.getenv("PINE_API_KEY")
-    index_name = os.getenv("PINE_INDEX_NAME")
+    load_dotenv()
 
-    # Initialize the PineconeDataImporter
-    importer = PineconeDataImporter(
-        api_key=api_key,
-        index_name=index_name,
-    )
+    # Pinecone or FAISS, selected by the VECTOR_STORE_BACKEND environment variable,
+    # writing to the partition of the website given as first argument (default: shared)
+    site_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    vector_store = get_vector_store(site_id=site_id)
 
     # Path to the JSON file with questions and answers
     json_file_path = "/home/saqib/visual_agentic_ai/backend/vector_search/data/pregnancy_questions_and_answers.json"
 
-    # Call the function to upsert data
-    upsert_questions_and_answers_v2(json_file_path, importer)
+    # Call the function to upsert data, re-embedding only the pairs that changed
+    manifest = IngestionManifest(manifest_path(site_id=site_id))
+    upsert_questions_and_answers_v2(json_file_path, vector_store, manifest)
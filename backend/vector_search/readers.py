@@ -0,0 +1,197 @@
+import json
+import os
+import re
+from typing import Callable, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# Bytes read from disk at a time; memory use is this plus the largest single record
+READER_CHUNK_BYTES = int(os.getenv("READER_CHUNK_BYTES", str(1024 * 1024)))
+
+# Bytes that can change the nesting or string state of a JSON document
+_STRUCTURAL = re.compile(rb'[\[\]{}",\\]')
+_WHITESPACE = b" \t\r\n"
+_BOM = b"\xef\xbb\xbf"
+
+
+def report_malformed(offset: int, error: str) -> None:
+    """Default error handler of the readers: print the record's byte offset and error."""
+    print(f"Skipping malformed record at byte {offset}: {error}")
+
+
+def iter_json_records(
+    path: str,
+    start: int = 0,
+    on_error: Optional[Callable[[int, str], None]] = None,
+    chunk_size: int = READER_CHUNK_BYTES,
+) -> Iterator[Tuple[int, any]]:
+    """
+    Lazily read the records of a JSON array file or a JSONL file.
+
+    The format is detected from the first non-blank byte: "[" starts a JSON array,
+    anything else is read as one JSON value per line.
+
+    Args:
+        path (str): Path to the file.
+        start (int): Index of the first record, as for enumerate.
+        on_error (Callable, optional): Called with the byte offset and error of every
+            malformed record, which is skipped but still counted in the indices.
+            Defaults to report_malformed.
+        chunk_size (int): Bytes read at a time.
+
+    Yields:
+        Tuple[int, any]: The index and the decoded value of each well-formed record,
+        in file order.
+    """
+    with open(path, "rb") as file:
+        head = file.read(64 * 1024).lstrip(_BOM + _WHITESPACE)
+    if head.startswith(b"["):
+        return iter_json_array(path, start, on_error, chunk_size)
+    return iter_jsonl(path, start, on_error)
+
+
+def iter_jsonl(
+    path: str,
+    start: int = 0,
+    on_error: Optional[Callable[[int, str], None]] = None,
+) -> Iterator[Tuple[int, any]]:
+    """
+    Lazily read a JSONL file, one JSON value per non-blank line.
+
+    Args:
+        path (str): Path to the file.
+        start (int): Index of the first record, as for enumerate.
+        on_error (Callable, optional): Called with the byte offset and error of every
+            malformed line; defaults to report_malformed.
+
+    Yields:
+        Tuple[int, any]: The index and the decoded value of each well-formed line.
+    """
+    on_error = on_error or report_malformed
+    index, offset = start, 0
+    with open(path, "rb") as file:
+        for line_number, line in enumerate(file, start=1):
+            text = line.strip(_BOM + _WHITESPACE) if offset == 0 else line.strip()
+            if text:
+                try:
+                    yield index, json.loads(text)
+                except ValueError as e:
+                    on_error(offset, f"line {line_number}: {e}")
+                index += 1
+            offset += len(line)
+
+
+def iter_json_array(
+    path: str,
+    start: int = 0,
+    on_error: Optional[Callable[[int, str], None]] = None,
+    chunk_size: int = READER_CHUNK_BYTES,
+) -> Iterator[Tuple[int, any]]:
+    """
+    Lazily read the elements of a file holding one JSON array.
+
+    The file is scanned in chunks for element boundaries, tracking nesting and
+    strings, and each element is decoded on its own. A malformed element is
+    reported and skipped; reading resumes at the next top-level comma.
+
+    Args:
+        path (str): Path to the file.
+        start (int): Index of the first element, as for enumerate.
+        on_error (Callable, optional): Called with the byte offset and error of every
+            malformed element; defaults to report_malformed.
+        chunk_size (int): Bytes read at a time.
+
+    Yields:
+        Tuple[int, any]: The index and the decoded value of each well-formed element.
+
+    Raises:
+        ValueError: If the file does not start with a JSON array.
+    """
+    on_error = on_error or report_malformed
+    index = start
+    depth, in_string, escaped = 0, False, False
+    # Bytes of the current element read in earlier chunks, and where it started
+    element, element_start = bytearray(), 0
+    offset = 0
+
+    def decode(data: bytes, data_offset: int, closing: bool):
+        nonlocal index
+        text = data.lstrip(_WHITESPACE)
+        data_offset += len(data) - len(text)
+        text = text.rstrip(_WHITESPACE)
+        if not text:
+            # "[]" and a trailing comma hold no element
+            if not closing:
+                on_error(data_offset, "empty element")
+                index += 1
+            return None
+        try:
+            value = json.loads(text)
+        except ValueError as e:
+            on_error(data_offset, str(e))
+            index += 1
+            return None
+        index += 1
+        return index - 1, value
+
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            if offset == 0:
+                stripped = chunk.lstrip(_BOM + _WHITESPACE)
+                if not stripped.startswith(b"["):
+                    raise ValueError(f"{path} does not contain a JSON array.")
+
+            position, segment_start = 0, 0
+            if escaped:
+                # The escaped byte opens this chunk
+                position, escaped = 1, False
+            while True:
+                match = _STRUCTURAL.search(chunk, position)
+                if match is None:
+                    break
+                i = match.start()
+                byte = chunk[i : i + 1]
+                position = i + 1
+                if in_string:
+                    if byte == b"\\":
+                        if i + 1 < len(chunk):
+                            position = i + 2
+                        else:
+                            escaped = True
+                    elif byte == b'"':
+                        in_string = False
+                    continue
+
+                if byte == b'"':
+                    in_string = True
+                elif byte in b"[{":
+                    depth += 1
+                    if depth == 1:
+                        segment_start, element_start = i + 1, offset + i + 1
+                elif byte in b"]}":
+                    depth -= 1
+                    if depth == 0:
+                        data = bytes(element) + chunk[segment_start:i]
+                        result = decode(data, element_start, closing=True)
+                        if result is not None:
+                            yield result
+                        return
+                elif byte == b"," and depth == 1:
+                    data = bytes(element) + chunk[segment_start:i]
+                    result = decode(data, element_start, closing=False)
+                    if result is not None:
+                        yield result
+                    element = bytearray()
+                    segment_start, element_start = i + 1, offset + i + 1
+
+            if depth >= 1:
+                element += chunk[segment_start:]
+            offset += len(chunk)
+
+    # The array was never closed, e.g. a file cut short by a crash
+    if element.strip(_WHITESPACE):
+        on_error(element_start, "unexpected end of file")
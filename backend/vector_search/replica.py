@@ -0,0 +1,400 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import List, Dict, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from backend.vector_search.faiss_search import FaissVectorStore
+from backend.vector_search.pinecone_search import (
+    PINECONE_DOC_STORE_PATH,
+    PineconeVectorStore,
+)
+from backend.vector_search.vector_store import site_namespace, site_path
+
+load_dotenv()
+PINECONE_REPLICA_INDEX_PATH = os.getenv(
+    "PINECONE_REPLICA_INDEX_PATH", "data/pinecone_replica/index.faiss"
+)
+PINECONE_REPLICA_DOC_STORE_PATH = os.getenv(
+    "PINECONE_REPLICA_DOC_STORE_PATH", f"{PINECONE_REPLICA_INDEX_PATH}.docs.sqlite"
+)
+# llama-text-embed-v2 produces 1024-d vectors
+PINECONE_REPLICA_DIM = int(os.getenv("PINECONE_REPLICA_DIM", "1024"))
+PINECONE_REPLICA_INDEX_TYPE = os.getenv("PINECONE_REPLICA_INDEX_TYPE", "flat")
+# Compression of the mirrored vectors, see build_index
+PINECONE_REPLICA_QUANTIZATION = os.getenv("PINECONE_REPLICA_QUANTIZATION", "none")
+# llama-text-embed-v2 is Matryoshka-trained, so its leading dimensions can be kept as-is
+PINECONE_REPLICA_REDUCED_DIM = int(os.getenv("PINECONE_REPLICA_REDUCED_DIM", "0"))
+PINECONE_REPLICA_RERANK_K_FACTOR = int(os.getenv("PINECONE_REPLICA_RERANK_K_FACTOR", "0"))
+# Seconds after the last successful sync before queries fall back to Pinecone
+PINECONE_REPLICA_MAX_STALENESS = float(
+    os.getenv("PINECONE_REPLICA_MAX_STALENESS", "3600")
+)
+# Only mirror records whose IDs start with this prefix ("" mirrors the whole namespace)
+PINECONE_REPLICA_PREFIX = os.getenv("PINECONE_REPLICA_PREFIX", "")
+# Categories of the records a PINECONE_REPLICA_PREFIX mirrors, e.g. "qa" for "qa_".
+# With a prefix, only queries filtered to these categories are served by the replica;
+# all others go to Pinecone, which holds the records the replica lacks.
+PINECONE_REPLICA_CATEGORIES = [
+    category.strip()
+    for category in os.getenv("PINECONE_REPLICA_CATEGORIES", "").split(",")
+    if category.strip()
+]
+
+LAST_SYNCED_AT_KEY = "last_synced_at"
+
+
+def metadata_hash(metadata: Dict[str, any]) -> str:
+    """Stable hash of a record's metadata, used to detect changed records."""
+    payload = json.dumps(metadata, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def normalize(vectors) -> np.ndarray:
+    """L2-normalize vectors so inner product on the replica equals Pinecone's cosine score."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def open_replica(site_id: Optional[int] = None) -> FaissVectorStore:
+    """Open the local FAISS mirror of a website's Pinecone namespace (None for the shared one)."""
+    return FaissVectorStore(
+        index_path=site_path(PINECONE_REPLICA_INDEX_PATH, site_id),
+        doc_store_path=site_path(PINECONE_REPLICA_DOC_STORE_PATH, site_id),
+        dim=PINECONE_REPLICA_DIM,
+        model_name=None,
+        index_type=PINECONE_REPLICA_INDEX_TYPE,
+        quantization=PINECONE_REPLICA_QUANTIZATION,
+        reduced_dim=PINECONE_REPLICA_REDUCED_DIM,
+        dim_reduction="truncate",
+        rerank_k_factor=PINECONE_REPLICA_RERANK_K_FACTOR,
+    )
+
+
+class PineconeReplicaSync:
+    """
+    Mirrors a Pinecone namespace (IDs, vectors and metadata) into a local FAISS index
+    and document store.
+    """
+
+    # Maximum number of IDs per Pinecone fetch request
+    fetch_batch_size = 100
+    # Vectors fetched to train IVF, PQ or SQ8 replicas before the first sync
+    train_sample_size = 10000
+
+    def __init__(
+        self,
+        pinecone_store: PineconeVectorStore,
+        replica: FaissVectorStore,
+        prefix: str = PINECONE_REPLICA_PREFIX,
+    ):
+        """
+        Initialize the sync job.
+
+        Args:
+            pinecone_store (PineconeVectorStore): The Pinecone source of truth.
+            replica (FaissVectorStore): The local mirror to keep up to date.
+            prefix (str): Only mirror records whose IDs start with this prefix.
+        """
+        self.pinecone_store = pinecone_store
+        self.replica = replica
+        self.prefix = prefix
+
+    def sync(self, compare_metadata: bool = True) -> Dict[str, int]:
+        """
+        Bring the replica up to date with Pinecone.
+
+        New IDs are fetched and added, IDs missing from Pinecone are removed, and with
+        `compare_metadata` the remaining records are re-fetched and replaced only when
+        their metadata hash differs from the local copy.
+
+        Args:
+            compare_metadata (bool): Whether to check existing records for changes.
+                Without it only the ID sets are compared, which is much cheaper.
+
+        Returns:
+            Dict[str, int]: Number of records added, updated and removed.
+        """
+        remote_ids = self._list_remote_ids()
+        remote_id_set = set(remote_ids)
+        local = {
+            record_id: (faiss_id, metadata)
+            for faiss_id, record_id, metadata in self.replica.doc_store.iter_metadata()
+        }
+
+        removed = [record_id for record_id in local if record_id not in remote_id_set]
+        candidates = [record_id for record_id in remote_ids if record_id not in local]
+        if compare_metadata:
+            candidates += [record_id for record_id in remote_ids if record_id in local]
+
+        if not self.replica.faiss_search.is_trained:
+            self._train(candidates)
+
+        added, updated = 0, 0
+        for start in range(0, len(candidates), self.fetch_batch_size):
+            batch = candidates[start : start + self.fetch_batch_size]
+            fetched = self.pinecone_store.index.fetch(
+                ids=batch, namespace=self.pinecone_store.namespace
+            ).vectors
+
+            records, vectors = [], []
+            for record_id, vector in fetched.items():
+                metadata = vector.metadata or {}
+                if record_id in local:
+                    _, local_metadata = local[record_id]
+                    if metadata_hash(local_metadata) == metadata_hash(metadata):
+                        continue
+                    updated += 1
+                else:
+                    added += 1
+                records.append({"id": record_id, "metadata": metadata})
+                vectors.append(vector.values)
+
+            # Upserts replace the stale vectors of updated records
+            if records:
+                self.replica.upsert_embeddings(records, normalize(vectors))
+
+        if removed:
+            self.replica.delete(removed)
+
+        self.replica.doc_store.set_state(LAST_SYNCED_AT_KEY, str(time.time()))
+        summary = {"added": added, "updated": updated, "removed": len(removed)}
+        print(f"Replica sync finished: {summary}")
+        return summary
+
+    def run_forever(self, interval: float, full_sync_every: int = 24) -> None:
+        """
+        Sync periodically.
+
+        Args:
+            interval (float): Seconds between syncs.
+            full_sync_every (int): Compare metadata on every n-th sync; the others
+                only compare ID sets.
+        """
+        iteration = 0
+        while True:
+            try:
+                self.sync(compare_metadata=iteration % full_sync_every == 0)
+            except Exception as e:
+                print(f"Error during replica sync: {e}")
+            iteration += 1
+            time.sleep(interval)
+
+    def _train(self, record_ids: List[str]) -> None:
+        sample = []
+        limit = min(len(record_ids), self.train_sample_size)
+        for start in range(0, limit, self.fetch_batch_size):
+            fetched = self.pinecone_store.index.fetch(
+                ids=record_ids[start : start + self.fetch_batch_size],
+                namespace=self.pinecone_store.namespace,
+            ).vectors
+            sample.extend(vector.values for vector in fetched.values())
+        if sample:
+            self.replica.faiss_search.train(normalize(sample))
+
+    def _list_remote_ids(self) -> List[str]:
+        remote_ids = []
+        for ids in self.pinecone_store.index.list(
+            prefix=self.prefix or None, namespace=self.pinecone_store.namespace
+        ):
+            remote_ids.extend(ids)
+        return remote_ids
+
+
+class ReplicatedVectorStore:
+    """
+    VectorStore that serves queries from the local replica and falls back to Pinecone
+    when the replica is missing, empty or older than `max_staleness` seconds, or
+    does not mirror the records a query may match (see covers).
+
+    Writes always go to Pinecone; the replica catches up on the next sync.
+    """
+
+    def __init__(
+        self,
+        primary: PineconeVectorStore,
+        replica: FaissVectorStore,
+        max_staleness: float = PINECONE_REPLICA_MAX_STALENESS,
+        prefix: str = PINECONE_REPLICA_PREFIX,
+        categories: List[str] = PINECONE_REPLICA_CATEGORIES,
+    ):
+        """
+        Initialize the replicated store.
+
+        Args:
+            primary (PineconeVectorStore): The Pinecone source of truth.
+            replica (FaissVectorStore): The local mirror maintained by PineconeReplicaSync.
+            max_staleness (float): Maximum replica age in seconds.
+            prefix (str): ID prefix the replica was synced with; "" for everything.
+            categories (List[str]): Categories of the records a prefix mirrors.
+        """
+        self.primary = primary
+        self.replica = replica
+        self.prefix = prefix
+        self.categories = set(categories)
+        # Records are embedded by the primary
+        self.embedding_model = primary.embedding_model
+        self.max_staleness = max_staleness
+        # Seconds from the start of the last batch_search until each query's results were ready
+        self.last_batch_latencies: List[float] = []
+
+    def is_fresh(self) -> bool:
+        """Whether the replica is populated and was synced recently enough."""
+        # The sync job runs in another process; replay its delta log and merges
+        self.replica.faiss_search.refresh()
+        last_synced_at = self.replica.doc_store.get_state(LAST_SYNCED_AT_KEY)
+        if last_synced_at is None or self.replica.faiss_search.ntotal == 0:
+            return False
+        return time.time() - float(last_synced_at) <= self.max_staleness
+
+    def covers(self, metadata_filter: Optional[Dict[str, any]]) -> bool:
+        """
+        Whether every record a filter can match is mirrored by the replica.
+
+        A partial (prefixed) replica only covers filters restricting "category" to
+        its mirrored categories; unfiltered queries need the whole namespace.
+        """
+        if not self.prefix:
+            return True
+        condition = (metadata_filter or {}).get("category")
+        if isinstance(condition, dict):
+            if set(condition) == {"$eq"}:
+                condition = condition["$eq"]
+            elif set(condition) == {"$in"}:
+                return bool(condition["$in"]) and set(condition["$in"]) <= self.categories
+            else:
+                return False
+        return condition is not None and condition in self.categories
+
+    def upsert(self, records: List[Dict[str, any]]) -> None:
+        """Upsert records into Pinecone."""
+        self.primary.upsert(records)
+
+    def delete(self, ids: List[str]) -> None:
+        """Delete records from Pinecone."""
+        self.primary.delete(ids)
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, any]]:
+        """
+        Perform a semantic search, preferring the local replica.
+
+        Args:
+            query (str): The query string to search for.
+            top_k (int): The number of top results to retrieve. Defaults to 5.
+
+        Returns:
+            List[Dict[str, any]]: Results with "id", "score" and "metadata".
+        """
+        return self.filter(query, None, top_k=top_k)
+
+    def batch_search(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, any]] = None,
+    ) -> List[List[Dict[str, any]]]:
+        """
+        Search several queries, preferring the local replica.
+
+        The queries are embedded with batched Pinecone inference requests and searched
+        with one vectorized FAISS call; without a fresh replica the batch goes to
+        Pinecone's concurrent batch_search.
+
+        Args:
+            queries (List[str]): Query strings.
+            top_k (int): The number of top results per query. Defaults to 5.
+            metadata_filter (Dict[str, any], optional): Pinecone-style metadata filter.
+
+        Returns:
+            List[List[Dict[str, any]]]: One result list per query, in input order.
+        """
+        if queries and self.covers(metadata_filter) and self.is_fresh():
+            try:
+                start = time.perf_counter()
+                vectors = normalize(self.primary.embed_queries(queries))
+                results = self.replica.search_vectors(
+                    vectors, top_k=top_k, metadata_filter=metadata_filter
+                )
+                # The mirrored metadata is slim; the text comes from Pinecone's document store
+                self.primary.hydrate([result for batch in results for result in batch])
+                self.last_batch_latencies = [time.perf_counter() - start] * len(queries)
+                return results
+            except Exception as e:
+                print(f"Error searching local replica, falling back to Pinecone: {e}")
+
+        results = self.primary.batch_search(
+            queries, top_k=top_k, metadata_filter=metadata_filter
+        )
+        self.last_batch_latencies = self.primary.last_batch_latencies
+        return results
+
+    def filter(
+        self, query: str, metadata_filter: Optional[Dict[str, any]], top_k: int = 5
+    ) -> List[Dict[str, any]]:
+        """
+        Search among records matching a metadata filter, preferring the local replica.
+
+        Args:
+            query (str): The query string to search for.
+            metadata_filter (Dict[str, any], optional): Pinecone-style metadata filter.
+            top_k (int): The number of top results to retrieve. Defaults to 5.
+
+        Returns:
+            List[Dict[str, any]]: Results with "id", "score" and "metadata".
+        """
+        if self.covers(metadata_filter) and self.is_fresh():
+            try:
+                # The replica holds Pinecone's vectors, so queries use Pinecone's embedding model
+                vector = normalize(self.primary.embed_query(query))[0]
+                return self.primary.hydrate(
+                    self.replica.search_vector(
+                        vector, top_k=top_k, metadata_filter=metadata_filter
+                    )
+                )
+            except Exception as e:
+                print(f"Error searching local replica, falling back to Pinecone: {e}")
+
+        if metadata_filter is None:
+            return self.primary.search(query, top_k=top_k)
+        return self.primary.filter(query, metadata_filter, top_k=top_k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mirror the Pinecone namespace into the local FAISS replica."
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0,
+        help="Seconds between syncs; 0 runs a single sync and exits.",
+    )
+    parser.add_argument(
+        "--ids-only",
+        action="store_true",
+        help="Only compare ID sets, skipping the metadata hash comparison.",
+    )
+    parser.add_argument(
+        "--site-id",
+        type=int,
+        default=None,
+        help="Website whose namespace to mirror; defaults to the shared namespace.",
+    )
+    args = parser.parse_args()
+
+    pinecone_store = PineconeVectorStore(
+        api_key=os.getenv("PINE_API_KEY"),
+        index_name=os.getenv("PINE_INDEX_NAME"),
+        namespace=site_namespace(args.site_id),
+        doc_store_path=site_path(PINECONE_DOC_STORE_PATH, args.site_id),
+    )
+    replica_sync = PineconeReplicaSync(pinecone_store, open_replica(args.site_id))
+    if args.interval > 0:
+        replica_sync.run_forever(args.interval)
+    else:
+        replica_sync.sync(compare_metadata=not args.ids_only)
@@ -0,0 +1,235 @@
+from typing import List, Dict, Optional, Protocol, runtime_checkable
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+PINE_API_KEY = os.getenv("PINE_API_KEY")
+PINE_INDEX_NAME = os.getenv("PINE_INDEX_NAME")
+
+# "pinecone" (default), "faiss" or "replica" (local FAISS mirror of Pinecone)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+# Website whose records predate per-site partitioning and stay in the shared namespace and files
+VECTOR_STORE_LEGACY_SITE_ID = os.getenv("VECTOR_STORE_LEGACY_SITE_ID", "1")
+
+# Record categories searched for each intent hint of the chatbot node
+INTENT_CATEGORIES = {
+    "faq": ["qa"],
+    "documents": ["pdf_page", "text_file"],
+}
+
+# One store per website, shared by all conversations of this process
+_site_stores: Dict[Optional[int], "VectorStore"] = {}
+_site_stores_lock = threading.Lock()
+
+
+@runtime_checkable
+class VectorStore(Protocol):
+    """
+    Common interface implemented by every retrieval backend.
+
+    Records passed to `upsert` are dictionaries with the keys "id", "text",
+    "metadata" and "category". Search results are dictionaries with the keys
+    "id", "score" and "metadata", where "metadata" holds "chunk_text",
+    "metadata" and "category", the same shape Pinecone returns.
+    """
+
+    def upsert(self, records: List[Dict[str, any]]) -> None:
+        """Embed and store the given records."""
+        ...
+
+    def delete(self, ids: List[str]) -> None:
+        """Remove the records with the given IDs."""
+        ...
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, any]]:
+        """Return the top-k records most similar to the query."""
+        ...
+
+    def batch_search(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, any]] = None,
+    ) -> List[List[Dict[str, any]]]:
+        """
+        Return the top-k records for every query, in input order.
+
+        Implementations embed all queries together and record the per-query latency
+        in seconds in `last_batch_latencies`.
+        """
+        ...
+
+    def filter(
+        self, query: str, metadata_filter: Dict[str, any], top_k: int = 5
+    ) -> List[Dict[str, any]]:
+        """Return the top-k records for the query among records matching the filter."""
+        ...
+
+
+def is_shared_partition(site_id: Optional[int]) -> bool:
+    """Whether a website's records live in the shared, pre-partitioning namespace and files."""
+    return site_id is None or str(site_id) == VECTOR_STORE_LEGACY_SITE_ID
+
+
+def site_namespace(site_id: Optional[int]) -> str:
+    """
+    Pinecone namespace holding a website's records.
+
+    Args:
+        site_id (int, optional): Website ID; None for the shared namespace.
+
+    Returns:
+        str: The namespace, e.g. "<PINE_INDEX_NAME>-site-7".
+    """
+    if is_shared_partition(site_id):
+        return PINE_INDEX_NAME
+    return f"{PINE_INDEX_NAME}-site-{site_id}"
+
+
+def site_path(path: str, site_id: Optional[int]) -> str:
+    """
+    Location of a website's local index file, e.g. data/faiss/site_7/index.faiss.
+
+    Args:
+        path (str): Path of the shared file.
+        site_id (int, optional): Website ID; None for the shared file.
+
+    Returns:
+        str: The per-site path.
+    """
+    if is_shared_partition(site_id):
+        return path
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f"site_{site_id}", name)
+
+
+def intent_filter(intent: Optional[str]) -> Optional[Dict[str, any]]:
+    """
+    Metadata pre-filter restricting a search to the categories relevant to an intent.
+
+    Args:
+        intent (str, optional): Intent hint, a key of INTENT_CATEGORIES.
+
+    Returns:
+        Dict[str, any]: Pinecone-style filter, or None to search every category.
+    """
+    categories = INTENT_CATEGORIES.get(intent) if intent else None
+    if not categories:
+        return None
+    return {"category": {"$in": categories}}
+
+
+def get_vector_store(
+    backend: Optional[str] = None, site_id: Optional[int] = None
+) -> VectorStore:
+    """
+    Create the vector store selected by configuration.
+
+    Every website gets its own partition: a Pinecone namespace, and a separate
+    index and document store for FAISS and the replica, so searches only scan that
+    website's records and tenants never see each other's data.
+
+    Args:
+        backend (str, optional): "pinecone", "faiss" or "replica". Defaults to the
+            VECTOR_STORE_BACKEND environment variable.
+        site_id (int, optional): Website whose partition to open; None for the shared one.
+
+    Returns:
+        VectorStore: The configured vector store.
+    """
+    backend = (backend or VECTOR_STORE_BACKEND).lower()
+    namespace = site_namespace(site_id)
+
+    # Backends are imported lazily so FAISS and torch stay optional
+    if backend == "pinecone":
+        from backend.vector_search.pinecone_search import (
+            PINECONE_DOC_STORE_PATH,
+            PineconeVectorStore,
+        )
+
+        return PineconeVectorStore(
+            api_key=PINE_API_KEY,
+            index_name=PINE_INDEX_NAME,
+            namespace=namespace,
+            doc_store_path=site_path(PINECONE_DOC_STORE_PATH, site_id),
+        )
+    if backend == "faiss":
+        from backend.vector_search.faiss_search import (
+            FAISS_DOC_STORE_PATH,
+            FAISS_INDEX_PATH,
+            FaissVectorStore,
+        )
+
+        return FaissVectorStore(
+            index_path=site_path(FAISS_INDEX_PATH, site_id),
+            doc_store_path=site_path(FAISS_DOC_STORE_PATH, site_id),
+        )
+    if backend == "replica":
+        from backend.vector_search.pinecone_search import (
+            PINECONE_DOC_STORE_PATH,
+            PineconeVectorStore,
+        )
+        from backend.vector_search.replica import ReplicatedVectorStore, open_replica
+
+        return ReplicatedVectorStore(
+            primary=PineconeVectorStore(
+                api_key=PINE_API_KEY,
+                index_name=PINE_INDEX_NAME,
+                namespace=namespace,
+                doc_store_path=site_path(PINECONE_DOC_STORE_PATH, site_id),
+            ),
+            replica=open_replica(site_id),
+        )
+
+    raise ValueError(f"Unknown vector store backend '{backend}'.")
+
+
+def get_site_vector_store(site_id: Optional[int]) -> VectorStore:
+    """
+    Return the process-wide store of a website, creating it on first use.
+
+    Args:
+        site_id (int, optional): Website ID; None for the shared partition.
+
+    Returns:
+        VectorStore: The configured store for the website.
+    """
+    if site_id not in _site_stores:
+        with _site_stores_lock:
+            if site_id not in _site_stores:
+                _site_stores[site_id] = get_vector_store(site_id=site_id)
+    return _site_stores[site_id]
+
+
+def matches_filter(metadata: Dict[str, any], metadata_filter: Dict[str, any]) -> bool:
+    """
+    Check a record's metadata against a Pinecone-style metadata filter.
+
+    Supports plain equality as well as the "$eq", "$ne", "$in" and "$nin" operators,
+    which covers the filters used by the chatbot and ingestion scripts.
+
+    Args:
+        metadata (Dict[str, any]): Metadata of the record.
+        metadata_filter (Dict[str, any]): Filter, e.g. {"category": {"$in": ["qa"]}}.
+
+    Returns:
+        bool: Whether the record matches every condition of the filter.
+    """
+    for key, condition in metadata_filter.items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+            if operator not in ("$eq", "$ne", "$in", "$nin"):
+                raise ValueError(f"Unsupported filter operator '{operator}'.")
+    return True